@@ -0,0 +1,94 @@
+"""
+This file builds attack lookup tables at import time. Every table is indexed by square (row * 8 + column)
+and holds a bitboard of tiles attacked from that square on an empty board
+"""
+
+import time
+
+# (row, column) steps, first four are straight lines and last four are diagonals
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+STRAIGHT_DIRECTIONS = (0, 1, 2, 3)
+DIAGONAL_DIRECTIONS = (4, 5, 6, 7)
+KNIGHT_OFFSETS = ((-2, 1), (-1, 2), (2, 1), (1, 2), (2, -1), (1, -2), (-2, -1), (-1, -2))
+
+# directions going towards higher square indexes find their first blocker on the lowest set bit
+DIRECTION_IS_INCREASING = tuple(step_row * 8 + step_column > 0 for step_row, step_column in DIRECTIONS)
+
+
+def _offsets_attacks(square, offsets):
+    row, column = square // 8, square % 8
+    attacks = 0
+    for step_row, step_column in offsets:
+        target_row, target_column = row + step_row, column + step_column
+        if 0 <= target_row < 8 and 0 <= target_column < 8:
+            attacks |= 1 << (target_row * 8 + target_column)
+    return attacks
+
+
+def _ray(square, step_row, step_column):
+    row, column = square // 8 + step_row, square % 8 + step_column
+    ray = 0
+    while 0 <= row < 8 and 0 <= column < 8:
+        ray |= 1 << (row * 8 + column)
+        row += step_row
+        column += step_column
+    return ray
+
+
+def _build_tables():
+    knight_attacks = tuple(_offsets_attacks(square, KNIGHT_OFFSETS) for square in range(64))
+    king_attacks = tuple(_offsets_attacks(square, DIRECTIONS) for square in range(64))
+    # white pawns move towards row 0, black pawns towards row 7
+    pawn_attacks = {
+        "w": tuple(_offsets_attacks(square, ((-1, -1), (-1, 1))) for square in range(64)),
+        "b": tuple(_offsets_attacks(square, ((1, -1), (1, 1))) for square in range(64))
+    }
+    rays = tuple(tuple(_ray(square, step_row, step_column) for square in range(64))
+                 for step_row, step_column in DIRECTIONS)
+    # tiles strictly between two squares lying on one line, 0 when they are not aligned
+    between = [[0] * 64 for _ in range(64)]
+    for direction in range(8):
+        for square in range(64):
+            ray = rays[direction][square]
+            for target in range(64):
+                if ray >> target & 1:
+                    between[square][target] = ray & ~rays[direction][target] & ~(1 << target)
+    return knight_attacks, king_attacks, pawn_attacks, rays, tuple(tuple(row) for row in between)
+
+
+_build_start = time.perf_counter()
+KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, RAYS, BETWEEN = _build_tables()
+TABLES_BUILD_TIME = time.perf_counter() - _build_start
+
+
+def first_blocker(direction, blockers):
+    """ Returns square of the piece closest to ray origin out of blockers lying on the ray """
+    if DIRECTION_IS_INCREASING[direction]:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def ray_attacks(square, occupied, direction):
+    """ Returns tiles attacked along one direction, ray ends on the first occupied tile """
+    attacks = RAYS[direction][square]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= RAYS[direction][first_blocker(direction, blockers)]
+    return attacks
+
+
+def rook_attacks(square, occupied):
+    """ Returns tiles attacked by a rook standing on square """
+    return (ray_attacks(square, occupied, 0) | ray_attacks(square, occupied, 1)
+            | ray_attacks(square, occupied, 2) | ray_attacks(square, occupied, 3))
+
+
+def bishop_attacks(square, occupied):
+    """ Returns tiles attacked by a bishop standing on square """
+    return (ray_attacks(square, occupied, 4) | ray_attacks(square, occupied, 5)
+            | ray_attacks(square, occupied, 6) | ray_attacks(square, occupied, 7))
+
+
+def queen_attacks(square, occupied):
+    """ Returns tiles attacked by a queen standing on square """
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
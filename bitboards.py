@@ -0,0 +1,107 @@
+"""
+This file contains bitboard helpers. Square index is row * 8 + column, so square 0 is A8 and square 63 is H1
+"""
+
+from zobrist import PIECE_KEYS
+
+PIECE_NAMES = ("wp", "wh", "wb", "wr", "wq", "wk", "bp", "bh", "bb", "br", "bq", "bk")
+SQUARE_POSITIONS = tuple((square // 8, square % 8) for square in range(64))
+FULL_BOARD = (1 << 64) - 1
+
+
+def pos_to_square(pos):
+    """ Converts (row, column) position to square index """
+    return pos[0] * 8 + pos[1]
+
+
+def square_to_pos(square):
+    """ Converts square index to (row, column) position """
+    return SQUARE_POSITIONS[square]
+
+
+def lowest_square(bitboard):
+    """ Returns index of the lowest set bit or None for an empty bitboard """
+    if not bitboard:
+        return None
+    return (bitboard & -bitboard).bit_length() - 1
+
+
+def iterate_squares(bitboard):
+    """ Yields indexes of every set bit from the lowest one """
+    while bitboard:
+        lowest_bit = bitboard & -bitboard
+        yield lowest_bit.bit_length() - 1
+        bitboard ^= lowest_bit
+
+
+def bitboard_to_positions(bitboard):
+    """ Converts every set bit to (row, column) position """
+    positions = []
+    while bitboard:
+        lowest_bit = bitboard & -bitboard
+        positions.append(SQUARE_POSITIONS[lowest_bit.bit_length() - 1])
+        bitboard ^= lowest_bit
+    return positions
+
+
+def count_squares(bitboard):
+    """ Returns number of set bits """
+    return bin(bitboard).count("1")
+
+
+class BitboardPosition():
+    """ This class keeps pieces placement as one 64-bit integer per piece type and color plus occupancy masks """
+
+    def __init__(self, board=None):
+        self.pieces = dict.fromkeys(PIECE_NAMES, 0)
+        self.colors = {"w": 0, "b": 0}
+        self.occupied = 0
+        # Zobrist hash of pieces placement, updated with every change
+        self.hash = 0
+        if board:
+            for row in range(8):
+                for column in range(8):
+                    if board[row][column] is not None:
+                        self.add_piece(board[row][column].name, row * 8 + column)
+
+    def add_piece(self, name, square):
+        """ Puts piece of given name on a square """
+        bit = 1 << square
+        self.pieces[name] |= bit
+        self.colors[name[0]] |= bit
+        self.occupied |= bit
+        self.hash ^= PIECE_KEYS[name][square]
+
+    def remove_piece(self, name, square):
+        """ Takes piece of given name off a square """
+        mask = ~(1 << square)
+        self.pieces[name] &= mask
+        self.colors[name[0]] &= mask
+        self.occupied &= mask
+        self.hash ^= PIECE_KEYS[name][square]
+
+    def move_piece(self, name, from_square, to_square):
+        """ Moves piece of given name between two squares, target square has to be empty """
+        bits = (1 << from_square) | (1 << to_square)
+        self.pieces[name] ^= bits
+        self.colors[name[0]] ^= bits
+        self.occupied ^= bits
+        self.hash ^= PIECE_KEYS[name][from_square] ^ PIECE_KEYS[name][to_square]
+
+    def piece_at(self, square):
+        """ Returns name of piece standing on a square or None """
+        bit = 1 << square
+        if not self.occupied & bit:
+            return None
+        for name, bitboard in self.pieces.items():
+            if bitboard & bit:
+                return name
+        return None
+
+    def is_occupied(self, square):
+        """ Checks if any piece stands on a square """
+        return bool(self.occupied >> square & 1)
+
+    def is_color(self, square, color):
+        """ Checks if piece of given color stands on a square """
+        return bool(self.colors[color] >> square & 1)
@@ -4,12 +4,34 @@ This file initializes main window and launches the game
 
 import pygame
 from gameManager import GameManager
+from frameScheduler import FrameScheduler
 
 WINDOW_WIDTH = 1200
 WINDOW_HEIGHT = 900
 WINDOW_NAME = "Chess"
 TILE_COLORS = ("white", "gray")
 BOARD_SIZE = 900
+# colors played by computer, for example ("b",)
+ENGINE_COLORS = ()
+ENGINE_TIME_MS = 1000
+# number of processes searching in parallel
+ENGINE_WORKERS = 1
+# redraw and update only changed parts of the window
+DIRTY_RENDERING = True
+# sleep until input instead of redrawing idle board 60 times per second
+EVENT_DRIVEN = True
+FPS = 60
+IDLE_TIMEOUT_MS = 500
+# print numbers of rendered and skipped frames on quit
+PRINT_FRAME_STATS = False
+# games are journaled here move by move, None turns journaling off
+JOURNAL_DIR = "saved_games"
+# Polyglot book built with openingBook.py, None plays without book
+OPENING_BOOK = None
+# directory of tables generated with tablebase.py, None plays without tablebases
+TABLEBASE_DIR = None
+# end games against computer that tablebases show as drawn, this is adjudication and not a chess rule
+TABLEBASE_ADJUDICATION = False
 
 
 def main():
@@ -17,19 +39,32 @@ def main():
     pygame.init()
     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     pygame.display.set_caption(WINDOW_NAME)
-    clock = pygame.time.Clock()
+    scheduler = FrameScheduler(EVENT_DRIVEN, FPS, IDLE_TIMEOUT_MS)
 
-    game = GameManager(screen, BOARD_SIZE, TILE_COLORS)
+    game = GameManager(screen, BOARD_SIZE, TILE_COLORS, ENGINE_COLORS, ENGINE_TIME_MS, ENGINE_WORKERS, DIRTY_RENDERING, JOURNAL_DIR,
+                       OPENING_BOOK, TABLEBASE_DIR, TABLEBASE_ADJUDICATION)
     # Main Loop
     while True:
-        events = pygame.event.get()
+        # loop keeps polling while background computation of last move runs
+        events = scheduler.wait_for_events(game.is_engine_turn() or game.is_status_pending())
         for event in events:
             if event.type == pygame.QUIT:
+                if PRINT_FRAME_STATS:
+                    print(scheduler)
+                game.close()
                 pygame.quit()
                 exit()
+        # check highlight and game over popup are drawn as soon as they are computed, without waiting for input
+        if game.is_status_ready():
+            scheduler.request_redraw()
+        if not scheduler.should_render(events, game.is_engine_turn()):
+            continue
         game.update(events)
-        pygame.display.update()
-        clock.tick(60)
+        # window uncovered by another one has to be shown whole again
+        if DIRTY_RENDERING and not any(event.type == pygame.WINDOWEXPOSED for event in events):
+            pygame.display.update(game.display.dirty_rects)
+        else:
+            pygame.display.update()
 
 
 if __name__ == "__main__":
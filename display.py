@@ -1,8 +1,13 @@
 import pygame
+from spriteAtlas import SpriteAtlas
+from textCache import TextCache
 
 
 class Display():
     """ This class is responsible for drawing and loading images into the main window """
+    # Scaled images shared by every display, so restarting a game does not load them again
+    sprite_atlas = SpriteAtlas()
+    text_cache = TextCache()
 
     def __init__(self, window, board_size):
         self.window = window
@@ -10,6 +15,12 @@ class Display():
         self.actual_board_size = self.board_size//8 * 8
         self.save_clicked = False
         self.restart_clicked = False
+        # Dirty rectangle rendering: empty board surface and what every tile and panel showed last frame
+        self.background = None
+        self.background_key = None
+        self.drawn_tiles = {}
+        self.drawn_panels = {}
+        self.dirty_rects = []
 
     def draw_board(self, tile_colors):
         """ Displays board on window """
@@ -19,16 +30,64 @@ class Display():
                 cell = pygame.Rect(row*cell_dimension, column*cell_dimension, cell_dimension, cell_dimension)
                 pygame.draw.rect(self.window, tile_colors[(row + column) % 2], cell)
 
+    def draw_background(self, tile_colors):
+        """ Draws empty board once on separate surface, rebuilt only when colors or size change """
+        cell_dimension = self.board_size//8
+        if self.background_key == (tile_colors, cell_dimension):
+            return
+        self.background = pygame.Surface((cell_dimension*8, cell_dimension*8))
+        for row in range(8):
+            for column in range(8):
+                cell = pygame.Rect(column*cell_dimension, row*cell_dimension, cell_dimension, cell_dimension)
+                pygame.draw.rect(self.background, tile_colors[(row + column) % 2], cell)
+        self.background_key = (tile_colors, cell_dimension)
+        self.drawn_tiles = {}
+
+    def draw_changed_tiles(self, tile_colors, tile_contents):
+        """ Redraws tiles whose (highlight under piece, piece name, highlights over piece) changed since last frame """
+        self.draw_background(tile_colors)
+        cell_dimension = self.board_size//8
+        images = self.sprite_atlas.piece_images(cell_dimension)
+        for tile, content in tile_contents.items():
+            if self.drawn_tiles.get(tile) == content:
+                continue
+            under_highlight, piece_name, over_highlights = content
+            cell = pygame.Rect(tile[1]*cell_dimension, tile[0]*cell_dimension, cell_dimension, cell_dimension)
+            self.window.blit(self.background, cell, cell)
+            if under_highlight is not None:
+                pygame.draw.circle(self.window, under_highlight[0], cell.center, cell_dimension/under_highlight[1])
+            if piece_name is not None:
+                self.window.blit(images[piece_name], cell)
+            for color, size in over_highlights:
+                pygame.draw.circle(self.window, color, cell.center, cell_dimension/size)
+            self.drawn_tiles[tile] = content
+            self.dirty_rects.append(cell)
+
+    def draw_changed_panel(self, name, content, rect, draw, *args):
+        """ Calls draw function of a panel only when its content changed since last frame """
+        if self.drawn_panels.get(name) == content:
+            return
+        draw(*args)
+        self.drawn_panels[name] = content
+        self.dirty_rects.append(rect)
+
+    def move_record_rect(self):
+        """ Returns area taken by move record panel """
+        return pygame.Rect(self.actual_board_size, 0, self.window.get_width() - self.actual_board_size, self.actual_board_size - 150)
+
+    def player_score_rect(self):
+        """ Returns area taken by player score panel """
+        return pygame.Rect(self.actual_board_size, self.actual_board_size - 150, self.window.get_width() - self.actual_board_size, 150)
+
     def load_pieces(self, game_state):
         """ Loads pieces images on drawn board """
         cell_dimension = self.board_size//8
+        images = self.sprite_atlas.piece_images(cell_dimension)
         for row in range(8):
             for column in range(8):
-                cell = pygame.Rect(row*cell_dimension, column*cell_dimension, cell_dimension, cell_dimension)
-                if game_state.pos_to_piece((column, row)) is not None:
-                    img_path = f"pieces/{game_state.pos_to_piece((column, row)).name}.png"
-                    img = pygame.transform.scale(pygame.image.load(img_path), (cell_dimension, cell_dimension))
-                    self.window.blit(img, cell)
+                piece = game_state.pos_to_piece((column, row))
+                if piece is not None:
+                    self.window.blit(images[piece.name], (row*cell_dimension, column*cell_dimension))
 
     def highlight_tiles(self, tiles, color, size=8):
         """ Marks given tiles with a circle """
@@ -48,14 +107,13 @@ class Display():
         window_pos_y = self.board_size/2 - (1/2)*window_height
         window_rect_border = pygame.Rect(window_pos_x - border_size/2, window_pos_y - border_size/2, window_width + border_size, window_height + border_size)
         window_rect = pygame.Rect(window_pos_x, window_pos_y, window_width, window_height)
+        self.dirty_rects.append(window_rect_border)
         # Win type text
-        font = pygame.font.SysFont("arialblack", 45)
-        wt = font.render(who_won, True, (100, 100, 100))
+        wt = self.text_cache.render("arialblack", 45, who_won, (100, 100, 100))
         wt_offset_x = window_pos_x - wt.get_width()/2 + window_width/2
         wt_offset_y = window_pos_y - wt.get_height()/2 + 30
         # Winner text
-        font = pygame.font.SysFont("arialblack", 20)
-        win = font.render(win_type, True, (100, 100, 100))
+        win = self.text_cache.render("arialblack", 20, win_type, (100, 100, 100))
         win_offset_x = window_pos_x - win.get_width()/2 + window_width/2
         win_offset_y = window_pos_y - win.get_height()/2 + 70
         # Restart button
@@ -63,7 +121,8 @@ class Display():
         restart_pos_y = window_pos_y + 130
         restart_width = window_width/2.5
         restart_height = window_height/3
-        res_img = pygame.transform.scale(pygame.image.load("Buttons/restart_btn.png"), (restart_width, restart_height))
+        buttons = self.sprite_atlas.button_images((restart_width, restart_height))
+        res_img = buttons["restart_btn"]
         res_rect = pygame.Rect(restart_pos_x, restart_pos_y, restart_width, restart_height)
         # Save button
         save_pos_x = window_pos_x + 170
@@ -71,9 +130,9 @@ class Display():
         save_width = window_width/2.5
         save_height = window_height/3
         if not self.save_clicked:
-            save_img = pygame.transform.scale(pygame.image.load("Buttons/save_btn.png"), (save_width, save_height))
+            save_img = buttons["save_btn"]
         else:
-            save_img = pygame.transform.scale(pygame.image.load("Buttons/saved_btn.png"), (save_width, save_height))
+            save_img = buttons["saved_btn"]
 
         save_rect = pygame.Rect(save_pos_x, save_pos_y, save_width, save_height)
 
@@ -102,7 +161,7 @@ class Display():
     def show_move_record(self, move_record):
         """ Displays recorded moves on right edge of the window """
         # Draws move board
-        move_board = pygame.Rect(self.actual_board_size, 0, self.window.get_width() - self.actual_board_size, self.actual_board_size - 150)
+        move_board = self.move_record_rect()
         current_move_tile = pygame.Rect(self.actual_board_size, 0, self.window.get_width() - self.actual_board_size, 50)
         move_board_line_1 = pygame.Rect(self.actual_board_size + 75, 0, 5, self.actual_board_size - 150)
         move_board_line_2 = pygame.Rect(self.actual_board_size + 190, 0, 5, self.actual_board_size - 150)
@@ -110,17 +169,15 @@ class Display():
         pygame.draw.rect(self.window, (120, 120, 115), current_move_tile)
         pygame.draw.rect(self.window, (50, 50, 45), move_board_line_1)
         pygame.draw.rect(self.window, (50, 50, 45), move_board_line_2)
-        move_font = pygame.font.SysFont("arialblack", 25)
-        num_font = pygame.font.SysFont("arialblack", 40)
-        hash = num_font.render("#", True, (255, 255, 255))
-        players = move_font.render("white     black", True, (255, 255, 255))
+        hash = self.text_cache.render("arialblack", 40, "#", (255, 255, 255))
+        players = self.text_cache.render("arialblack", 25, "white     black", (255, 255, 255))
         self.window.blit(hash, (self.actual_board_size + 23, -6))
         self.window.blit(players, (self.actual_board_size + 95, 7))
 
         def draw_move_cell(pos_y, m_number, m_white, m_black):
-            num = num_font.render(m_number, True, (255, 255, 255))
-            white = move_font.render(m_white, True, (255, 255, 255))
-            black = move_font.render(m_black, True, (255, 255, 255))
+            num = self.text_cache.render("arialblack", 40, m_number, (255, 255, 255))
+            white = self.text_cache.render("arialblack", 25, m_white, (255, 255, 255))
+            black = self.text_cache.render("arialblack", 25, m_black, (255, 255, 255))
             self.window.blit(num, (self.actual_board_size + 7, pos_y - 7))
             self.window.blit(white, (self.actual_board_size + 85, pos_y + 7))
             self.window.blit(black, (self.actual_board_size + 200, pos_y + 7))
@@ -135,19 +192,17 @@ class Display():
     def show_player_score(self, white_score, black_score):
         """ Draws player scores at bottom right corner of the window"""
         # Lines
-        score_board = pygame.Rect(self.actual_board_size, self.actual_board_size - 150, self.window.get_width() - self.actual_board_size, 150)
+        score_board = self.player_score_rect()
         score_board_line1 = pygame.Rect(self.actual_board_size, self.actual_board_size - 78, self.window.get_width() - self.actual_board_size, 5)
         score_board_line2 = pygame.Rect(self.actual_board_size, self.actual_board_size - 150, self.window.get_width() - self.actual_board_size, 5)
         score_board_line3 = pygame.Rect(self.actual_board_size, self.actual_board_size - 5, self.window.get_width() - self.actual_board_size, 5)
         score_board_line4 = pygame.Rect(self.actual_board_size, self.actual_board_size - 150, 5, 150)
         score_board_line5 = pygame.Rect(self.window.get_width()-5, self.actual_board_size - 150, 5, 150)
         # Text
-        name_font = pygame.font.SysFont("arialblack", 35)
-        score_font = pygame.font.SysFont("arialblack", 40)
-        name_white = name_font.render("White: ", True, (255, 255, 255))
-        name_black = name_font.render("Black: ", True, (255, 255, 255))
-        score_white = score_font.render(white_score, True, (255, 255, 255))
-        score_black = score_font.render(black_score, True, (255, 255, 255))
+        name_white = self.text_cache.render("arialblack", 35, "White: ", (255, 255, 255))
+        name_black = self.text_cache.render("arialblack", 35, "Black: ", (255, 255, 255))
+        score_white = self.text_cache.render("arialblack", 40, white_score, (255, 255, 255))
+        score_black = self.text_cache.render("arialblack", 40, black_score, (255, 255, 255))
 
         # Display everything
         pygame.draw.rect(self.window, (45, 45, 42), score_board)
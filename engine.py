@@ -0,0 +1,415 @@
+"""
+This file contains computer opponent searching GameState positions with negamax alpha-beta,
+quiescence search on captures and iterative deepening under a time budget.
+ParallelEngine runs several searches in worker processes sharing one transposition table (Lazy SMP)
+"""
+
+import atexit
+import multiprocessing
+import random
+import time
+from bitboards import iterate_squares
+from gameState import GameState, encode_move
+from moveOrdering import MoveOrderer
+from movesTracker import MovesTracker
+from transpositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+# scores above this value mean forced mate
+MATE_THRESHOLD = MATE_SCORE - 1000
+# clock is checked once per this many nodes, a few milliseconds of search
+CLOCK_CHECK_NODES = 128
+# next iteration takes longer than all previous ones, so it is not started after this part of time budget
+ITERATION_TIME_SHARE = 0.5
+
+PIECE_VALUES = {"p": 100, "h": 320, "b": 330, "r": 500, "q": 900, "k": 0}
+
+# piece square bonuses seen from white side, first row is row 0 (8th rank)
+PIECE_SQUARE_BONUS = {
+    "p": (0, 0, 0, 0, 0, 0, 0, 0,
+          50, 50, 50, 50, 50, 50, 50, 50,
+          10, 10, 20, 30, 30, 20, 10, 10,
+          5, 5, 10, 25, 25, 10, 5, 5,
+          0, 0, 0, 20, 20, 0, 0, 0,
+          5, -5, -10, 0, 0, -10, -5, 5,
+          5, 10, 10, -20, -20, 10, 10, 5,
+          0, 0, 0, 0, 0, 0, 0, 0),
+    "h": (-50, -40, -30, -30, -30, -30, -40, -50,
+          -40, -20, 0, 0, 0, 0, -20, -40,
+          -30, 0, 10, 15, 15, 10, 0, -30,
+          -30, 5, 15, 20, 20, 15, 5, -30,
+          -30, 0, 15, 20, 20, 15, 0, -30,
+          -30, 5, 10, 15, 15, 10, 5, -30,
+          -40, -20, 0, 5, 5, 0, -20, -40,
+          -50, -40, -30, -30, -30, -30, -40, -50),
+    "b": (-20, -10, -10, -10, -10, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 10, 10, 5, 0, -10,
+          -10, 5, 5, 10, 10, 5, 5, -10,
+          -10, 0, 10, 10, 10, 10, 0, -10,
+          -10, 10, 10, 10, 10, 10, 10, -10,
+          -10, 5, 0, 0, 0, 0, 5, -10,
+          -20, -10, -10, -10, -10, -10, -10, -20),
+    "r": (0, 0, 0, 0, 0, 0, 0, 0,
+          5, 10, 10, 10, 10, 10, 10, 5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          0, 0, 0, 5, 5, 0, 0, 0),
+    "q": (-20, -10, -10, -5, -5, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 5, 5, 5, 0, -10,
+          -5, 0, 5, 5, 5, 5, 0, -5,
+          0, 0, 5, 5, 5, 5, 0, -5,
+          -10, 5, 5, 5, 5, 5, 0, -10,
+          -10, 0, 5, 0, 0, 0, 0, -10,
+          -20, -10, -10, -5, -5, -10, -10, -20),
+    "k": (-30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -20, -30, -30, -40, -40, -30, -30, -20,
+          -10, -20, -20, -20, -20, -20, -20, -10,
+          20, 20, 0, 0, 0, 0, 20, 20,
+          20, 30, 10, 0, 0, 10, 30, 20)
+}
+
+# piece value plus square bonus for every piece name and square, black squares are mirrored
+PIECE_SQUARE_VALUES = {}
+for _kind, _bonus in PIECE_SQUARE_BONUS.items():
+    PIECE_SQUARE_VALUES["w" + _kind] = tuple(PIECE_VALUES[_kind] + _bonus[square] for square in range(64))
+    PIECE_SQUARE_VALUES["b" + _kind] = tuple(PIECE_VALUES[_kind] + _bonus[square ^ 56] for square in range(64))
+
+
+def score_to_table(score, ply):
+    """ Mate scores are stored as distance from stored position instead of distance from root """
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    """ Converts stored mate score back to distance from root """
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    """ Raised inside search when time budget runs out """
+
+
+class SearchResult():
+    """ This class holds best move found by search and search statistics """
+
+    def __init__(self, move, score, depth, nodes, seconds):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        self.nodes_per_second = nodes / seconds if seconds else 0
+
+    def __str__(self):
+        """ returns search statistics as string """
+        return f"depth {self.depth} score {self.score} nodes {self.nodes} time {self.seconds:.3f}s speed {self.nodes_per_second:.0f} nodes/s"
+
+
+class Engine():
+    """ This class searches for the best move of current player within a time budget """
+
+    def __init__(self, time_limit_ms=1000, max_depth=64, hash_size_mb=16, opening_book=None, tablebases=None):
+        self.time_limit_ms = time_limit_ms
+        self.max_depth = max_depth
+        self.transposition_table = TranspositionTable(hash_size_mb)
+        # OpeningBook moves are played without searching
+        self.opening_book = opening_book
+        # Tablebases give exact score of endgame positions without searching them
+        self.tablebases = tablebases
+        self.move_orderer = MoveOrderer()
+        # event set by another process to stop search early
+        self.stop_event = None
+        self.nodes = 0
+        self.deadline = 0
+        self.path_hashes = []
+        self.history_counts = {}
+
+    def evaluate(self, game_state):
+        """ Returns material and piece placement score from current player point of view """
+        score = 0
+        for name, bitboard in game_state.position.pieces.items():
+            values = PIECE_SQUARE_VALUES[name]
+            if name[0] == "w":
+                for square in iterate_squares(bitboard):
+                    score += values[square]
+            else:
+                for square in iterate_squares(bitboard):
+                    score -= values[square]
+        return score if game_state.current_player.color == "w" else -score
+
+    def search(self, game_state, time_limit_ms=None, start_depth=1, shuffle_seed=None):
+        """
+        Searches deeper and deeper until time runs out, returns SearchResult with best move of deepest finished search.
+        Parallel helpers start deeper or shuffle root moves, so they do not repeat work of the main search
+        """
+        time_limit_ms = self.time_limit_ms if time_limit_ms is None else time_limit_ms
+        start = time.perf_counter()
+        self.deadline = start + time_limit_ms / 1000
+        self.nodes = 0
+        book_move = self.opening_book.choose_move(game_state) if self.opening_book is not None else None
+        if book_move is not None:
+            return SearchResult(book_move, 0, 0, 0, time.perf_counter() - start)
+        self.path_hashes = [game_state.hash]
+        self.history_counts = game_state.move_tracker.position_counts if game_state.move_tracker else {}
+        self.move_orderer.new_search()
+        # root moves come from position status, so position shown in GUI is not generated again
+        root_moves = [(game_state.pos_to_piece(start), tile, promotion)
+                      for start, tile, promotion in game_state.find_position_status().legal_moves]
+        root_moves = self.order_moves(game_state, root_moves)
+        if not root_moves:
+            return SearchResult(None, 0, 0, 0, time.perf_counter() - start)
+        if shuffle_seed is not None:
+            random.Random(shuffle_seed).shuffle(root_moves)
+
+        best_move, best_score, depth_reached = root_moves[0], 0, 0
+        undo_depth = len(game_state.undo_stack)
+        for depth in range(min(start_depth, self.max_depth), self.max_depth + 1):
+            try:
+                score, move = self.search_root(game_state, root_moves, depth)
+            except SearchTimeout:
+                while len(game_state.undo_stack) > undo_depth:
+                    game_state.unmake_move()
+                del self.path_hashes[1:]
+                break
+            best_move, best_score, depth_reached = move, score, depth
+            # best move of finished iteration is searched first in the next one
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            if abs(score) >= MATE_THRESHOLD:
+                break
+            if time.perf_counter() - start > time_limit_ms / 1000 * ITERATION_TIME_SHARE:
+                break
+        return SearchResult(best_move, best_score, depth_reached, self.nodes, time.perf_counter() - start)
+
+    def search_root(self, game_state, root_moves, depth):
+        """ Searches every root move to given depth, returns best score and move """
+        alpha = -INFINITY
+        best_move = root_moves[0]
+        for move in root_moves:
+            game_state.make_move(*move)
+            self.path_hashes.append(game_state.hash)
+            score = -self.negamax(game_state, depth - 1, -INFINITY, -alpha, 1)
+            self.path_hashes.pop()
+            game_state.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return alpha, best_move
+
+    def negamax(self, game_state, depth, alpha, beta, ply):
+        """ Alpha-beta search returning score of position from current player point of view """
+        self.count_node()
+        if self.is_draw(game_state):
+            return 0
+        if self.tablebases is not None:
+            result = self.tablebases.probe(game_state)
+            if result is not None:
+                return self.tablebase_score(result, ply)
+        if depth <= 0:
+            return self.quiescence(game_state, alpha, beta, ply)
+
+        position_hash = self.path_hashes[-1]
+        entry = self.transposition_table.probe(position_hash)
+        hash_move = 0
+        if entry is not None:
+            entry_depth, entry_score, bound, hash_move = entry
+            if entry_depth >= depth:
+                entry_score = score_from_table(entry_score, ply)
+                if bound == EXACT or (bound == LOWER_BOUND and entry_score >= beta) or (bound == UPPER_BOUND and entry_score <= alpha):
+                    return entry_score
+
+        moves = game_state.find_all_legal_moves()
+        if not moves:
+            return -MATE_SCORE + ply if game_state.check_if_player_in_check() else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        for index, move in enumerate(self.order_moves(game_state, moves, hash_move, ply)):
+            game_state.make_move(*move)
+            self.path_hashes.append(game_state.hash)
+            score = -self.negamax(game_state, depth - 1, -beta, -alpha, ply + 1)
+            self.path_hashes.pop()
+            game_state.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = encode_move(*move)
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.move_orderer.record_cutoff(game_state, move, ply, depth, index)
+                        break
+
+        if best_score >= beta:
+            bound = LOWER_BOUND
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER_BOUND
+        self.transposition_table.store(position_hash, depth, score_to_table(best_score, ply), bound, best_move)
+        return best_score
+
+    def quiescence(self, game_state, alpha, beta, ply):
+        """ Searches captures and promotions only, so position is not evaluated in the middle of an exchange """
+        stand_pat = self.evaluate(game_state)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        best_score = stand_pat
+        for move in self.order_moves(game_state, [move for move in game_state.find_all_legal_moves() if self.is_noisy(game_state, move)]):
+            self.count_node()
+            game_state.make_move(*move)
+            score = -self.quiescence(game_state, -beta, -alpha, ply + 1)
+            game_state.unmake_move()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    def tablebase_score(self, result, ply):
+        """ Converts tablebase (wdl, dtm) to search score, mate found sooner scores better """
+        wdl, dtm = result
+        if wdl > 0:
+            return MATE_SCORE - ply - dtm
+        if wdl < 0:
+            return -MATE_SCORE + ply + dtm
+        return 0
+
+    def order_moves(self, game_state, moves, hash_move=0, ply=None):
+        """ Sorts moves so the ones most likely to cause a cutoff are searched first """
+        return self.move_orderer.order(game_state, moves, hash_move, ply)
+
+    def is_noisy(self, game_state, move):
+        """ Checks if move captures a piece or promotes a pawn to queen """
+        piece, tile, promotion = move
+        if promotion is not None:
+            return promotion == "q"
+        return game_state.is_occupied(tile) or (piece.name[1] == "p" and tile == game_state.en_passant_square)
+
+    def is_draw(self, game_state):
+        """ Checks repetition of position on search path or in game history, fifty move rule and lack of mating material """
+        if game_state.halfmove_clock >= 100:
+            return True
+        position_hash = self.path_hashes[-1]
+        # only positions after last capture or pawn move can repeat
+        if position_hash in self.path_hashes[-game_state.halfmove_clock - 1:-1] or (len(self.path_hashes) > 1 and position_hash in self.history_counts):
+            return True
+        return not game_state.can_player_mate() and not game_state.can_opponent_mate()
+
+    def close(self):
+        """ Single process engine has no workers to stop, exists so both engines can be used the same way """
+
+    def count_node(self):
+        """ Counts searched node and checks time budget and stop event every CLOCK_CHECK_NODES nodes """
+        self.nodes += 1
+        if not self.nodes % CLOCK_CHECK_NODES and (time.perf_counter() > self.deadline or (self.stop_event and self.stop_event.is_set())):
+            raise SearchTimeout()
+
+
+# engine of worker process, created once by pool initializer
+_worker_engine = None
+
+
+def _init_worker(time_limit_ms, max_depth, hash_size_mb, table_name, stop_event, tablebase_dir=None, ready=None):
+    global _worker_engine
+    tablebases = None
+    if tablebase_dir is not None:
+        # NumPy is needed only when tablebases are used
+        from tablebase import Tablebases
+        tablebases = Tablebases(tablebase_dir)
+    _worker_engine = Engine(time_limit_ms, max_depth, hash_size_mb, tablebases=tablebases)
+    _worker_engine.transposition_table = TranspositionTable(hash_size_mb, shared=True, name=table_name)
+    atexit.register(_worker_engine.transposition_table.close)
+    _worker_engine.stop_event = stop_event
+    if ready is not None:
+        ready.release()
+
+
+def _worker_search(fen, position_counts, time_limit_ms, worker_index):
+    move_tracker = MovesTracker()
+    move_tracker.position_counts = position_counts
+    game_state = GameState.from_fen(fen, move_tracker)
+    # every second helper searches one iteration ahead of the main worker
+    start_depth = 1 + worker_index % 2
+    shuffle_seed = worker_index if worker_index > 1 else None
+    result = _worker_engine.search(game_state, time_limit_ms, start_depth, shuffle_seed)
+    move = encode_move(*result.move) if result.move else None
+    return move, result.score, result.depth, result.nodes
+
+
+class ParallelEngine():
+    """ This class runs Engine searches of one position in several processes sharing transposition table in shared memory """
+
+    def __init__(self, workers=None, time_limit_ms=1000, max_depth=64, hash_size_mb=16, opening_book=None, tablebase_dir=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        if self.workers < 1:
+            raise ValueError("Number of workers has to be positive")
+        self.time_limit_ms = time_limit_ms
+        self.max_depth = max_depth
+        self.opening_book = opening_book
+        self.transposition_table = TranspositionTable(hash_size_mb, shared=True)
+        # forking a process running pygame threads can deadlock workers, so they start as fresh interpreters
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        # released by every worker once its engine is created
+        self.ready = context.Semaphore(0)
+        self.started = 0
+        self.pool = context.Pool(self.workers, _init_worker,
+                                 (time_limit_ms, max_depth, hash_size_mb, self.transposition_table.name, self.stop_event,
+                                  tablebase_dir, self.ready))
+
+    def warm_up(self):
+        """ Waits until every worker process has started and created its engine, so timing of next search excludes it """
+        while self.started < self.workers:
+            self.ready.acquire()
+            self.started += 1
+
+    def search(self, game_state, time_limit_ms=None):
+        """ Searches position in every worker, stops helpers once main worker finishes and returns deepest finished result """
+        time_limit_ms = self.time_limit_ms if time_limit_ms is None else time_limit_ms
+        start = time.perf_counter()
+        book_move = self.opening_book.choose_move(game_state) if self.opening_book is not None else None
+        if book_move is not None:
+            return SearchResult(book_move, 0, 0, 0, time.perf_counter() - start)
+        if not game_state.find_position_status().legal_moves:
+            return SearchResult(None, 0, 0, 0, time.perf_counter() - start)
+        fen = game_state.to_fen()
+        position_counts = game_state.move_tracker.position_counts if game_state.move_tracker else {}
+        self.stop_event.clear()
+        tasks = [self.pool.apply_async(_worker_search, (fen, position_counts, time_limit_ms, index)) for index in range(self.workers)]
+        tasks[0].wait()
+        self.stop_event.set()
+        results = [task.get() for task in tasks]
+
+        # deepest finished search wins, main worker wins ties
+        move, score, depth, _ = max(results, key=lambda result: result[2] if result[0] is not None else -1)
+        nodes = sum(result[3] for result in results)
+        move = game_state.decode_move(move) if move is not None else None
+        return SearchResult(move, score, depth, nodes, time.perf_counter() - start)
+
+    def close(self):
+        """ Stops worker processes and frees shared transposition table """
+        self.pool.close()
+        self.pool.join()
+        self.transposition_table.close()
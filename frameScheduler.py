@@ -0,0 +1,57 @@
+import pygame
+
+
+class FrameScheduler():
+    """
+    This class decides when main loop draws a frame. In event driven mode an idle window blocks on event queue
+    instead of redrawing at full frame rate, after input it keeps the frame rate for a moment to stay responsive
+    """
+
+    def __init__(self, event_driven=True, fps=60, idle_timeout_ms=500, active_ms=1000):
+        self.event_driven = event_driven
+        self.fps = fps
+        # longest time loop sleeps without events, lets clocks and animations wake it up
+        self.idle_timeout_ms = idle_timeout_ms
+        # how long after last input loop keeps running at full frame rate
+        self.active_ms = active_ms
+        self.clock = pygame.time.Clock()
+        self.last_activity = -active_ms
+        # first frame is always drawn
+        self.redraw_requested = True
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+
+    def is_active(self):
+        """ Checks if user gave input recently """
+        return pygame.time.get_ticks() - self.last_activity < self.active_ms
+
+    def wait_for_events(self, busy=False):
+        """ Returns events of the next frame, blocks until input or timeout when nothing is going on """
+        if not self.event_driven or busy or self.is_active():
+            self.clock.tick(self.fps)
+            events = pygame.event.get()
+        else:
+            event = pygame.event.wait(self.idle_timeout_ms)
+            events = [] if event.type == pygame.NOEVENT else [event] + pygame.event.get()
+            # clock measures only frames at full rate, not time spent sleeping
+            self.clock.tick()
+        if events:
+            self.last_activity = pygame.time.get_ticks()
+        return events
+
+    def request_redraw(self):
+        """ Makes next frame drawn even without input """
+        self.redraw_requested = True
+
+    def should_render(self, events, busy=False):
+        """ Checks if frame has to be drawn and counts rendered and skipped frames """
+        if not self.event_driven or busy or events or self.redraw_requested:
+            self.redraw_requested = False
+            self.frames_rendered += 1
+            return True
+        self.frames_skipped += 1
+        return False
+
+    def __str__(self):
+        """ returns rendered and skipped frames as string """
+        return f"frames rendered {self.frames_rendered} skipped {self.frames_skipped}"
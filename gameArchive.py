@@ -0,0 +1,211 @@
+"""
+This file converts a directory of saved games (text saves, PGN files and journals) into one binary archive and reads it
+back. Archive starts with magic bytes, then every game is a record: FEN length, number of plies, start position FEN
+(empty for the standard start position) and 16-bit move codes, same as in game journal.
+Games are read and written one at a time, so memory use does not depend on number of games
+
+Usage:
+    python gameArchive.py convert saved_games games.archive
+    python gameArchive.py stats games.archive
+"""
+
+import argparse
+import os
+import struct
+import time
+from gameJournal import read_journal
+from gameLoader import iter_games, replay_game
+from gameState import GameState, encode_move
+
+ARCHIVE_MAGIC = b"PWA1"
+# length of start position FEN and number of plies
+RECORD = struct.Struct("<HH")
+MOVE = struct.Struct("<H")
+SAVE_EXTENSIONS = (".txt", ".pgn", ".journal")
+# archive file is read in chunks of this many bytes
+READ_BUFFER = 1 << 20
+
+
+def write_game(file, fen, codes):
+    """ Appends one game record to open archive file """
+    fen_bytes = fen.encode() if fen else b""
+    file.write(RECORD.pack(len(fen_bytes), len(codes)) + fen_bytes + struct.pack(f"<{len(codes)}H", *codes))
+
+
+def iter_archive_records(path):
+    """ Yields (byte offset of record, start position FEN or None, list of move codes) for every game of archive """
+    with open(path, "rb", buffering=READ_BUFFER) as file:
+        if file.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise ValueError("Incorrect archive")
+        offset = len(ARCHIVE_MAGIC)
+        while True:
+            record = read_record(file)
+            if record is None:
+                return
+            yield (offset,) + record
+            offset = file.tell()
+
+
+def iter_archive(path):
+    """ Yields (start position FEN or None, list of move codes) for every game of archive """
+    for _, fen, codes in iter_archive_records(path):
+        yield fen, codes
+
+
+def read_archived_game(path, offset):
+    """ Returns (start position FEN or None, list of move codes) of the game record starting at given byte offset """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        record = read_record(file)
+    if record is None:
+        raise ValueError("Incorrect archive")
+    return record
+
+
+def read_record(file):
+    """ Reads one game record from file, returns None at the end of file """
+    header = file.read(RECORD.size)
+    if not header:
+        return None
+    if len(header) < RECORD.size:
+        raise ValueError("Incorrect archive")
+    fen_length, plies = RECORD.unpack(header)
+    data = file.read(fen_length + plies * MOVE.size)
+    if len(data) < fen_length + plies * MOVE.size:
+        raise ValueError("Incorrect archive")
+    fen = data[:fen_length].decode() if fen_length else None
+    return fen, list(struct.unpack_from(f"<{plies}H", data, fen_length))
+
+
+def decode_legal_move(game_state, code):
+    """ Returns (piece, tile, promotion) of move code, None when it is not a legal move of the position """
+    piece, tile, promotion = game_state.decode_move(code)
+    if piece is None or (piece.position, tile, promotion) not in game_state.find_cached_legal_moves():
+        return None
+    return piece, tile, promotion
+
+
+def replay_archived_game(fen, codes):
+    """ Plays archived game on a new GameState, yields game state before every move and after the last one,
+    ValueError when a move is not legal """
+    game_state = GameState.from_fen(fen) if fen else GameState()
+    for code in codes:
+        yield game_state
+        move = decode_legal_move(game_state, code)
+        if move is None:
+            raise ValueError(f"Incorrect move code {code}")
+        game_state.move_piece(*move)
+    yield game_state
+
+
+def legal_journal_codes(fen, codes):
+    """ Returns journal move codes up to the first one that is not legal, same plies recover_game replays """
+    game_state = GameState.from_fen(fen)
+    for index, code in enumerate(codes):
+        move = decode_legal_move(game_state, code)
+        if move is None:
+            return codes[:index]
+        game_state.move_piece(*move)
+    return codes
+
+
+def encode_game(game):
+    """ Returns move codes of LoadedGame, ValueError when one of its moves is not legal """
+    return [encode_move(piece, tile, promotion) for _, piece, tile, promotion in replay_game(game) if piece is not None]
+
+
+def iter_file_games(path):
+    """ Yields (start position FEN or None, move codes or ValueError) for every game of one save file """
+    if not path.lower().endswith(".journal"):
+        for game in iter_games(path):
+            try:
+                yield game.fen, encode_game(game)
+            except ValueError as error:
+                yield game.fen, error
+        return
+    try:
+        fen, codes = read_journal(path)
+        codes = legal_journal_codes(fen, codes)
+    except ValueError as error:
+        yield None, error
+        return
+    # a journal is started with every new game, also the ones closed before the first move
+    yield fen, codes if codes else ValueError("Journal without plies")
+
+
+def iter_saved_games(directory):
+    """
+    Yields (file path, start position FEN or None, move codes or ValueError) for every game of save directory.
+    A game already yielded from another file, like text save of a journaled game, comes with ValueError.
+    Only hashes of yielded games are kept to find repeated ones
+    """
+    start_fen = GameState().to_fen()
+    seen = set()
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.lower().endswith(SAVE_EXTENSIONS) or not os.path.isfile(path):
+            continue
+        for fen, codes in iter_file_games(path):
+            if not isinstance(codes, ValueError):
+                # journals store start position FEN also for the standard start position
+                key = hash((None if fen == start_fen else fen, tuple(codes)))
+                if key in seen:
+                    codes = ValueError("Game already archived")
+                seen.add(key)
+            yield path, fen, codes
+
+
+def convert_directory(directory, archive_path):
+    """ Writes every legal game of save directory to archive, returns dictionary with numbers of games and plies """
+    stats = {"files": set(), "games": 0, "plies": 0, "skipped": 0}
+    start = time.perf_counter()
+    with open(archive_path, "wb", buffering=READ_BUFFER) as file:
+        file.write(ARCHIVE_MAGIC)
+        for path, fen, codes in iter_saved_games(directory):
+            stats["files"].add(path)
+            if isinstance(codes, ValueError):
+                stats["skipped"] += 1
+                continue
+            write_game(file, fen, codes)
+            stats["games"] += 1
+            stats["plies"] += len(codes)
+    stats["files"] = len(stats["files"])
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def archive_stats(path):
+    """ Returns dictionary with numbers of games and plies of archive and its reading speed """
+    games = 0
+    plies = 0
+    start = time.perf_counter()
+    for _, codes in iter_archive(path):
+        games += 1
+        plies += len(codes)
+    seconds = time.perf_counter() - start
+    return {"games": games, "plies": plies, "seconds": seconds, "bytes": os.path.getsize(path),
+            "games_per_second": games / seconds if seconds else 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert saved games to binary archive")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert")
+    convert_parser.add_argument("directory")
+    convert_parser.add_argument("archive")
+    stats_parser = subparsers.add_parser("stats")
+    stats_parser.add_argument("archive")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        stats = convert_directory(args.directory, args.archive)
+        print(f"Files: {stats['files']}  Games: {stats['games']}  Plies: {stats['plies']}  "
+              f"Skipped: {stats['skipped']}  Time: {stats['seconds']:.3f}s")
+    else:
+        stats = archive_stats(args.archive)
+        print(f"Games: {stats['games']}  Plies: {stats['plies']}  Size: {stats['bytes']} bytes  "
+              f"Time: {stats['seconds']:.3f}s  Speed: {stats['games_per_second']:.0f} games/s")
+
+
+if __name__ == "__main__":
+    main()
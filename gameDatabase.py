@@ -0,0 +1,179 @@
+"""
+This file builds and reads game database: index of every position reached in archived games. Database holds a header,
+(position hash, game id, ply) records sorted by hash and byte offsets of games in the archive. File is opened with mmap
+and searched with binary search, so a lookup reads only a few pages of it.
+Building sorts records in runs of limited size written to temporary files and merges them, so the index can be
+larger than memory
+
+Usage:
+    python gameDatabase.py build games.archive games.database
+    python gameDatabase.py find games.database "<FEN>" --archive games.archive
+"""
+
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+import time
+from gameArchive import iter_archive_records, read_archived_game, replay_archived_game
+from gameState import GameState
+from mappedRecords import MappedRecords
+
+DATABASE_MAGIC = b"PWD1"
+# magic, number of records and number of games
+HEADER = struct.Struct("<4sQQ")
+# position hash, game id and ply, big-endian so byte order of records is their sort order
+POSITION = struct.Struct(">QIH")
+OFFSET = struct.Struct("<Q")
+# records sorted in memory at once while building
+RUN_SIZE = 1 << 20
+WRITE_BUFFER = 1 << 20
+
+
+def write_run(records, directory):
+    """ Sorts records and writes them to a new temporary run file, returns its path """
+    records.sort()
+    with tempfile.NamedTemporaryFile("wb", dir=directory, suffix=".run", delete=False) as file:
+        for record in records:
+            file.write(POSITION.pack(*record))
+    return file.name
+
+
+def iter_run(path):
+    """ Yields records of sorted run file """
+    with open(path, "rb", buffering=WRITE_BUFFER) as file:
+        while True:
+            data = file.read(POSITION.size * 4096)
+            if not data:
+                return
+            yield from POSITION.iter_unpack(data)
+
+
+def build_database(archive_path, database_path, run_size=RUN_SIZE):
+    """ Indexes every position of every legal archived game, returns dictionary with numbers of games, records, runs
+    and skipped games """
+    start = time.perf_counter()
+    directory = os.path.dirname(os.path.abspath(database_path))
+    runs = []
+    records = []
+    games = 0
+    skipped = 0
+    try:
+        with tempfile.TemporaryFile(dir=directory) as offsets:
+            for offset, fen, codes in iter_archive_records(archive_path):
+                offsets.write(OFFSET.pack(offset))
+                try:
+                    game_records = [(game_state.hash, games, ply) for ply, game_state in enumerate(replay_archived_game(fen, codes))]
+                except ValueError:
+                    # game with a move that is not legal keeps its id but none of its positions is indexed
+                    game_records = []
+                    skipped += 1
+                records += game_records
+                games += 1
+                if len(records) >= run_size:
+                    runs.append(write_run(records, directory))
+                    records = []
+            if records or not runs:
+                runs.append(write_run(records, directory))
+            records = []
+
+            count = 0
+            with open(database_path, "wb", buffering=WRITE_BUFFER) as file:
+                file.write(HEADER.pack(DATABASE_MAGIC, 0, games))
+                for record in heapq.merge(*[iter_run(run) for run in runs]):
+                    file.write(POSITION.pack(*record))
+                    count += 1
+                offsets.seek(0)
+                while True:
+                    data = offsets.read(WRITE_BUFFER)
+                    if not data:
+                        break
+                    file.write(data)
+                file.seek(0)
+                file.write(HEADER.pack(DATABASE_MAGIC, count, games))
+    finally:
+        for run in runs:
+            os.remove(run)
+    return {"games": games, "records": count, "runs": len(runs), "skipped": skipped, "bytes": os.path.getsize(database_path),
+            "seconds": time.perf_counter() - start}
+
+
+class GameDatabase():
+    """ This class finds archived games that reached a position, using memory mapped database file """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError("Incorrect database")
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError("Incorrect database")
+        magic, self.records, self.games = HEADER.unpack_from(self.map)
+        self.offsets_start = HEADER.size + self.records * POSITION.size
+        if magic != DATABASE_MAGIC or len(self.map) != self.offsets_start + self.games * OFFSET.size:
+            self.close()
+            raise ValueError("Incorrect database")
+        self.positions = MappedRecords(self.map, POSITION, HEADER.size, self.records)
+
+    def find(self, position_hash):
+        """ Returns list of (game id, ply) of every time position with given hash was reached """
+        return [(game_id, ply) for _, game_id, ply in self.positions.find(position_hash)]
+
+    def find_position(self, game_state):
+        """ Returns list of (game id, ply) of every time position of game state was reached """
+        return self.find(game_state.hash)
+
+    def game_offset(self, game_id):
+        """ Returns byte offset of game record in archive """
+        if not 0 <= game_id < self.games:
+            raise ValueError("Incorrect game id")
+        return OFFSET.unpack_from(self.map, self.offsets_start + game_id * OFFSET.size)[0]
+
+    def load_game(self, archive_path, game_id):
+        """ Returns (start position FEN or None, list of move codes) of archived game """
+        return read_archived_game(archive_path, self.game_offset(game_id))
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and search index of archived game positions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build")
+    build_parser.add_argument("archive")
+    build_parser.add_argument("database")
+    build_parser.add_argument("--run-size", type=int, default=RUN_SIZE)
+    find_parser = subparsers.add_parser("find")
+    find_parser.add_argument("database")
+    find_parser.add_argument("fen")
+    find_parser.add_argument("--archive")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stats = build_database(args.archive, args.database, args.run_size)
+        print(f"Games: {stats['games']}  Records: {stats['records']}  Runs: {stats['runs']}  Skipped: {stats['skipped']}  "
+              f"Size: {stats['bytes']} bytes  Time: {stats['seconds']:.3f}s")
+        return
+    database = GameDatabase(args.database)
+    game_state = GameState.from_fen(args.fen)
+    start = time.perf_counter()
+    found = database.find_position(game_state)
+    seconds = time.perf_counter() - start
+    for game_id, ply in found:
+        line = f"Game {game_id}  ply {ply}"
+        if args.archive:
+            line += f"  plies {len(database.load_game(args.archive, game_id)[1])}"
+        print(line)
+    print(f"Found: {len(found)}  Lookup: {seconds * 1e6:.1f}us")
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
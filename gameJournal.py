@@ -0,0 +1,115 @@
+"""
+This file contains append-only binary journal of a game. Journal starts with a header holding the start position FEN,
+then every ply takes 2 bytes (16-bit move code: start square, target square and promotion piece)
+
+Usage:
+    python gameJournal.py saved_games/<name>.journal           (prints recovered position and moves)
+    python gameJournal.py saved_games/<name>.journal --text    (also writes the text move record)
+"""
+
+import argparse
+import os
+import struct
+import time
+from gameState import GameState, encode_move
+from movesTracker import MovesTracker
+
+JOURNAL_MAGIC = b"PWJ1"
+# magic and length of start position FEN
+HEADER = struct.Struct("<4sH")
+MOVE = struct.Struct("<H")
+
+
+class GameJournal():
+    """
+    This class appends every ply to a journal file as the game goes. Plies wait in the file buffer and are written
+    and forced to disk with fsync in batches, so a crash loses at most the last unsynced batch and recovery stops there
+    """
+
+    def __init__(self, path, start_fen, fsync_every=4, fsync_interval=2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.file = open(path, "wb")
+        fen_bytes = start_fen.encode()
+        self.file.write(HEADER.pack(JOURNAL_MAGIC, len(fen_bytes)) + fen_bytes)
+        self.plies = 0
+        self.pending = 0
+        self.syncs = 0
+        self.sync()
+
+    def append(self, piece, tile, promotion=None):
+        """ Buffers one ply, writes batch of plies to disk when enough of them waits or enough time passed """
+        # pawn reaching last row without chosen piece is promoted to queen by GameState.make_move
+        if promotion is None and piece.name[1] == "p" and tile[0] in (0, 7):
+            promotion = "q"
+        self.file.write(MOVE.pack(encode_move(piece, tile, promotion)))
+        self.plies += 1
+        self.pending += 1
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """ Forces every written ply to disk """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self.syncs += 1
+
+    def close(self):
+        """ Syncs and closes journal file """
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
+def read_journal(path):
+    """ Returns start position FEN and list of move codes, incomplete last ply of a cut journal is skipped """
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        raise ValueError("Incorrect journal")
+    magic, fen_length = HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC or len(data) < HEADER.size + fen_length:
+        raise ValueError("Incorrect journal")
+    fen = data[HEADER.size:HEADER.size + fen_length].decode()
+    moves_data = data[HEADER.size + fen_length:]
+    moves_data = moves_data[:len(moves_data) - len(moves_data) % MOVE.size]
+    return fen, [code for (code,) in MOVE.iter_unpack(moves_data)]
+
+
+def recover_game(path, move_tracker=None):
+    """ Rebuilds GameState from journal, replay stops at the first ply that is not legal in the rebuilt position """
+    fen, codes = read_journal(path)
+    game_state = GameState.from_fen(fen, move_tracker)
+    # start position is counted for repetition, same as in GameManager and self-play
+    if move_tracker is not None:
+        move_tracker.record_board(game_state)
+    for code in codes:
+        piece, tile, promotion = game_state.decode_move(code)
+        if piece is None or (piece.position, tile, promotion) not in game_state.find_cached_legal_moves():
+            break
+        game_state.move_piece(piece, tile, promotion)
+        if move_tracker is not None:
+            move_tracker.record_board(game_state)
+    return game_state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recover game from binary journal")
+    parser.add_argument("path")
+    parser.add_argument("--text", action="store_true")
+    args = parser.parse_args()
+
+    move_tracker = MovesTracker()
+    game_state = recover_game(args.path, move_tracker)
+    for index, move in enumerate(move_tracker.move_record, 1):
+        print(f"{index}. {move['w']} {move['b']}")
+    print(game_state.to_fen())
+    if args.text:
+        move_tracker.save_move_record()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+This file reads saved games one at a time: MovesTracker text saves (E2->E4 rows) and PGN files with any number of games.
+Files are read line by line, so memory use does not depend on file size
+"""
+
+import re
+from gameState import GameState
+
+FILES = "ABCDEFGH"
+SAN_PIECES = {"K": "k", "Q": "q", "R": "r", "B": "b", "N": "h"}
+SAN_PROMOTIONS = {"Q": "q", "R": "r", "B": "b", "N": "h"}
+GAME_RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+# [letter][number]->[letter][number] move of MovesTracker text save
+TEXT_MOVE = re.compile(r"([A-H][1-8])->([A-H][1-8])")
+PGN_TAG = re.compile(r'\[(\w+)\s+"(.*)"\]')
+SAN_MOVE = re.compile(r"^([KQRBN])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([QRBN]))?$")
+
+
+class LoadedGame():
+    """ This class holds one game read from a file: its tags, start position and move tokens """
+
+    def __init__(self, source, moves, tags=None):
+        self.source = source
+        self.moves = moves
+        self.tags = tags or {}
+        self.fen = self.tags.get("FEN")
+
+
+def string_to_pos(square):
+    """ Converts [letter][number] square to (row, column) position, the opposite of MovesTracker.pos_to_string """
+    return 8 - int(square[1]), FILES.index(square[0].upper())
+
+
+def iter_text_games(path):
+    """ Yields the one game of MovesTracker text save """
+    moves = []
+    with open(path) as file:
+        for line in file:
+            moves += [start + "->" + target for start, target in TEXT_MOVE.findall(line)]
+    yield LoadedGame(path, moves)
+
+
+def iter_pgn_games(path):
+    """ Yields games of PGN file one by one """
+    tags = {}
+    moves = []
+    comment_depth = 0
+    variation_depth = 0
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line and not comment_depth:
+                continue
+            if line.startswith("[") and not comment_depth and not variation_depth:
+                # tags after move text start the next game
+                if moves:
+                    yield LoadedGame(path, moves, tags)
+                    tags, moves = {}, []
+                match = PGN_TAG.match(line)
+                if match:
+                    tags[match.group(1)] = match.group(2)
+                continue
+            if line.startswith("%") or (line.startswith(";") and not comment_depth):
+                continue
+            for token in re.findall(r"[{}()]|;.*|[^\s{}()]+", line):
+                if token == "{":
+                    comment_depth += 1
+                elif token == "}":
+                    comment_depth = max(comment_depth - 1, 0)
+                elif comment_depth or token.startswith(";"):
+                    continue
+                elif token == "(":
+                    variation_depth += 1
+                elif token == ")":
+                    variation_depth = max(variation_depth - 1, 0)
+                elif variation_depth or token.startswith("$"):
+                    continue
+                elif token in GAME_RESULTS:
+                    yield LoadedGame(path, moves, tags)
+                    tags, moves = {}, []
+                else:
+                    # move numbers like 12. or 12... can be glued to the move
+                    move = re.sub(r"^\d+\.+", "", token)
+                    if move:
+                        moves.append(move)
+    if moves:
+        yield LoadedGame(path, moves, tags)
+
+
+def iter_games(path):
+    """ Yields games of a text save or PGN file depending on its extension """
+    if path.lower().endswith(".pgn"):
+        return iter_pgn_games(path)
+    return iter_text_games(path)
+
+
+def parse_move(game_state, token):
+    """ Returns (piece, tile, promotion) legal move given in E2->E4 or SAN notation, ValueError when it is not legal """
+    legal_moves = game_state.find_cached_legal_moves()
+    text_move = TEXT_MOVE.fullmatch(token)
+    if text_move:
+        start, tile = string_to_pos(text_move.group(1)), string_to_pos(text_move.group(2))
+        # text saves do not record promotion piece, pawns were always promoted to queen
+        candidates = [move for move in legal_moves if move[0] == start and move[1] == tile and move[2] in (None, "q")]
+    else:
+        candidates = find_san_candidates(game_state, token.rstrip("+#!?"), legal_moves)
+    if len(candidates) != 1:
+        raise ValueError(f"Incorrect move {token}")
+    start, tile, promotion = candidates[0]
+    return game_state.pos_to_piece(start), tile, promotion
+
+
+def find_san_candidates(game_state, san, legal_moves):
+    """ Returns legal (start, tile, promotion) moves matching Standard Algebraic Notation move """
+    row = 7 if game_state.current_player.color == "w" else 0
+    if san in ["O-O", "0-0"]:
+        return [move for move in legal_moves if move[0] == (row, 4) and move[1] == (row, 6) and game_state.pos_to_piece((row, 4)).name[1] == "k"]
+    if san in ["O-O-O", "0-0-0"]:
+        return [move for move in legal_moves if move[0] == (row, 4) and move[1] == (row, 2) and game_state.pos_to_piece((row, 4)).name[1] == "k"]
+    match = SAN_MOVE.match(san)
+    if not match:
+        return []
+    piece_letter, from_file, from_rank, target, promotion_letter = match.groups()
+    kind = SAN_PIECES[piece_letter] if piece_letter else "p"
+    tile = string_to_pos(target)
+    promotion = SAN_PROMOTIONS[promotion_letter] if promotion_letter else None
+    candidates = []
+    for start, move_tile, move_promotion in legal_moves:
+        if move_tile != tile or move_promotion != promotion or game_state.pos_to_piece(start).name[1] != kind:
+            continue
+        if from_file and start[1] != FILES.index(from_file.upper()):
+            continue
+        if from_rank and start[0] != 8 - int(from_rank):
+            continue
+        candidates.append((start, move_tile, move_promotion))
+    return candidates
+
+
+def replay_game(game, move_tracker=None):
+    """ Plays moves of LoadedGame on a new GameState, yields (game state, piece, tile, promotion) before every move
+    and the final game state with None move after the last one. Same GameState object is used for every position """
+    game_state = GameState.from_fen(game.fen, move_tracker) if game.fen else GameState(move_tracker=move_tracker)
+    for token in game.moves:
+        piece, tile, promotion = parse_move(game_state, token)
+        yield game_state, piece, tile, promotion
+        game_state.move_piece(piece, tile, promotion)
+    yield game_state, None, None, None
@@ -1,7 +1,13 @@
+import os
+from datetime import datetime
 import pygame
 from gameState import GameState
 from display import Display
 from movesTracker import MovesTracker
+from engine import Engine, ParallelEngine
+from movePrecomputer import MovePrecomputer
+from gameJournal import GameJournal
+from openingBook import OpeningBook
 
 
 class GameManager():
@@ -9,32 +15,75 @@ class GameManager():
     # Debug settings
     highlight_available_moves = False
 
-    def __init__(self, window, board_size, tile_colors):
+    def __init__(self, window, board_size, tile_colors, engine_colors=(), engine_time_ms=1000, engine_workers=1, dirty_rendering=False,
+                 journal_dir=None, opening_book_path=None, tablebase_dir=None, tablebase_adjudication=False):
         if window.get_width() < board_size or window.get_height() < board_size:
             raise ValueError("window is to small to contain board")
+        if any(color not in ["w", "b"] for color in engine_colors):
+            raise ValueError("Engine color can only be set to 'b' or 'w'")
         self.window = window
         self.tile_colors = tile_colors
         self.board_size = board_size
+        # colors played by computer
+        self.engine_colors = engine_colors
+        # computer plays book moves without searching while the game is in the book
+        self.opening_book = OpeningBook(opening_book_path) if opening_book_path is not None else None
+        # tables generated with tablebase.py let computer play won endgames perfectly
+        self.tablebases = None
+        # drawn endgames end the game only in games against computer and only when asked for
+        self.tablebase_adjudication = tablebase_adjudication and bool(engine_colors)
+        if tablebase_dir is not None:
+            # NumPy is needed only when tablebases are used
+            from tablebase import Tablebases
+            self.tablebases = Tablebases(tablebase_dir)
+        # game between two people needs no engine
+        self.engine = None
+        # more than one worker searches in parallel processes, every worker loads its own tablebases
+        if engine_colors and engine_workers > 1:
+            self.engine = ParallelEngine(engine_workers, engine_time_ms, opening_book=self.opening_book, tablebase_dir=tablebase_dir)
+        elif engine_colors:
+            self.engine = Engine(engine_time_ms, opening_book=self.opening_book, tablebases=self.tablebases)
+        self.last_search_result = None
+        # redraw only changed tiles and panels, window is then updated with display.dirty_rects only
+        self.dirty_rendering = dirty_rendering
+        # every game is journaled to this directory as it is played, so a crash does not lose it
+        self.journal_dir = journal_dir
+        self.move_tracker = None
         self.init_new_game()
 
     def init_new_game(self):
         """ Restarts every important variable setting up a new game """
         self.display = Display(self.window, self.board_size)
+        self.close_journal()
         self.move_tracker = MovesTracker()
         self.game_state = GameState(move_tracker=self.move_tracker)
+        self.game_state.tablebases = self.tablebases
+        self.game_state.adjudicate_tablebase_draws = self.tablebase_adjudication
+        # start position counts towards threefold repetition like every position reached by a move
+        self.move_tracker.record_board(self.game_state)
         self.piece_in_hand = None
         self.is_player_in_check = (False, None)
         self.game_over_data = {"is_over": False, "winner": "", "end_type": ""}
+        # hash of position whose check and game over state is shown
+        self.applied_status_hash = None
         self.currently_valid_moves = []
-        self.an_passant_tiles = {}
-        self.castle_tiles = {}
+        # legal moves, check and game over state of the current position are computed in background
+        self.move_precomputer = MovePrecomputer()
+        self.move_precomputer.start(self.game_state)
 
     def update(self, events):
         """ Game loop """
-        self.display.draw_board(self.tile_colors)
+        self.display.dirty_rects = []
+        self.apply_precomputed_position()
+        # Let computer play its move, game could have just ended so its state is awaited
+        if self.is_engine_turn() and self.apply_precomputed_position(wait=True) and self.is_engine_turn():
+            result = self.engine.search(self.game_state)
+            self.last_search_result = result
+            if result.move is not None:
+                self.play_move(*result.move)
         # Wait for player move
         for event in events:
-            if event.type == pygame.MOUSEBUTTONUP:
+            if event.type == pygame.MOUSEBUTTONUP and not self.is_engine_turn():
                 clicked_tile = self.mouse_pos_to_tile(pygame.mouse.get_pos())
                 # Grabbing a piece
                 if self.piece_in_hand is None or clicked_tile not in self.currently_valid_moves:
@@ -44,40 +93,21 @@ class GameManager():
                     else:
                         self.piece_in_hand = None
                 # Moving a piece
-                else:
-                    self.game_state.move_piece(self.piece_in_hand, clicked_tile)
-                    self.move_tracker.record_board(self.game_state)
+                elif self.apply_precomputed_position(wait=True) and not self.game_over_data["is_over"]:
+                    self.play_move(self.piece_in_hand, clicked_tile)
                     self.piece_in_hand = None
-                    # Check if under check
-                    if self.game_state.check_if_player_in_check():
-                        self.is_player_in_check = (True, [self.game_state.find_kings()[0]])
-                    else:
-                        self.is_player_in_check = (False, None)
-                    # Check if game over
-                    # Move repetition
-                    if self.check_for_move_repetition():
-                        self.game_over_data["is_over"] = True
-                        self.game_over_data["winner"] = "Draw"
-                        self.game_over_data["end_type"] = "Move repetition"
-                    if len(self.game_state.find_all_player_moves()) == 0:
-                        if self.is_player_in_check[0]:
-                            # Checkmate
-                            self.game_over_data["is_over"] = True
-                            self.game_over_data["winner"] = "Black won" if self.game_state.current_player.color == "w" else "White won"
-                            self.game_over_data["end_type"] = "Checkmate"
-                        else:
-                            # Stalemate
-                            self.game_over_data["is_over"] = True
-                            self.game_over_data["winner"] = "Draw"
-                            self.game_over_data["end_type"] = "Stalemate"
-                    elif not self.game_state.can_opponent_mate() and not self.game_state.can_player_mate():
-                        # Not enough material
-                        self.game_over_data["is_over"] = True
-                        self.game_over_data["winner"] = "Draw"
-                        self.game_over_data["end_type"] = "Not enough mate material"
 
                 # Update valid moves to highlight
-                self.currently_valid_moves = self.game_state.piece_valid_tiles(self.piece_in_hand)
+                self.currently_valid_moves = self.find_valid_tiles(self.piece_in_hand)
+
+        if self.dirty_rendering:
+            self.draw_changed_regions()
+        else:
+            self.draw_everything()
+
+    def draw_everything(self):
+        """ Draws whole board and both panels """
+        self.display.draw_board(self.tile_colors)
 
         # Highlight checks
         if self.is_player_in_check:
@@ -101,13 +131,115 @@ class GameManager():
         self.display.show_move_record(self.move_tracker.move_record)
 
         # Display player score
+        self.display.show_player_score(*self.find_player_score_strings())
+
+    def draw_changed_regions(self):
+        """ Draws only tiles and panels that changed since last frame """
+        self.display.draw_changed_tiles(self.tile_colors, self.find_tile_contents())
+
+        # Display game over screen if needed
+        if self.game_over_data["is_over"]:
+            self.display.display_game_over_screen(self.game_over_data["winner"], self.game_over_data["end_type"], self)
+
+        # Display move record
+        move_record = self.move_tracker.move_record
+        last_move = (move_record[-1]["w"], move_record[-1]["b"]) if move_record else None
+        self.display.draw_changed_panel("move_record", (len(move_record), last_move), self.display.move_record_rect(),
+                                        self.display.show_move_record, move_record)
+
+        # Display player score
+        scores = self.find_player_score_strings()
+        self.display.draw_changed_panel("player_score", scores, self.display.player_score_rect(),
+                                        self.display.show_player_score, *scores)
+
+    def find_tile_contents(self):
+        """ Returns (highlight under piece, piece name, highlights over piece) for every tile """
+        check_tiles = self.is_player_in_check[1] or []
+        over_highlights = {}
+        for tile in self.currently_valid_moves or []:
+            over_highlights.setdefault(tile, []).append(((9, 188, 138), 8))
+        if self.highlight_available_moves:
+            for tile in self.game_state.find_all_player_moves():
+                over_highlights.setdefault(tile, []).append(((255, 0, 0), 8))
+        tile_contents = {}
+        for row in range(8):
+            for column in range(8):
+                piece = self.game_state.board[row][column]
+                tile_contents[(row, column)] = (((255, 0, 0), 2) if (row, column) in check_tiles else None,
+                                                piece.name if piece is not None else None,
+                                                tuple(over_highlights.get((row, column), ())))
+        return tile_contents
+
+    def find_player_score_strings(self):
+        """ Returns score advantage texts of white and black player """
         score_diff_white = self.game_state.plr_white.get_score() - self.game_state.plr_black.get_score()
         if score_diff_white > 0:
-            self.display.show_player_score("+" + str(score_diff_white), "")
-        elif score_diff_white < 0:
-            self.display.show_player_score("", "+" + str(-score_diff_white))
-        else:
-            self.display.show_player_score("", "")
+            return "+" + str(score_diff_white), ""
+        if score_diff_white < 0:
+            return "", "+" + str(-score_diff_white)
+        return "", ""
+
+    def is_engine_turn(self):
+        """ Checks if computer plays current player color """
+        return self.game_state.current_player.color in self.engine_colors and not self.game_over_data["is_over"]
+
+    def play_move(self, piece, tile, promotion=None):
+        """ Moves a piece, check and game over state of new position are computed in background """
+        # journal is started with the first move, so games closed before it leave no file
+        if self.journal_dir is not None and self.move_tracker.journal is None:
+            file_name = datetime.now().strftime("%d.%m.%Y_%H.%M.%S.%f") + ".journal"
+            self.move_tracker.journal = GameJournal(os.path.join(self.journal_dir, file_name), self.game_state.to_fen())
+        self.game_state.move_piece(piece, tile, promotion)
+        self.move_tracker.record_board(self.game_state)
+        self.move_precomputer.start(self.game_state)
+
+    def apply_precomputed_position(self, wait=False):
+        """ Takes check and game over state of current position once background computation is done,
+        returns PositionStatus or None when it is not ready """
+        status = self.move_precomputer.get(self.game_state.hash, wait)
+        if status is not None:
+            # status computed on a copy is shared with game state, so nothing asks for it again
+            self.game_state.remember_position_status(status)
+        elif wait:
+            # background computation failed, position is computed here instead
+            status = self.game_state.find_position_status()
+        if status is not None:
+            self.is_player_in_check = (True, [status.king_position]) if status.in_check else (False, None)
+            self.game_over_data = status.game_over_data()
+            self.applied_status_hash = self.game_state.hash
+        return status
+
+    def is_status_pending(self):
+        """ Checks if check and game over state of current position is not shown yet """
+        return self.applied_status_hash != self.game_state.hash
+
+    def is_status_ready(self):
+        """ Checks if background computation finished a status that is not shown yet, so a frame has to be drawn """
+        return self.is_status_pending() and self.move_precomputer.get(self.game_state.hash) is not None
+
+    def find_valid_tiles(self, piece):
+        """ Returns tiles piece can move to, taken from precomputed moves when they are ready """
+        if piece is None:
+            return []
+        status = self.move_precomputer.get(self.game_state.hash)
+        if status is not None:
+            return status.legal_tiles().get(piece.position, [])
+        # click came before background computation finished, only this piece is computed
+        self.move_precomputer.fallbacks += 1
+        return self.game_state.piece_valid_tiles(piece)
+
+    def close_journal(self):
+        """ Writes rest of the journal of current game to disk """
+        if self.move_tracker is not None and self.move_tracker.journal is not None:
+            self.move_tracker.journal.close()
+
+    def close(self):
+        """ Stops engine workers, closes opening book and journal before the program ends """
+        if self.engine is not None:
+            self.engine.close()
+        if self.opening_book is not None:
+            self.opening_book.close()
+        self.close_journal()
 
     def mouse_pos_to_tile(self, pos):
         """ Takes mouse position and converts it to chess tile coordinates """
@@ -116,11 +248,4 @@ class GameManager():
 
     def check_for_move_repetition(self):
         """ Checks if tracker contains 3 same board positions """
-        if len(self.move_tracker.board_positions_recorded) < 3:
-            return False
-        board_dict = {}
-        for board in self.move_tracker.board_positions_recorded:
-            board_dict[board] = board_dict.get(board, 0) + 1
-            if board_dict[board] >= 3:
-                return True
-        return False
+        return self.move_tracker.repetition_found
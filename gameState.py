@@ -1,13 +1,90 @@
 from piece import Piece
 from player import Player
+from bitboards import BitboardPosition, bitboard_to_positions, iterate_squares, lowest_square, square_to_pos, FULL_BOARD
+from attackTables import BETWEEN, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, RAYS, \
+    bishop_attacks, first_blocker, queen_attacks, rook_attacks
+from zobrist import BLACK_TO_MOVE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS, PIECE_KEYS
+from positionStatus import PositionStatus
+from lruCache import LRUCache
+
+# castling rights bits
+WHITE_SHORT_CASTLE = 1
+WHITE_LONG_CASTLE = 2
+BLACK_SHORT_CASTLE = 4
+BLACK_LONG_CASTLE = 8
+
+PROMOTION_PIECES = ("q", "r", "b", "h")
+# promotion piece code used in 16-bit move encoding, 0 means no promotion
+PROMOTION_CODES = {None: 0, "q": 1, "r": 2, "b": 3, "h": 4}
+
+# Forsyth-Edwards Notation letters
+FEN_PIECE_NAMES = {"P": "wp", "N": "wh", "B": "wb", "R": "wr", "Q": "wq", "K": "wk",
+                   "p": "bp", "n": "bh", "b": "bb", "r": "br", "q": "bq", "k": "bk"}
+FEN_PIECE_LETTERS = {name: letter for letter, name in FEN_PIECE_NAMES.items()}
+FEN_CASTLING_RIGHTS = {"K": WHITE_SHORT_CASTLE, "Q": WHITE_LONG_CASTLE, "k": BLACK_SHORT_CASTLE, "q": BLACK_LONG_CASTLE}
+
+# castle right: (king position, rook position, king target, rook target)
+CASTLES = {
+    WHITE_SHORT_CASTLE: ((7, 4), (7, 7), (7, 6), (7, 5)),
+    WHITE_LONG_CASTLE: ((7, 4), (7, 0), (7, 2), (7, 3)),
+    BLACK_SHORT_CASTLE: ((0, 4), (0, 7), (0, 6), (0, 5)),
+    BLACK_LONG_CASTLE: ((0, 4), (0, 0), (0, 2), (0, 3))
+}
+
+# memoized position statuses are forgotten all at once when there are more of them
+POSITION_STATUS_CACHE_SIZE = 4096
+# number of positions whose legal moves are remembered
+LEGAL_MOVE_CACHE_SIZE = 1024
+
+# castling rights lost when a piece moves from or to given position
+CASTLING_RIGHTS_LOST = {
+    (7, 4): WHITE_SHORT_CASTLE | WHITE_LONG_CASTLE,
+    (7, 7): WHITE_SHORT_CASTLE,
+    (7, 0): WHITE_LONG_CASTLE,
+    (0, 4): BLACK_SHORT_CASTLE | BLACK_LONG_CASTLE,
+    (0, 7): BLACK_SHORT_CASTLE,
+    (0, 0): BLACK_LONG_CASTLE
+}
+
+
+def encode_move(piece, tile, promotion=None):
+    """ Packs move into 16 bits: 6 bits start square, 6 bits target square and 3 bits promotion piece """
+    return (piece.position[0] * 8 + piece.position[1]) | (tile[0] * 8 + tile[1]) << 6 | PROMOTION_CODES[promotion] << 12
+
+
+class BoardRow(list):
+    """ Row of the board that keeps bitboards, player pieces and scores in sync with every piece assignment """
+
+    def __init__(self, game_state, row, pieces):
+        super().__init__(pieces)
+        self.game_state = game_state
+        self.row = row
+
+    def __setitem__(self, column, piece):
+        square = self.row * 8 + column
+        old_piece = list.__getitem__(self, column)
+        if old_piece is not None:
+            self.game_state.position.remove_piece(old_piece.name, square)
+            self.game_state.player_of(old_piece).remove_piece(old_piece)
+        if piece is not None:
+            self.game_state.position.add_piece(piece.name, square)
+            self.game_state.player_of(piece).add_piece(piece)
+        list.__setitem__(self, column, piece)
 
 
 class GameState():
     """ This class is responsible for keeping current pieces positions, and returning board data """
+    # Tablebases probed by game over logic, set on an instance so other games do not use them
+    tablebases = None
+    # ending a game drawn in tablebases is adjudication, not a chess rule, so it is off unless turned on
+    adjudicate_tablebase_draws = False
 
     def __init__(self, board=None, current_player_color="w", move_tracker=None, is_simulated=False):
         # set up a new board if optional board is not given
-        self.board = self.initialize_board() if not board else board
+        board = self.initialize_board() if not board else board
+        # bitboards are the source for occupancy queries, board rows keep them and player pieces in sync
+        self.position = BitboardPosition(board)
+        self.board = [BoardRow(self, row, board[row]) for row in range(8)]
 
         # assign players
         self.plr_black = Player("b", self.find_all_pieces_of_color("b"))
@@ -19,10 +96,113 @@ class GameState():
         self.lastly_moved_piece = None
         self.is_simulated = is_simulated
         self.move_tracker = move_tracker
-
-        # lists for unusual actions that can occur during piece move
-        self.an_passant_tiles = {}
-        self.castle_tiles = {}
+        self.castling_rights = self.find_castling_rights()
+        self.en_passant_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.undo_stack = []
+
+        # Zobrist hash of side to move, castling rights and en passant, pieces part is kept by bitboards
+        self.en_passant_hash = 0
+        self.state_hash = CASTLING_KEYS[self.castling_rights] ^ (BLACK_TO_MOVE_KEY if current_player_color == "b" else 0)
+
+        # (position hash, repetition found) -> PositionStatus
+        self.position_statuses = {}
+        # (position hash, castling rights, en passant square) -> legal moves of positions seen by GUI,
+        # moving a piece changes position key so old moves are never served
+        self.legal_move_cache = LRUCache(LEGAL_MOVE_CACHE_SIZE)
+
+    @property
+    def hash(self):
+        """ Zobrist hash of the whole position """
+        return self.position.hash ^ self.state_hash
+
+    def calculate_hash(self):
+        """ Computes Zobrist hash from scratch, used to verify the incremental one """
+        key = CASTLING_KEYS[self.castling_rights]
+        if self.current_player.color == "b":
+            key ^= BLACK_TO_MOVE_KEY
+        for name, bitboard in self.position.pieces.items():
+            for square in iterate_squares(bitboard):
+                key ^= PIECE_KEYS[name][square]
+        return key ^ self.find_en_passant_hash()
+
+    def find_en_passant_hash(self):
+        """ Returns en passant part of the hash, it is set only when current player pawn can capture """
+        if self.en_passant_square is None:
+            return 0
+        pawn_row = self.en_passant_square[0] + (1 if self.current_player.color == "w" else -1)
+        pawns = self.position.pieces[self.current_player.color + "p"]
+        for column in (self.en_passant_square[1] - 1, self.en_passant_square[1] + 1):
+            if 0 <= column < 8 and pawns >> (pawn_row * 8 + column) & 1:
+                return EN_PASSANT_KEYS[self.en_passant_square[1]]
+        return 0
+
+    @classmethod
+    def from_fen(cls, fen, move_tracker=None):
+        """ Creates game state from Forsyth-Edwards Notation string """
+        fields = fen.split()
+        if len(fields) != 6:
+            raise ValueError("Incorrect FEN")
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("Incorrect FEN")
+        board = [[None for _ in range(8)] for _ in range(8)]
+        for row, row_str in enumerate(rows):
+            column = 0
+            for char in row_str:
+                if char.isdigit():
+                    column += int(char)
+                elif char in FEN_PIECE_NAMES and column < 8:
+                    board[row][column] = Piece(FEN_PIECE_NAMES[char], (row, column))
+                    column += 1
+                else:
+                    raise ValueError("Incorrect FEN")
+            if column != 8:
+                raise ValueError("Incorrect FEN")
+        if fields[1] not in ["w", "b"]:
+            raise ValueError("Incorrect FEN")
+
+        game_state = cls(board, fields[1], move_tracker)
+        game_state.castling_rights = 0
+        for char in fields[2].replace("-", ""):
+            if char not in FEN_CASTLING_RIGHTS:
+                raise ValueError("Incorrect FEN")
+            game_state.castling_rights |= FEN_CASTLING_RIGHTS[char]
+        if fields[3] != "-":
+            # square behind pawn that has just moved two tiles, so on 6th rank when white is to move
+            if len(fields[3]) != 2 or fields[3][0] not in "abcdefgh" or fields[3][1] != ("6" if fields[1] == "w" else "3"):
+                raise ValueError("Incorrect FEN")
+            game_state.en_passant_square = (8 - int(fields[3][1]), ord(fields[3][0]) - ord("a"))
+        if not fields[4].isdigit() or not fields[5].isdigit():
+            raise ValueError("Incorrect FEN")
+        game_state.halfmove_clock = int(fields[4])
+        game_state.fullmove_number = int(fields[5])
+        game_state.en_passant_hash = game_state.find_en_passant_hash()
+        game_state.state_hash = game_state.calculate_hash() ^ game_state.position.hash
+        return game_state
+
+    def to_fen(self):
+        """ Converts game state to Forsyth-Edwards Notation string """
+        rows = []
+        for row in range(8):
+            row_str = ""
+            empty = 0
+            for column in range(8):
+                piece = self.board[row][column]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row_str += str(empty)
+                    empty = 0
+                row_str += FEN_PIECE_LETTERS[piece.name]
+            rows.append(row_str + (str(empty) if empty else ""))
+        castling = "".join(char for char, right in FEN_CASTLING_RIGHTS.items() if self.castling_rights & right) or "-"
+        en_passant = "-"
+        if self.en_passant_square is not None:
+            en_passant = "abcdefgh"[self.en_passant_square[1]] + str(8 - self.en_passant_square[0])
+        return f"{'/'.join(rows)} {self.current_player.color} {castling} {en_passant} {self.halfmove_clock} {self.fullmove_number}"
 
     def initialize_board(self):
         """ Creates new board """
@@ -89,47 +269,173 @@ class GameState():
         if pieces_count == 1:
             return False
 
-    def move_piece(self, piece, position):
+    def find_position_status(self):
+        """ Returns PositionStatus with check, legal moves and game result found in one legal move generation,
+        status is memoized so every caller asking about the same position shares it """
+        repetition_found = self.move_tracker is not None and self.move_tracker.repetition_found
+        key = (self.hash, repetition_found)
+        status = self.position_statuses.get(key)
+        if status is not None:
+            return status
+
+        legal_moves = self.find_cached_legal_moves()
+        king_position = self.find_kings()[0]
+        status = PositionStatus(key, self.check_if_player_in_check(), king_position, legal_moves)
+        if not legal_moves:
+            if status.in_check:
+                status.is_over, status.end_type = True, "Checkmate"
+                status.winner = "Black won" if self.current_player.color == "w" else "White won"
+            else:
+                status.is_over, status.winner, status.end_type = True, "Draw", "Stalemate"
+        elif repetition_found:
+            status.is_over, status.winner, status.end_type = True, "Draw", "Move repetition"
+        elif not self.can_opponent_mate() and not self.can_player_mate():
+            status.is_over, status.winner, status.end_type = True, "Draw", "Not enough mate material"
+        elif self.tablebases is not None:
+            status.tablebase_result = self.tablebases.probe(self)
+            # nobody can force mate from a drawn tablebase position
+            if self.adjudicate_tablebase_draws and status.tablebase_result is not None and status.tablebase_result[0] == 0:
+                status.is_over, status.winner, status.end_type = True, "Draw", "Tablebase draw"
+        self.remember_position_status(status)
+        return status
+
+    def remember_position_status(self, status):
+        """ Memoizes status, for example one computed on a copy of this position """
+        if len(self.position_statuses) >= POSITION_STATUS_CACHE_SIZE:
+            self.position_statuses = {}
+        self.position_statuses[status.key] = status
+
+    def find_game_over_data(self):
+        """ Checks repetition, checkmate, stalemate and lack of mating material,
+        returns dictionary with is_over, winner and end_type keys """
+        return self.find_position_status().game_over_data()
+
+    def move_piece(self, piece, position, promotion=None):
         """ Moves piece from its position to a given one """
         # Saves move to tracker if it exists
         if self.move_tracker:
-            self.move_tracker.record_move(piece, position, self.current_player.color)
+            self.move_tracker.record_move(piece, position, self.current_player.color, promotion)
+        self.make_move(piece, position, promotion)
+
+    def make_move(self, piece, position, promotion=None):
+        """ Makes a move in place and pushes everything needed to take it back on the undo stack """
+        start = piece.position
+        color = piece.name[0]
+
+        # en passant captures pawn standing next to the moving one
+        captured_pos = position
+        if piece.name[1] == "p" and position == self.en_passant_square and start[1] != position[1]:
+            captured_pos = (start[0], position[1])
+        captured_piece = self.board[captured_pos[0]][captured_pos[1]]
+
+        # king moving two tiles sideways is a castle
+        castle_rook = None
+        if piece.name[1] == "k" and start[0] == position[0] and abs(position[1] - start[1]) == 2:
+            rook_pos = (start[0], 7 if position[1] > start[1] else 0)
+            if self.board[rook_pos[0]][rook_pos[1]] is not None:
+                castle_rook = (rook_pos, (start[0], (start[1] + position[1]) // 2))
+
+        self.undo_stack.append((
+            piece, start, position, piece.name, captured_piece, captured_pos, castle_rook,
+            self.castling_rights, self.en_passant_square, self.halfmove_clock, self.fullmove_number, self.lastly_moved_piece,
+            self.current_player, self.state_hash, self.en_passant_hash
+        ))
 
         # Change positions
-        self.board[piece.position[0]][piece.position[1]] = None
-        self.board[position[0]][position[1]] = piece
-        piece.set_position((position[0], position[1]))
+        if captured_piece is not None:
+            self.board[captured_pos[0]][captured_pos[1]] = None
+        self.board[start[0]][start[1]] = None
+        piece.set_position(position)
 
         # Check for pawn promotion
-        promotion_tile = 0 if self.current_player.color == "w" else 7
-        if self.pos_to_piece(position).name[1] == "p" and position[0] == promotion_tile:
-            self.pos_to_piece(position).name = self.current_player.color + "q"
-
-        # check if move was an passant
-        if position in self.an_passant_tiles:
-            self.remove_a_piece(self.an_passant_tiles[position])
-            self.an_passant_tiles = {}
-
-        # check if move was a castle
-        if position in self.castle_tiles:
-            self.pos_to_piece(self.castle_tiles[position][1]).set_position(self.castle_tiles[position][0])
-            self.board[self.castle_tiles[position][0][0]][self.castle_tiles[position][0][1]] = self.pos_to_piece(self.castle_tiles[position][1])
-            self.remove_a_piece(self.castle_tiles[position][1])
+        promotion_tile = 0 if color == "w" else 7
+        if piece.name[1] == "p" and position[0] == promotion_tile:
+            piece.name = color + (promotion or "q")
+        self.board[position[0]][position[1]] = piece
 
-        # variable changes
+        # Move rook if move was a castle
+        if castle_rook:
+            rook = self.board[castle_rook[0][0]][castle_rook[0][1]]
+            self.board[castle_rook[0][0]][castle_rook[0][1]] = None
+            self.board[castle_rook[1][0]][castle_rook[1][1]] = rook
+            rook.set_position(castle_rook[1])
+
+        # variable changes, pieces part of the hash was updated by the board
+        old_rights = self.castling_rights
+        self.castling_rights &= ~(CASTLING_RIGHTS_LOST.get(start, 0) | CASTLING_RIGHTS_LOST.get(position, 0))
+        self.state_hash ^= CASTLING_KEYS[old_rights] ^ CASTLING_KEYS[self.castling_rights] ^ self.en_passant_hash
+        self.en_passant_hash = 0
+        if piece.name[1] == "p" and abs(position[0] - start[0]) == 2:
+            self.en_passant_square = ((start[0] + position[0]) // 2, start[1])
+            # en passant is hashed only when an enemy pawn can actually capture
+            enemy_pawns = self.position.pieces[("b" if color == "w" else "w") + "p"]
+            square = position[0] * 8 + position[1]
+            if (position[1] > 0 and enemy_pawns >> (square - 1) & 1) or (position[1] < 7 and enemy_pawns >> (square + 1) & 1):
+                self.en_passant_hash = EN_PASSANT_KEYS[position[1]]
+                self.state_hash ^= self.en_passant_hash
+        else:
+            self.en_passant_square = None
+        if captured_piece is not None or piece.name[1] == "p":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.current_player.color == "b":
+            self.fullmove_number += 1
         self.lastly_moved_piece = piece
 
         # switch players
-        self.current_player = self.plr_white if self.current_player.color == "b" else self.plr_black
-        self.current_opponent = self.plr_black if self.current_player.color == "w" else self.plr_white
-
-        # update pieces
-        self.plr_black.pieces = self.find_all_pieces_of_color("b")
-        self.plr_white.pieces = self.find_all_pieces_of_color("w")
-
-        # update dictionaries
-        self.an_passant_tiles = {}
-        self.castle_tiles = {}
+        self.switch_players()
+
+    def decode_move(self, code):
+        """ Unpacks 16-bit move into (piece, tile, promotion) tuple using pieces of this board """
+        start = square_to_pos(code & 63)
+        promotion = (None,) + PROMOTION_PIECES
+        return self.pos_to_piece(start), square_to_pos((code >> 6) & 63), promotion[(code >> 12) & 7]
+
+    def unmake_move(self):
+        """ Takes back lastly made move restoring exactly the previous state """
+        (piece, start, position, name, captured_piece, captured_pos, castle_rook,
+         self.castling_rights, self.en_passant_square, self.halfmove_clock, self.fullmove_number, self.lastly_moved_piece,
+         current_player, self.state_hash, self.en_passant_hash) = self.undo_stack.pop()
+
+        if castle_rook:
+            rook = self.board[castle_rook[1][0]][castle_rook[1][1]]
+            self.board[castle_rook[1][0]][castle_rook[1][1]] = None
+            self.board[castle_rook[0][0]][castle_rook[0][1]] = rook
+            rook.position = castle_rook[0]
+            rook.move_count -= 1
+
+        self.board[position[0]][position[1]] = None
+        piece.name = name
+        piece.position = start
+        piece.move_count -= 1
+        self.board[start[0]][start[1]] = piece
+        if captured_piece is not None:
+            self.board[captured_pos[0]][captured_pos[1]] = captured_piece
+
+        self.current_player = current_player
+        self.current_opponent = self.plr_black if current_player.color == "w" else self.plr_white
+
+    def player_of(self, piece):
+        """ Returns player owning given piece """
+        return self.plr_white if piece.name[0] == "w" else self.plr_black
+
+    def switch_players(self):
+        """ Gives the move to the other player """
+        self.current_player, self.current_opponent = self.current_opponent, self.current_player
+        self.state_hash ^= BLACK_TO_MOVE_KEY
+
+    def find_castling_rights(self):
+        """ Finds castles still available judging by kings and rooks that have not moved yet """
+        rights = 0
+        for right, (king_pos, rook_pos, _, _) in CASTLES.items():
+            king = self.pos_to_piece(king_pos)
+            rook = self.pos_to_piece(rook_pos)
+            color = "w" if king_pos[0] == 7 else "b"
+            if king is not None and king.name == color + "k" and king.move_count == 0 \
+                    and rook is not None and rook.name == color + "r" and rook.move_count == 0:
+                rights |= right
+        return rights
 
     def pos_to_piece(self, pos):
         """ returns piece standing at given position """
@@ -139,74 +445,138 @@ class GameState():
         """ Empties a position on board """
         self.board[pos[0]][pos[1]] = None
 
+    def is_occupied(self, pos):
+        """ Checks if any piece stands on given position """
+        return bool(self.position.occupied >> (pos[0] * 8 + pos[1]) & 1)
+
     def is_current_player_piece(self, pos):
         """ Checks if piece standing on given position belongs to current player """
-        if not self.pos_to_piece(pos):
-            return False
-        return self.pos_to_piece(pos) in self.current_player.pieces
+        return bool(self.position.colors[self.current_player.color] >> (pos[0] * 8 + pos[1]) & 1)
 
     def find_kings(self):
         """ returns tuple where index 0 is current player king tile and index 1 is opponents king tile """
-        enemy_king = ()
-        player_king = ()
-        for piece in self.current_opponent.pieces:
-            if piece.name[1] == "k":
-                enemy_king = piece.position
-        for piece in self.current_player.pieces:
-            if piece.name[1] == "k":
-                player_king = piece.position
-        return (player_king, enemy_king)
+        player_king = lowest_square(self.position.pieces[self.current_player.color + "k"])
+        enemy_king = lowest_square(self.position.pieces[self.current_opponent.color + "k"])
+        return (square_to_pos(player_king) if player_king is not None else (),
+                square_to_pos(enemy_king) if enemy_king is not None else ())
 
     def find_all_pieces_of_color(self, color):
         """ Finds pieces that belong to white or black player """
         if color not in ["w", "b"]:
             raise ValueError("Wrong color input")
         found_pieces = []
-        for row in range(8):
-            for column in range(8):
-                if self.pos_to_piece((row, column)) is not None and self.pos_to_piece((row, column)).get_player() == color:
-                    found_pieces.append(self.pos_to_piece((row, column)))
+        for square in iterate_squares(self.position.colors[color]):
+            found_pieces.append(self.board[square >> 3][square & 7])
         return found_pieces
 
+    def position_key(self):
+        """ Returns position hash together with castling rights and en passant square """
+        return self.hash, self.castling_rights, self.en_passant_square
+
+    def find_cached_legal_moves(self):
+        """ returns legal moves of current player as (start, tile, promotion) tuples from legal move cache,
+        moves are generated only for position seen for the first time """
+        key = self.position_key()
+        moves = self.legal_move_cache.get(key)
+        if moves is None:
+            moves = tuple((piece.position, tile, promotion) for piece, tile, promotion in self.find_all_legal_moves())
+            self.legal_move_cache.put(key, moves)
+        return moves
+
+    def find_cached_piece_tiles(self, position):
+        """ returns tiles piece standing on given position can move to, taken from legal move cache """
+        tiles = []
+        for start, tile, promotion in self.find_cached_legal_moves():
+            if start == position and tile not in tiles:
+                tiles.append(tile)
+        return tiles
+
     def find_all_player_moves(self):
         """ returns every possible move of every piece of current player """
         possible_moves = []
-        for piece in self.current_player.pieces:
-            possible_moves += self.piece_valid_tiles(piece)
+        if self.is_simulated:
+            # simulated en passant reorders pieces list, so a copy is iterated
+            for piece in list(self.current_player.pieces):
+                possible_moves += self.piece_valid_tiles(piece)
+            return possible_moves
+        last_move = None
+        for start, tile, promotion in self.find_cached_legal_moves():
+            # promotions of one pawn move are listed one after another
+            if (start, tile) != last_move:
+                possible_moves.append(tile)
+                last_move = (start, tile)
         return possible_moves
 
+    def find_all_legal_moves(self):
+        """ returns every legal move of current player as (piece, tile, promotion) tuples,
+        pawn reaching last row gets one move for every promotion piece """
+        legal_moves = []
+        checks_and_pins = self.find_checks_and_pins()
+        promotion_tile = 0 if self.current_player.color == "w" else 7
+        for piece in list(self.current_player.pieces):
+            for tile in self.piece_valid_tiles(piece, checks_and_pins):
+                if piece.name[1] == "p" and tile[0] == promotion_tile:
+                    for promotion in PROMOTION_PIECES:
+                        legal_moves.append((piece, tile, promotion))
+                else:
+                    legal_moves.append((piece, tile, None))
+        return legal_moves
+
     def find_all_opponent_moves(self):
         """ return every possible move of every piece of current opponent """
-        board_copy = self.duplicate_board()
-        simulated_board = GameState(board_copy, self.current_opponent.color, is_simulated=True)
-        return simulated_board.find_all_player_moves()
+        saved_state = (self.is_simulated, self.en_passant_square)
+        self.switch_players()
+        self.is_simulated = True
+        self.en_passant_square = None
+        try:
+            return self.find_all_player_moves()
+        finally:
+            self.switch_players()
+            self.is_simulated, self.en_passant_square = saved_state
 
     def check_if_opponent_in_check(self):
         """ checks if any of current players pieces can capture enemy king """
-        enemy_king_name = self.current_opponent.color + "k"
-        for tile in self.find_all_player_moves():
-            if self.pos_to_piece(tile) is not None and self.pos_to_piece(tile).name == enemy_king_name:
-                return True
-        return False
+        enemy_king = lowest_square(self.position.pieces[self.current_opponent.color + "k"])
+        if enemy_king is None:
+            return False
+        return self.is_square_attacked(square_to_pos(enemy_king), self.current_player.color)
 
     def check_if_player_in_check(self):
         """ Checks if any of opponent pieces can capture players king """
-        player_king_name = self.current_player.color + "k"
-        for tile in self.find_all_opponent_moves():
-            if self.pos_to_piece(tile) is not None and self.pos_to_piece(tile).name == player_king_name:
-                return True
-        return False
+        player_king = lowest_square(self.position.pieces[self.current_player.color + "k"])
+        if player_king is None:
+            return False
+        return self.is_square_attacked(square_to_pos(player_king), self.current_opponent.color)
+
+    def is_square_attacked(self, pos, by_color, occupied=None):
+        """ Looks outward from given position along knight, king, pawn and sliding rays
+        and stops at the first piece of given color that attacks it """
+        pieces = self.position.pieces
+        if occupied is None:
+            occupied = self.position.occupied
+        square = pos[0] * 8 + pos[1]
+        # pawn of the other color standing on square would attack the same tiles attacking pawns stand on
+        if KNIGHT_ATTACKS[square] & pieces[by_color + "h"] \
+                or KING_ATTACKS[square] & pieces[by_color + "k"] \
+                or PAWN_ATTACKS["b" if by_color == "w" else "w"][square] & pieces[by_color + "p"]:
+            return True
+        queens = pieces[by_color + "q"]
+        straight_sliders = pieces[by_color + "r"] | queens
+        if straight_sliders and rook_attacks(square, occupied) & straight_sliders:
+            return True
+        diagonal_sliders = pieces[by_color + "b"] | queens
+        return bool(diagonal_sliders and bishop_attacks(square, occupied) & diagonal_sliders)
 
     def simulate_move_is_legal(self, current_player, piece, position):
         """ Function used to make abstract moves to detect if they are legal
         (for example, if moving a piece won't casuse a check in next move) """
-        board_copy = self.duplicate_board()
-        simulated_board = GameState(board_copy, current_player.color, is_simulated=True)
-        piece_simulated = simulated_board.pos_to_piece(piece.position)
-        simulated_board.move_piece(piece_simulated, position)
-        if simulated_board.check_if_opponent_in_check():
-            return False
-        return True
+        enemy_color = "b" if current_player.color == "w" else "w"
+        self.make_move(self.pos_to_piece(piece.position), position)
+        try:
+            king = lowest_square(self.position.pieces[current_player.color + "k"])
+            return king is None or not self.is_square_attacked(square_to_pos(king), enemy_color)
+        finally:
+            self.unmake_move()
 
     def check_if_valid_position(self, pos):
         """ Checks if position exists on a board """
@@ -214,146 +584,134 @@ class GameState():
 
     """ Next functions return moves avaiable for each piece on given position """
 
-    def piece_valid_tiles(self, piece):
+    def piece_valid_tiles(self, piece, checks_and_pins=None):
         if not piece:
             return []
+        # pieces of current player standing on the board are served from legal move cache
+        if (checks_and_pins is None and not self.is_simulated and piece.name[0] == self.current_player.color
+                and self.board[piece.position[0]][piece.position[1]] is piece):
+            return self.find_cached_piece_tiles(piece.position)
         moveset = {
-            "r": self.rook_valid_tiles(piece.position),
-            "h": self.knight_valid_tiles(piece.position),
-            "b": self.bishop_valid_tiles(piece.position),
-            "q": self.queen_valid_tiles(piece.position),
-            "k": self.king_valid_tiles(piece.position),
-            "p": self.pawn_valid_tiles(piece.position)
-        }
-        
+            "r": self.rook_valid_tiles,
+            "h": self.knight_valid_tiles,
+            "b": self.bishop_valid_tiles,
+            "q": self.queen_valid_tiles,
+            "k": self.king_valid_tiles,
+            "p": self.pawn_valid_tiles
+        }[piece.name[1]](piece.position)
+
         # if being in simulation return moveset early to avoid stack overflow
         if self.is_simulated:
-            return moveset[piece.name[1]]
-
-        # moveset that simulates every possible move to make sure it wont lead to checkmate in next move
-        real_correct_moveset = []
-        for move in moveset[piece.name[1]]:
-            if self.simulate_move_is_legal(self.current_player, piece, move):
-                real_correct_moveset.append(move)
-        return real_correct_moveset
+            return moveset
+
+        # moveset filtered with check and pin masks so it wont lead to checkmate in next move
+        if checks_and_pins is None:
+            checks_and_pins = self.find_checks_and_pins()
+        return self.filter_legal_moves(piece, moveset, checks_and_pins)
+
+    def find_checks_and_pins(self):
+        """ Looks outward from current player king once and returns tuple of
+        (number of checking pieces, mask of tiles that stop the check, dictionary of pinned piece square to its pin ray mask) """
+        color = self.current_player.color
+        enemy = self.current_opponent.color
+        pieces = self.position.pieces
+        king_square = lowest_square(pieces[color + "k"])
+        if king_square is None:
+            return 0, FULL_BOARD, {}
+        own_pieces = self.position.colors[color]
+        occupied = self.position.occupied
+        straight_sliders = pieces[enemy + "r"] | pieces[enemy + "q"]
+        diagonal_sliders = pieces[enemy + "b"] | pieces[enemy + "q"]
+
+        checkers = 0
+        check_mask = 0
+        pins = {}
+        for direction in range(8):
+            sliders = straight_sliders if direction < 4 else diagonal_sliders
+            if not RAYS[direction][king_square] & sliders:
+                continue
+            blockers = RAYS[direction][king_square] & occupied
+            nearest = first_blocker(direction, blockers)
+            if sliders >> nearest & 1:
+                checkers += 1
+                check_mask |= BETWEEN[king_square][nearest] | 1 << nearest
+            elif own_pieces >> nearest & 1:
+                blockers &= ~(1 << nearest)
+                if blockers:
+                    pinner = first_blocker(direction, blockers)
+                    if sliders >> pinner & 1:
+                        pins[nearest] = BETWEEN[king_square][pinner] | 1 << pinner
+
+        jumping_checkers = (KNIGHT_ATTACKS[king_square] & pieces[enemy + "h"]) | (PAWN_ATTACKS[color][king_square] & pieces[enemy + "p"])
+        if jumping_checkers:
+            checkers += bin(jumping_checkers).count("1")
+            check_mask |= jumping_checkers
+
+        if checkers == 0:
+            check_mask = FULL_BOARD
+        return checkers, check_mask, pins
+
+    def filter_legal_moves(self, piece, moveset, checks_and_pins):
+        """ Keeps moves that do not leave own king attacked, simulating only en passant captures """
+        checkers, check_mask, pins = checks_and_pins
+        start = piece.position
+        board_piece = self.pos_to_piece(start) or piece
+        if board_piece.name[1] == "k":
+            # king may not stand on or castle through an attacked tile, its own square stops blocking rays
+            enemy_color = self.current_opponent.color
+            occupied = self.position.occupied & ~(1 << (start[0] * 8 + start[1]))
+            legal_moves = []
+            for move in moveset:
+                if abs(move[1] - start[1]) == 2:
+                    if checkers or self.is_square_attacked((start[0], (start[1] + move[1]) // 2), enemy_color):
+                        continue
+                if not self.is_square_attacked(move, enemy_color, occupied):
+                    legal_moves.append(move)
+            return legal_moves
+        if checkers > 1:
+            return []
+        allowed_tiles = check_mask & pins.get(start[0] * 8 + start[1], FULL_BOARD)
+        legal_moves = []
+        for move in moveset:
+            if piece.name[1] == "p" and move == self.en_passant_square and move[1] != start[1]:
+                if self.simulate_move_is_legal(self.current_player, piece, move):
+                    legal_moves.append(move)
+            elif allowed_tiles >> (move[0] * 8 + move[1]) & 1:
+                legal_moves.append(move)
+        return legal_moves
 
     def rook_valid_tiles(self, pos):
-        valid_moves = []
-
-        def add_rook_moves(sign_x, sign_y):
-            for offset in range(1, 8):
-                offset_pos = (pos[0]+offset*sign_x, pos[1]+offset*sign_y)
-                if self.check_if_valid_position(offset_pos) and not self.is_current_player_piece(offset_pos):
-                    valid_moves.append(offset_pos)
-                    if self.pos_to_piece(offset_pos) is not None:
-                        break
-                else:
-                    break
-        # Rook horizontal movement: right
-        add_rook_moves(1, 0)
-        # Rook horizontal movement: left
-        add_rook_moves(-1, 0)
-        # Rook vertical movement: up
-        add_rook_moves(0, 1)
-        # Rook vertical movement: down
-        add_rook_moves(0, -1)
-        return valid_moves
+        attacks = rook_attacks(pos[0] * 8 + pos[1], self.position.occupied)
+        return bitboard_to_positions(attacks & ~self.position.colors[self.current_player.color])
 
     def knight_valid_tiles(self, pos):
-        valid_moves = []
-
-        def add_knight_moves(offset):
-            if self.check_if_valid_position(offset) \
-                    and not self.is_current_player_piece(offset):
-                valid_moves.append(offset)
-
-        # Top right
-        add_knight_moves((pos[0]-2, pos[1]+1))
-        add_knight_moves((pos[0]-1, pos[1]+2))
-        # Bottom right
-        add_knight_moves((pos[0]+2, pos[1]+1))
-        add_knight_moves((pos[0]+1, pos[1]+2))
-        # Bottom left
-        add_knight_moves((pos[0]+2, pos[1]-1))
-        add_knight_moves((pos[0]+1, pos[1]-2))
-        # Top left
-        add_knight_moves((pos[0]-2, pos[1]-1))
-        add_knight_moves((pos[0]-1, pos[1]-2))
-        return valid_moves
+        attacks = KNIGHT_ATTACKS[pos[0] * 8 + pos[1]]
+        return bitboard_to_positions(attacks & ~self.position.colors[self.current_player.color])
 
     def bishop_valid_tiles(self, pos):
-        valid_moves = []
-
-        def add_diagonal_moves(offset_x, offset_y):
-            for tile in range(1, 8):
-                offset = (pos[0]+tile*offset_x, pos[1]+tile*offset_y)
-                if self.check_if_valid_position(offset) and not self.is_current_player_piece(offset):
-                    valid_moves.append(offset)
-                    if self.pos_to_piece(offset) is not None:
-                        break
-                else:
-                    break
-
-        # Top right
-        add_diagonal_moves(-1, 1)
-        # Bottom right
-        add_diagonal_moves(1, 1)
-        # Bottom left
-        add_diagonal_moves(1, -1)
-        # Top left
-        add_diagonal_moves(-1, -1)
-
-        return valid_moves
+        attacks = bishop_attacks(pos[0] * 8 + pos[1], self.position.occupied)
+        return bitboard_to_positions(attacks & ~self.position.colors[self.current_player.color])
 
     def queen_valid_tiles(self, pos):
-        return self.rook_valid_tiles(pos) + self.bishop_valid_tiles(pos)
+        attacks = queen_attacks(pos[0] * 8 + pos[1], self.position.occupied)
+        return bitboard_to_positions(attacks & ~self.position.colors[self.current_player.color])
 
     def king_valid_tiles(self, pos):
-        valid_moves = []
-
-        def add_if_valid_move(offset_x, offset_y):
-            offset = (pos[0] + offset_x, pos[1] + offset_y)
-            if self.check_if_valid_position(offset) and not self.is_current_player_piece(offset):
-                valid_moves.append(offset)
-
-        add_if_valid_move(-1, -1)
-        add_if_valid_move(-1, 0)
-        add_if_valid_move(-1, 1)
-        add_if_valid_move(0, -1)
-        add_if_valid_move(0, 1)
-        add_if_valid_move(1, -1)
-        add_if_valid_move(1, 0)
-        add_if_valid_move(1, 1)
-
-        # short castle
-        short_castle_condition = True
-        for i in range(1, 3):
-            if not self.check_if_valid_position((pos[0], pos[1] + i)) or self.pos_to_piece((pos[0], pos[1] + i)) is not None:
-                short_castle_condition = False
-                break
-        r_pos = (pos[0], pos[1] + 3)
-        if not self.check_if_valid_position(r_pos) or not self.pos_to_piece(r_pos) is not None or not self.pos_to_piece(r_pos).name == self.current_player.color + "r" \
-                or self.pos_to_piece(r_pos).move_count != 0 or self.pos_to_piece(pos).move_count != 0:
-            short_castle_condition = False
-
-        if short_castle_condition:
-            valid_moves.append((pos[0], pos[1] + 2))
-            self.castle_tiles[(pos[0], pos[1] + 2)] = [(pos[0], pos[1] + 1), (pos[0], pos[1] + 3)]
-
-        # long castle
-        long_castle_condition = True
-        for i in range(1, 4):
-            if not self.check_if_valid_position((pos[0], pos[1] - i)) or self.pos_to_piece((pos[0], pos[1] - i)) is not None:
-                long_castle_condition = False
-                break
-        r_pos = (pos[0], pos[1] - 4)
-        if not self.check_if_valid_position(r_pos) or not self.pos_to_piece(r_pos) is not None or not self.pos_to_piece(r_pos).name == self.current_player.color + "r" \
-                or self.pos_to_piece(r_pos).move_count != 0 or self.pos_to_piece(pos).move_count != 0:
-            long_castle_condition = False
-
-        if long_castle_condition:
-            valid_moves.append((pos[0], pos[1] - 2))
-            self.castle_tiles[(pos[0], pos[1] - 2)] = [(pos[0], pos[1] - 1), (pos[0], pos[1] - 4)]
+        attacks = KING_ATTACKS[pos[0] * 8 + pos[1]]
+        valid_moves = bitboard_to_positions(attacks & ~self.position.colors[self.current_player.color])
+
+        # castles
+        color = self.current_player.color
+        for right, (king_pos, rook_pos, king_target, _) in CASTLES.items():
+            if not self.castling_rights & right or pos != king_pos or king_pos[0] != (7 if color == "w" else 0):
+                continue
+            rook = self.pos_to_piece(rook_pos)
+            if rook is None or rook.name != color + "r":
+                continue
+            step = 1 if rook_pos[1] > pos[1] else -1
+            if any(self.is_occupied((pos[0], column)) for column in range(pos[1] + step, rook_pos[1], step)):
+                continue
+            valid_moves.append(king_target)
 
         return valid_moves
 
@@ -367,35 +725,21 @@ class GameState():
 
         # basic move
         offset = (pos[0]+plr_offset, pos[1])
-        if self.check_if_valid_position(offset) and not self.pos_to_piece(offset) is not None:
+        if self.check_if_valid_position(offset) and not self.is_occupied(offset):
             valid_moves.append(offset)
 
-        # if first move
-        offset = (pos[0]+2*plr_offset, pos[1])
-        if self.check_if_valid_position(offset) and self.pos_to_piece(pos).move_count == 0 and not self.pos_to_piece(offset) is not None:
-            valid_moves.append(offset)
+            # if first move
+            offset = (pos[0]+2*plr_offset, pos[1])
+            if pos[0] == (6 if self.current_player.color == "w" else 1) and not self.is_occupied(offset):
+                valid_moves.append(offset)
 
         # capture moves
-        offset = (pos[0]+plr_offset, pos[1]+plr_offset)
-        if self.check_if_valid_position(offset) and (self.pos_to_piece(offset) is not None and not self.is_current_player_piece(offset)):
-            valid_moves.append(offset)
-        offset = (pos[0]+plr_offset, pos[1]-plr_offset)
-        if self.check_if_valid_position(offset) and (self.pos_to_piece(offset) is not None and not self.is_current_player_piece(offset)):
-            valid_moves.append(offset)
+        enemy_pieces = self.position.colors[self.current_opponent.color]
+        valid_moves += bitboard_to_positions(PAWN_ATTACKS[self.current_player.color][pos[0] * 8 + pos[1]] & enemy_pieces)
 
         # en passant
-        offset = (pos[0], pos[1] + plr_offset)
-        if self.check_if_valid_position(offset) and self.pos_to_piece(offset) is not None and not self.is_current_player_piece(offset) \
-            and self.pos_to_piece(offset).move_count == 1 and self.pos_to_piece(offset) == self.lastly_moved_piece \
-                and offset[0] == int((1/2)*plr_offset + 7/2) and self.pos_to_piece(offset).name[1] == "p":
-            valid_moves.append((offset[0]+plr_offset, offset[1]))
-            self.an_passant_tiles[(offset[0]+plr_offset, offset[1])] = offset
-
-        offset = (pos[0], pos[1] - plr_offset)
-        if self.check_if_valid_position(offset) and self.pos_to_piece(offset) is not None and not self.is_current_player_piece(offset) \
-            and self.pos_to_piece(offset).move_count == 1 and self.pos_to_piece(offset) == self.lastly_moved_piece \
-                and offset[0] == int((1/2)*plr_offset + 7/2) and self.pos_to_piece(offset).name[1] == "p":
-            valid_moves.append((offset[0]+plr_offset, offset[1]))
-            self.an_passant_tiles[(offset[0]+plr_offset, offset[1])] = offset
+        if self.en_passant_square is not None and self.en_passant_square[0] == pos[0] + plr_offset \
+                and abs(self.en_passant_square[1] - pos[1]) == 1:
+            valid_moves.append(self.en_passant_square)
 
         return valid_moves
@@ -0,0 +1,40 @@
+from collections import OrderedDict
+
+
+class LRUCache():
+    """ This class keeps a bounded number of values, least recently used value is dropped first """
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("Cache capacity has to be positive")
+        self.capacity = capacity
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, key):
+        """ Returns value stored for key or None """
+        value = self.values.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.values.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Stores value, drops least recently used value when cache is full """
+        self.values[key] = value
+        self.values.move_to_end(key)
+        if len(self.values) > self.capacity:
+            self.values.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self):
+        """ Returns part of lookups served from cache """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
@@ -0,0 +1,39 @@
+"""
+This file lets memory mapped files of fixed size records sorted by their first field be used as a sequence, so they are
+searched with bisect and only the records it compares are unpacked
+"""
+
+import bisect
+
+
+class MappedRecords():
+    """ This class is a read-only sequence of struct records stored one after another in a buffer """
+
+    def __init__(self, buffer, record, start, count):
+        self.buffer = buffer
+        self.record = record
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError("Record index out of range")
+        return self.record.unpack_from(self.buffer, self.start + index * self.record.size)
+
+    def lower_bound(self, key):
+        """ Returns index of the first record with first field not smaller than key """
+        # one element tuple is smaller than every record starting with the same key
+        return bisect.bisect_left(self, (key,))
+
+    def find(self, key):
+        """ Returns list of records with first field equal to key """
+        found = []
+        for index in range(self.lower_bound(key), self.count):
+            record = self[index]
+            if record[0] != key:
+                break
+            found.append(record)
+        return found
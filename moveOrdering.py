@@ -0,0 +1,98 @@
+"""
+This file contains move ordering used by search: transposition table move first, then captures by most valuable
+victim and least valuable attacker, then killer moves of the current ply and quiet moves ranked by history table
+"""
+
+from gameState import encode_move
+
+# piece values used only for sorting, king is the least wanted attacker
+VICTIM_VALUES = {"p": 1, "h": 3, "b": 3, "r": 5, "q": 9, "k": 0}
+ATTACKER_VALUES = {"p": 1, "h": 3, "b": 3, "r": 5, "q": 9, "k": 10}
+
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 20
+KILLER_SCORE = 1 << 19
+# history scores stay below killer moves, table is halved when one of them reaches this value
+HISTORY_LIMIT = KILLER_SCORE - 2
+KILLERS_PER_PLY = 2
+
+
+class MoveOrderer():
+    """ This class sorts moves for alpha-beta search and learns which quiet moves caused cutoffs """
+
+    def __init__(self, max_ply=128):
+        self.killers = [[0] * KILLERS_PER_PLY for _ in range(max_ply)]
+        # piece name -> cutoff score for every target square
+        self.history = {}
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        """ Forgets killer moves and cutoff counters, keeps halved history so older knowledge fades """
+        for ply_killers in self.killers:
+            ply_killers[:] = [0] * KILLERS_PER_PLY
+        self.age_history()
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def age_history(self):
+        """ Halves every history score """
+        for scores in self.history.values():
+            for square in range(64):
+                scores[square] >>= 1
+
+    def capture_score(self, game_state, piece, tile, promotion):
+        """ Returns most valuable victim / least valuable attacker score or 0 for quiet move """
+        victim = game_state.board[tile[0]][tile[1]]
+        if victim is not None:
+            score = VICTIM_VALUES[victim.name[1]] * 16 - ATTACKER_VALUES[piece.name[1]]
+        elif piece.name[1] == "p" and tile == game_state.en_passant_square:
+            score = VICTIM_VALUES["p"] * 16 - ATTACKER_VALUES["p"]
+        else:
+            score = 0
+        if promotion == "q":
+            score += VICTIM_VALUES["q"] * 16
+        return CAPTURE_SCORE + score if score > 0 else 0
+
+    def order(self, game_state, moves, hash_move=0, ply=None):
+        """ Returns moves sorted from the most promising, killer moves are used when ply is given """
+        killers = self.killers[ply] if ply is not None and ply < len(self.killers) else ()
+        history = self.history
+
+        def move_score(move):
+            piece, tile, promotion = move
+            code = encode_move(piece, tile, promotion)
+            if code == hash_move:
+                return HASH_MOVE_SCORE
+            score = self.capture_score(game_state, piece, tile, promotion)
+            if score:
+                return score
+            if code in killers:
+                return KILLER_SCORE + KILLERS_PER_PLY - killers.index(code)
+            scores = history.get(piece.name)
+            return scores[tile[0] * 8 + tile[1]] if scores else 0
+        return sorted(moves, key=move_score, reverse=True)
+
+    def record_cutoff(self, game_state, move, ply, depth, move_index):
+        """ Counts beta cutoff, quiet move causing it becomes killer of its ply and gains history score """
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        piece, tile, promotion = move
+        if self.capture_score(game_state, piece, tile, promotion):
+            return
+        if ply < len(self.killers):
+            code = encode_move(piece, tile, promotion)
+            ply_killers = self.killers[ply]
+            if ply_killers[0] != code:
+                ply_killers.pop()
+                ply_killers.insert(0, code)
+        scores = self.history.setdefault(piece.name, [0] * 64)
+        square = tile[0] * 8 + tile[1]
+        scores[square] += depth * depth
+        if scores[square] >= HISTORY_LIMIT:
+            self.age_history()
+
+    def first_move_cutoff_rate(self):
+        """ Returns part of cutoffs caused by the first searched move """
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0
@@ -0,0 +1,58 @@
+import threading
+from gameState import GameState
+from movesTracker import MovesTracker
+
+
+def precompute_position(fen, repetition_found, tablebases=None, adjudicate_tablebase_draws=False):
+    """ Returns PositionStatus of position given as FEN """
+    move_tracker = MovesTracker()
+    move_tracker.repetition_found = repetition_found
+    game_state = GameState.from_fen(fen, move_tracker)
+    game_state.tablebases = tablebases
+    game_state.adjudicate_tablebase_draws = adjudicate_tablebase_draws
+    return game_state.find_position_status()
+
+
+class MovePrecomputer():
+    """
+    This class computes legal moves of the position after a move on a background thread, so the frame drawing it
+    does not wait. Thread works on its own copy of the position, result of older position is thrown away
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.position_hash = None
+        self.result = None
+        self.started = 0
+        self.fallbacks = 0
+
+    def start(self, game_state):
+        """ Starts computing given position in background """
+        position_hash = game_state.hash
+        fen = game_state.to_fen()
+        repetition_found = game_state.move_tracker.repetition_found if game_state.move_tracker else False
+        with self.lock:
+            self.position_hash = position_hash
+            self.result = None
+        self.thread = threading.Thread(target=self.run, args=(position_hash, fen, repetition_found, game_state.tablebases,
+                                                              game_state.adjudicate_tablebase_draws), daemon=True)
+        self.thread.start()
+        self.started += 1
+
+    def run(self, position_hash, fen, repetition_found, tablebases=None, adjudicate_tablebase_draws=False):
+        result = precompute_position(fen, repetition_found, tablebases, adjudicate_tablebase_draws)
+        with self.lock:
+            # position could change while thread was working
+            if position_hash == self.position_hash:
+                self.result = result
+
+    def get(self, position_hash, wait=False):
+        """ Returns PositionStatus of given position, None when it is not ready yet and wait is False """
+        thread = self.thread
+        if wait and thread is not None and self.position_hash == position_hash:
+            thread.join()
+        with self.lock:
+            if self.result is not None and self.result.key[0] == position_hash:
+                return self.result
+        return None
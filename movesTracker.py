@@ -4,24 +4,43 @@ from datetime import datetime
 class MovesTracker():
     """ This class is responsible for remembering moves done by players and saving them to text file """
     
-    def __init__(self):
+    def __init__(self, journal=None):
         self.move_record = []
-        self.board_positions_recorded = []
+        # GameJournal every move is appended to as it is played
+        self.journal = journal
+        # position hash -> times it appeared since last irreversible move
+        self.position_counts = {}
+        self.last_halfmove_clock = 0
+        self.repetition_found = False
 
-    def record_move(self, piece, position, player_color):
+    def record_move(self, piece, position, player_color, promotion=None):
         """ records move to move_record in format: [letter][number]->[letter][number]"""
+        if self.journal is not None:
+            self.journal.append(piece, position, promotion)
         # convert move to string
         move_str = self.pos_to_string(piece.position) + "->" + self.pos_to_string(position)
         new_move = {}
         if player_color == "w":
             new_move = {"w": move_str, "b": ""}
             self.move_record.append(new_move)
+        elif not self.move_record:
+            # game started from position with black to move
+            self.move_record.append({"w": "", "b": move_str})
         else:
             self.move_record[len(self.move_record)-1]["b"] = move_str
 
     def record_board(self, game_state):
-        """ Saves board status as string """
-        self.board_positions_recorded.append(game_state.board_to_str(game_state.board))
+        """ Counts board position by its hash, returns how many times it appeared """
+        # positions from before a capture or pawn move can never appear again
+        if game_state.halfmove_clock < self.last_halfmove_clock:
+            self.position_counts = {}
+        self.last_halfmove_clock = game_state.halfmove_clock
+        position_hash = game_state.hash
+        count = self.position_counts.get(position_hash, 0) + 1
+        self.position_counts[position_hash] = count
+        if count >= 3:
+            self.repetition_found = True
+        return count
 
     def pos_to_string(self, pos):
         """ Converts position to format [letter][number] """
@@ -0,0 +1,174 @@
+"""
+This file reads and builds opening books in Polyglot format, so books made by other chess programs work too. A book is
+a list of 16-byte big-endian entries (Random64 key of position, move, weight, learn value) sorted by key, and the
+computer picks one of the moves of current position at random, more often the ones with bigger weight.
+Legal moves are generated only for positions found in the book, to leave out book moves that are not legal there
+
+Usage:
+    python openingBook.py build saved_games games.book --max-ply 20
+    python openingBook.py build games.archive games.book
+    python openingBook.py show games.book "<FEN>"
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+from collections import Counter
+from gameArchive import decode_legal_move, iter_archive, iter_saved_games, replay_archived_game
+from gameState import GameState
+from mappedRecords import MappedRecords
+from polyglotKeys import polyglot_key
+
+# position key, move, weight and learn value
+ENTRY = struct.Struct(">QHHI")
+# Polyglot promotion piece numbers
+POLYGLOT_PROMOTIONS = {None: 0, "h": 1, "b": 2, "r": 3, "q": 4}
+PROMOTION_PIECES = {code: piece for piece, code in POLYGLOT_PROMOTIONS.items()}
+MAX_WEIGHT = 0xFFFF
+# only this many first plies of every game are put to the book
+MAX_PLY = 20
+
+
+def encode_polyglot_move(piece, tile, promotion=None):
+    """ Packs move into Polyglot 16-bit move, castling is written as king taking its own rook """
+    start = piece.position
+    if piece.name[1] == "k" and abs(tile[1] - start[1]) == 2:
+        tile = (tile[0], 7 if tile[1] > start[1] else 0)
+    return ((7 - tile[0]) << 3 | tile[1]) | ((7 - start[0]) << 3 | start[1]) << 6 | POLYGLOT_PROMOTIONS[promotion] << 12
+
+
+def decode_polyglot_move(game_state, move):
+    """ Unpacks Polyglot move into (piece, tile, promotion) of given position, None when there is no such piece to move """
+    tile = (7 - (move >> 3 & 7), move & 7)
+    start = (7 - (move >> 9 & 7), move >> 6 & 7)
+    piece = game_state.pos_to_piece(start)
+    if piece is None or piece.name[0] != game_state.current_player.color:
+        return None
+    if piece.name[1] == "k" and start[1] == 4 and tile[0] == start[0] and tile[1] in (0, 7):
+        tile = (tile[0], 6 if tile[1] == 7 else 2)
+    return piece, tile, PROMOTION_PIECES.get(move >> 12 & 7)
+
+
+class OpeningBook():
+    """ This class finds book moves of a position in memory mapped Polyglot book file """
+
+    def __init__(self, path, seed=None):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % ENTRY.size:
+            self.file.close()
+            raise ValueError("Incorrect opening book")
+        # empty file can not be mapped, book without entries never reads it
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.entries = MappedRecords(self.map, ENTRY, 0, size // ENTRY.size)
+        self.random = random.Random(seed)
+        self.hits = 0
+        self.misses = 0
+
+    def find(self, key):
+        """ Returns list of (Polyglot move, weight) stored for position key """
+        return [(move, weight) for _, move, weight, _ in self.entries.find(key)]
+
+    def find_moves(self, game_state):
+        """ Returns list of ((piece, tile, promotion), weight) legal book moves of position """
+        found = self.find(polyglot_key(game_state))
+        if not found:
+            return []
+        legal_moves = game_state.find_cached_legal_moves()
+        moves = []
+        for move, weight in found:
+            decoded = decode_polyglot_move(game_state, move)
+            # colliding keys or broken books can give moves of another position
+            if decoded is not None and (decoded[0].position, decoded[1], decoded[2]) in legal_moves:
+                moves.append((decoded, weight))
+        return moves
+
+    def choose_move(self, game_state):
+        """ Returns (piece, tile, promotion) book move picked with probability of its weight, None out of book """
+        moves = [(move, weight) for move, weight in self.find_moves(game_state) if weight > 0]
+        if not moves:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.random.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+def iter_book_games(source):
+    """ Yields (start position FEN or None, move codes) of archive file or of every legal game of save directory """
+    if os.path.isdir(source):
+        for _, fen, codes in iter_saved_games(source):
+            if not isinstance(codes, ValueError):
+                yield fen, codes
+    else:
+        yield from iter_archive(source)
+
+
+def build_book(source, book_path, max_ply=MAX_PLY, min_count=1):
+    """
+    Writes book of moves played in first plies of archived or saved games, weight of a move is number of games it was
+    played in. Returns dictionary with numbers of games, positions and entries
+    """
+    start = time.perf_counter()
+    counts = Counter()
+    games = 0
+    for fen, codes in iter_book_games(source):
+        codes = codes[:max_ply]
+        game_moves = []
+        try:
+            for game_state, code in zip(replay_archived_game(fen, codes), codes):
+                move = decode_legal_move(game_state, code)
+                if move is None:
+                    raise ValueError(f"Incorrect move code {code}")
+                game_moves.append((polyglot_key(game_state), encode_polyglot_move(*move)))
+        except ValueError:
+            # archived game with a move that is not legal is left out of the book
+            continue
+        counts.update(game_moves)
+        games += 1
+    entries = sorted((key, move, min(count, MAX_WEIGHT)) for (key, move), count in counts.items() if count >= min_count)
+    with open(book_path, "wb") as file:
+        for key, move, weight in entries:
+            file.write(ENTRY.pack(key, move, weight, 0))
+    return {"games": games, "positions": len({key for key, _, _ in entries}), "entries": len(entries),
+            "bytes": os.path.getsize(book_path), "seconds": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and show Polyglot opening book")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build")
+    build_parser.add_argument("source", help="saved games directory or game archive")
+    build_parser.add_argument("book")
+    build_parser.add_argument("--max-ply", type=int, default=MAX_PLY)
+    build_parser.add_argument("--min-count", type=int, default=1)
+    show_parser = subparsers.add_parser("show")
+    show_parser.add_argument("book")
+    show_parser.add_argument("fen")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stats = build_book(args.source, args.book, args.max_ply, args.min_count)
+        print(f"Games: {stats['games']}  Positions: {stats['positions']}  Entries: {stats['entries']}  "
+              f"Size: {stats['bytes']} bytes  Time: {stats['seconds']:.3f}s")
+        return
+    book = OpeningBook(args.book)
+    game_state = GameState.from_fen(args.fen)
+    start = time.perf_counter()
+    moves = book.find_moves(game_state)
+    seconds = time.perf_counter() - start
+    for (piece, tile, promotion), weight in sorted(moves, key=lambda move: -move[1]):
+        print(f"{piece.name} {piece.position} -> {tile} {promotion or ''}  weight {weight}")
+    print(f"Moves: {len(moves)}  Lookup: {seconds * 1e6:.1f}us")
+    book.close()
+
+
+if __name__ == "__main__":
+    main()
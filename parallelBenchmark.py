@@ -0,0 +1,59 @@
+"""
+This file measures how parallel search scales with the number of worker processes
+
+Usage:
+    python parallelBenchmark.py --position kiwipete --depth 4 --max-workers 8
+"""
+
+import argparse
+import multiprocessing
+import time
+from engine import ParallelEngine
+from gameState import GameState
+from perft import POSITIONS
+
+# time limit high enough for search to always reach requested depth
+UNLIMITED_TIME_MS = 10 ** 9
+
+
+def measure(fen, depth, workers, hash_size_mb=16):
+    """ Searches position to given depth with fresh engine, returns dictionary with depth, nodes, time and speed.
+    Worker processes are started before the clock starts, so only the search itself is timed """
+    engine = ParallelEngine(workers, UNLIMITED_TIME_MS, depth, hash_size_mb)
+    try:
+        engine.warm_up()
+        game_state = GameState.from_fen(fen)
+        start = time.perf_counter()
+        result = engine.search(game_state)
+        seconds = time.perf_counter() - start
+    finally:
+        engine.close()
+    return {"workers": workers, "depth": result.depth, "nodes": result.nodes, "seconds": seconds,
+            "nodes_per_second": result.nodes / seconds if seconds else 0}
+
+
+def run_scaling(fen, depth, max_workers):
+    """ Measures every worker count from 1 to max_workers """
+    return [measure(fen, depth, workers) for workers in range(1, max_workers + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure parallel search nodes/s and time to depth")
+    parser.add_argument("--position", default="kiwipete", choices=POSITIONS.keys())
+    parser.add_argument("--fen")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--max-workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    fen = args.fen if args.fen else POSITIONS[args.position][0]
+    results = run_scaling(fen, args.depth, args.max_workers)
+    single = results[0]
+    print("workers  depth      nodes     nodes/s  time to depth  speedup")
+    for result in results:
+        speedup = single["seconds"] / result["seconds"] if result["seconds"] else 0
+        print(f"{result['workers']:>7}  {result['depth']:>5}  {result['nodes']:>9}  {result['nodes_per_second']:>10.0f}"
+              f"  {result['seconds']:>12.3f}s  {speedup:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+This file counts leaf nodes of the legal move tree (perft) to validate and benchmark move generation
+
+Usage:
+    python perft.py --position kiwipete --depth 3 --divide
+    python perft.py --fen "<fen>" --depth 2
+    python perft.py --benchmark          (fails when node counts or speed regress against the baseline)
+    python perft.py --save-baseline      (stores current results as the new baseline)
+"""
+
+import argparse
+import json
+import sys
+import time
+from gameState import GameState
+from movesTracker import MovesTracker
+
+BASELINE_FILE = "perft_baseline.json"
+# benchmark fails when speed drops below this part of the baseline speed
+SPEED_TOLERANCE = 0.75
+
+# name: (FEN, known node counts for depth 1, 2, 3...)
+POSITIONS = {
+    "start": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              (20, 400, 8902, 197281, 4865609)),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 (48, 2039, 97862, 4085603)),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  (14, 191, 2812, 43238, 674624)),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  (6, 264, 9467, 422333)),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  (44, 1486, 62379, 2103487)),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  (46, 2079, 89890, 3894594))
+}
+
+# positions and depths measured by the benchmark
+BENCHMARK = {"start": 4, "kiwipete": 3, "position3": 4, "position4": 3, "position5": 3, "position6": 3}
+
+
+def perft(game_state, depth):
+    """ Counts leaf nodes of legal move tree of given depth """
+    if depth == 0:
+        return 1
+    moves = game_state.find_all_legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for piece, tile, promotion in moves:
+        game_state.make_move(piece, tile, promotion)
+        nodes += perft(game_state, depth - 1)
+        game_state.unmake_move()
+    return nodes
+
+
+def move_to_str(piece, tile, promotion):
+    """ Converts move to [letter][number]->[letter][number] format with optional promotion piece """
+    tracker = MovesTracker()
+    move_str = tracker.pos_to_string(piece.position) + "->" + tracker.pos_to_string(tile)
+    return move_str + ("=" + promotion.upper() if promotion else "")
+
+
+def divide(game_state, depth):
+    """ Returns dictionary of every root move and number of leaf nodes below it """
+    result = {}
+    for piece, tile, promotion in game_state.find_all_legal_moves():
+        move_str = move_to_str(piece, tile, promotion)
+        game_state.make_move(piece, tile, promotion)
+        result[move_str] = perft(game_state, depth - 1)
+        game_state.unmake_move()
+    return result
+
+
+def run_perft(fen, depth):
+    """ Runs perft and returns dictionary with node count, time and speed """
+    game_state = GameState.from_fen(fen)
+    start = time.perf_counter()
+    nodes = perft(game_state, depth)
+    seconds = time.perf_counter() - start
+    return {"depth": depth, "nodes": nodes, "seconds": seconds, "nodes_per_second": nodes / seconds if seconds else 0}
+
+
+def run_benchmark():
+    """ Measures every benchmark position """
+    results = {}
+    for name, depth in BENCHMARK.items():
+        results[name] = run_perft(POSITIONS[name][0], depth)
+    return results
+
+
+def compare_with_baseline(results, baseline, speed_tolerance=SPEED_TOLERANCE):
+    """ Returns list of problems found comparing results with baseline """
+    problems = []
+    for name, result in results.items():
+        known_nodes = POSITIONS[name][1]
+        if result["depth"] <= len(known_nodes) and result["nodes"] != known_nodes[result["depth"] - 1]:
+            problems.append(f"{name}: {result['nodes']} nodes, known perft value is {known_nodes[result['depth'] - 1]}")
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if expected["depth"] != result["depth"]:
+            problems.append(f"{name}: baseline depth {expected['depth']} differs from measured {result['depth']}")
+            continue
+        if expected["nodes"] != result["nodes"]:
+            problems.append(f"{name}: {result['nodes']} nodes, expected {expected['nodes']}")
+        if result["nodes_per_second"] < expected["nodes_per_second"] * speed_tolerance:
+            problems.append(f"{name}: {result['nodes_per_second']:.0f} nodes/s, baseline {expected['nodes_per_second']:.0f} nodes/s")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count and time legal move tree leaf nodes")
+    parser.add_argument("--position", default="start", choices=POSITIONS.keys())
+    parser.add_argument("--fen")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.benchmark or args.save_baseline:
+        results = run_benchmark()
+        for name, result in results.items():
+            print(f"{name:<10} depth {result['depth']}  {result['nodes']:>9} nodes  {result['nodes_per_second']:>9.0f} nodes/s")
+        if args.save_baseline:
+            baseline = {name: {"depth": result["depth"], "nodes": result["nodes"], "nodes_per_second": round(result["nodes_per_second"])}
+                        for name, result in results.items()}
+            with open(BASELINE_FILE, "w") as file:
+                json.dump(baseline, file, indent=4)
+            print(f"Baseline saved to {BASELINE_FILE}")
+            return
+        with open(BASELINE_FILE) as file:
+            problems = compare_with_baseline(results, json.load(file))
+        for problem in problems:
+            print("REGRESSION " + problem)
+        sys.exit(1 if problems else 0)
+
+    fen = args.fen if args.fen else POSITIONS[args.position][0]
+    if args.divide:
+        game_state = GameState.from_fen(fen)
+        start = time.perf_counter()
+        result = divide(game_state, args.depth)
+        seconds = time.perf_counter() - start
+        for move_str, nodes in sorted(result.items()):
+            print(f"{move_str}: {nodes}")
+        nodes = sum(result.values())
+    else:
+        result = run_perft(fen, args.depth)
+        nodes, seconds = result["nodes"], result["seconds"]
+    print(f"Nodes: {nodes}  Time: {seconds:.3f}s  Speed: {nodes / seconds if seconds else 0:.0f} nodes/s")
+    if not args.fen and args.depth <= len(POSITIONS[args.position][1]):
+        expected = POSITIONS[args.position][1][args.depth - 1]
+        print("OK" if nodes == expected else f"MISMATCH, expected {expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+PIECE_VALUES = {"h": 3, "b": 3, "p": 1, "q": 9, "r": 5, "k": 0}
+
+
 class Player():
     """ This class contains information about player score, color and pieces that he has """
 
@@ -7,16 +10,33 @@ class Player():
         self.color = color
         self.pieces = pieces
 
+    @property
+    def pieces(self):
+        """ list of pieces player has on board """
+        return self._pieces
+
+    @pieces.setter
+    def pieces(self, pieces):
+        self._pieces = pieces
+        # score is summed up again on next request
+        self.score = None
+
+    def add_piece(self, piece):
+        """ Adds piece to player pieces updating score """
+        self._pieces.append(piece)
+        if self.score is not None:
+            self.score += PIECE_VALUES[piece.name[1]]
+
+    def remove_piece(self, piece):
+        """ Removes piece from player pieces updating score """
+        self._pieces.remove(piece)
+        if self.score is not None:
+            self.score -= PIECE_VALUES[piece.name[1]]
+
     def get_score(self):
         """ sums up every value of every piece player has (Rook: 5 Knight: 3 Bishop: 3 Queen: 9 Pawn: 1)"""
-        score = 0
-        for piece in self.pieces:
-            if piece.name[1] in ["h", "b"]:
-                score += 3
-            elif piece.name[1] == "p":
-                score += 1
-            elif piece.name[1] == "q":
-                score += 9
-            elif piece.name[1] == "r":
-                score += 5
-        return score
+        if self.score is None:
+            self.score = 0
+            for piece in self._pieces:
+                self.score += PIECE_VALUES[piece.name[1]]
+        return self.score
@@ -0,0 +1,28 @@
+class PositionStatus():
+    """ This class holds everything GUI, engine and self-play need to know about a position after one legal move generation """
+
+    def __init__(self, key, in_check, king_position, legal_moves, is_over=False, winner="", end_type=""):
+        # (position hash, repetition found) the status was computed for
+        self.key = key
+        self.in_check = in_check
+        self.king_position = king_position
+        # (start position, target tile, promotion) tuples, positions instead of pieces so status can be shared
+        self.legal_moves = legal_moves
+        self.is_over = is_over
+        self.winner = winner
+        self.end_type = end_type
+        # (wdl, dtm) from tablebases when position is in them
+        self.tablebase_result = None
+
+    def legal_tiles(self):
+        """ Returns dictionary of piece position and tiles it can move to """
+        tiles = {}
+        for start, tile, promotion in self.legal_moves:
+            piece_tiles = tiles.setdefault(start, [])
+            if tile not in piece_tiles:
+                piece_tiles.append(tile)
+        return tiles
+
+    def game_over_data(self):
+        """ Returns dictionary with is_over, winner and end_type keys """
+        return {"is_over": self.is_over, "winner": self.winner, "end_type": self.end_type}
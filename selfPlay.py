@@ -0,0 +1,107 @@
+"""
+This file plays games between computer players without opening a window, used for regression and stress runs
+
+Usage:
+    python selfPlay.py --games 1000 --white random --black random
+    python selfPlay.py --games 10 --white engine --black random --engine-time-ms 100
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+from engine import Engine
+from gameState import GameState
+from movesTracker import MovesTracker
+
+# games still going after this many plies are stopped and counted as draws
+MAX_PLIES = 500
+
+
+class RandomPlayer():
+    """ This class plays random legal moves """
+
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def choose_move(self, game_state):
+        """ Returns random (piece, tile, promotion) move of current player """
+        start, tile, promotion = self.random.choice(game_state.find_position_status().legal_moves)
+        return game_state.pos_to_piece(start), tile, promotion
+
+
+class EnginePlayer():
+    """ This class plays moves found by Engine search """
+
+    def __init__(self, time_limit_ms=100, max_depth=64):
+        self.engine = Engine(time_limit_ms, max_depth)
+
+    def choose_move(self, game_state):
+        """ Returns best (piece, tile, promotion) move found within time budget """
+        return self.engine.search(game_state).move
+
+
+def play_game(white, black, max_plies=MAX_PLIES, fen=None):
+    """ Plays one game from start position or FEN, returns game over data with number of plies played """
+    move_tracker = MovesTracker()
+    game_state = GameState.from_fen(fen, move_tracker) if fen else GameState(move_tracker=move_tracker)
+    move_tracker.record_board(game_state)
+    players = {"w": white, "b": black}
+    game_over_data = game_state.find_game_over_data()
+    plies = 0
+    while not game_over_data["is_over"]:
+        if plies >= max_plies:
+            game_over_data = {"is_over": True, "winner": "Draw", "end_type": "Ply limit"}
+            break
+        piece, tile, promotion = players[game_state.current_player.color].choose_move(game_state)
+        game_state.move_piece(piece, tile, promotion)
+        move_tracker.record_board(game_state)
+        plies += 1
+        game_over_data = game_state.find_game_over_data()
+    game_over_data["plies"] = plies
+    return game_over_data
+
+
+def run_self_play(games, white, black, max_plies=MAX_PLIES):
+    """ Plays games back to back, returns dictionary with results and games/s and plies/s speed """
+    results = Counter()
+    plies = 0
+    start = time.perf_counter()
+    for _ in range(games):
+        game_over_data = play_game(white, black, max_plies)
+        results[(game_over_data["winner"], game_over_data["end_type"])] += 1
+        plies += game_over_data["plies"]
+    seconds = time.perf_counter() - start
+    return {"games": games, "plies": plies, "seconds": seconds, "results": results,
+            "games_per_second": games / seconds if seconds else 0,
+            "plies_per_second": plies / seconds if seconds else 0}
+
+
+def create_player(kind, seed, engine_time_ms):
+    """ Creates player from command line name """
+    if kind == "engine":
+        return EnginePlayer(engine_time_ms)
+    return RandomPlayer(seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games between computer players without a window")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--white", default="random", choices=["random", "engine"])
+    parser.add_argument("--black", default="random", choices=["random", "engine"])
+    parser.add_argument("--engine-time-ms", type=int, default=100)
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    white = create_player(args.white, args.seed, args.engine_time_ms)
+    black = create_player(args.black, None if args.seed is None else args.seed + 1, args.engine_time_ms)
+    stats = run_self_play(args.games, white, black, args.max_plies)
+    for (winner, end_type), count in stats["results"].most_common():
+        print(f"{winner:<10} {end_type:<25} {count}")
+    print(f"Games: {stats['games']}  Plies: {stats['plies']}  Time: {stats['seconds']:.3f}s  "
+          f"Speed: {stats['games_per_second']:.2f} games/s  {stats['plies_per_second']:.0f} plies/s")
+
+
+if __name__ == "__main__":
+    main()
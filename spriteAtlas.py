@@ -0,0 +1,47 @@
+import pygame
+from bitboards import PIECE_NAMES
+
+BUTTON_NAMES = ("restart_btn", "save_btn", "saved_btn")
+
+
+class SpriteAtlas():
+    """ This class decodes every piece and button image once and keeps copies scaled to the current size """
+
+    def __init__(self):
+        # image path -> image decoded from file
+        self.decoded = {}
+        self.piece_size = None
+        self.pieces = {}
+        self.button_size = None
+        self.buttons = {}
+        self.builds = 0
+
+    def load(self, path):
+        """ Returns image decoded from file, every file is read only once """
+        if path not in self.decoded:
+            self.decoded[path] = pygame.image.load(path)
+        return self.decoded[path]
+
+    def scale(self, path, size):
+        """ Returns image scaled to given size and converted to window pixel format when window exists """
+        image = pygame.transform.scale(self.load(path), size)
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        return image
+
+    def piece_images(self, cell_dimension):
+        """ Returns dictionary of piece name and its image, images are rescaled only when cell size changes """
+        if cell_dimension != self.piece_size:
+            self.pieces = {name: self.scale(f"pieces/{name}.png", (cell_dimension, cell_dimension)) for name in PIECE_NAMES}
+            self.piece_size = cell_dimension
+            self.builds += 1
+        return self.pieces
+
+    def button_images(self, size):
+        """ Returns dictionary of button name and its image, images are rescaled only when button size changes """
+        size = (int(size[0]), int(size[1]))
+        if size != self.button_size:
+            self.buttons = {name: self.scale(f"Buttons/{name}.png", size) for name in BUTTON_NAMES}
+            self.button_size = size
+            self.builds += 1
+        return self.buttons
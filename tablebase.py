@@ -0,0 +1,430 @@
+"""
+This file generates endgame tablebases of pawnless endings with up to 4 pieces using retrograde analysis and probes them.
+Table of material such as KQvKR holds win/draw/loss and distance to mate in plies of every position, both from side to
+move point of view. Arrays are indexed by (side to move, square of every piece) in material order, squares numbered
+row * 8 + column like in GameState, so a probe is one array read.
+Generation first counts moves of every position, then goes backwards from checkmates ply by ply with NumPy arrays:
+predecessors of lost positions are won, positions whose every move reaches a won position are lost
+
+Usage:
+    python tablebase.py KQvK KRvK KQvKR --directory tablebases
+    python tablebase.py --probe "<FEN>" --directory tablebases
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+from attackTables import BETWEEN, DIAGONAL_DIRECTIONS, DIRECTIONS, KING_ATTACKS, KNIGHT_ATTACKS, KNIGHT_OFFSETS, STRAIGHT_DIRECTIONS
+from bitboards import count_squares, iterate_squares
+from gameState import GameState
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+# wdl value of positions that can not appear in a game, like side not to move being in check
+ILLEGAL = 2
+MAX_PIECES = 4
+# pieces of one side are kept in this order, "h" is knight like in piece names
+PIECE_ORDER = "kqrbh"
+PIECE_VALUES = {"k": 0, "q": 9, "r": 5, "b": 3, "h": 3}
+MATERIAL_LETTERS = {"k": "K", "q": "Q", "r": "R", "b": "B", "h": "N"}
+LETTER_PIECES = {letter: kind for kind, letter in MATERIAL_LETTERS.items()}
+# positions processed at once, bounds memory used by generation of 4 piece tables
+CHUNK_SIZE = 1 << 20
+# level of positions not scheduled to be won or lost
+NOT_SCHEDULED = 255
+ONE = np.uint64(1)
+
+
+def _steps(directions, distance):
+    """ Returns (direction, distance, square) array of target squares, -1 when target is off the board """
+    steps = np.full((len(directions), distance, 64), -1, np.int16)
+    for index, (step_row, step_column) in enumerate(directions):
+        for square in range(64):
+            row, column = square // 8, square % 8
+            for step in range(distance):
+                row, column = row + step_row, column + step_column
+                if not (0 <= row < 8 and 0 <= column < 8):
+                    break
+                steps[index, step, square] = row * 8 + column
+    return steps
+
+
+STEPS = {
+    "k": _steps(DIRECTIONS, 1),
+    "h": _steps(KNIGHT_OFFSETS, 1),
+    "q": _steps(DIRECTIONS, 7),
+    "r": _steps([DIRECTIONS[direction] for direction in STRAIGHT_DIRECTIONS], 7),
+    "b": _steps([DIRECTIONS[direction] for direction in DIAGONAL_DIRECTIONS], 7),
+}
+
+
+def _square_table(function):
+    return np.array([[function(square, target) for target in range(64)] for square in range(64)])
+
+
+BETWEEN_TABLE = _square_table(lambda square, target: BETWEEN[square][target]).astype(np.uint64)
+STRAIGHT = _square_table(lambda square, target: square != target and (square // 8 == target // 8 or square % 8 == target % 8))
+DIAGONAL = _square_table(lambda square, target: square != target and abs(square // 8 - target // 8) == abs(square % 8 - target % 8))
+# [attacker square, target square] is True when piece attacks target on a board with no blockers
+LINES = {
+    "k": _square_table(lambda square, target: bool(KING_ATTACKS[square] >> target & 1)),
+    "h": _square_table(lambda square, target: bool(KNIGHT_ATTACKS[square] >> target & 1)),
+    "q": STRAIGHT | DIAGONAL,
+    "r": STRAIGHT,
+    "b": DIAGONAL,
+}
+
+
+def parse_material(material):
+    """ Converts material like KQvKR to list of (color, kind) pieces, ValueError when it can not be generated """
+    sides = material.upper().split("V")
+    if len(sides) != 2 or any(not side.startswith("K") or side.count("K") != 1 for side in sides):
+        raise ValueError("Incorrect material")
+    pieces = []
+    for color, side in zip("wb", sides):
+        if any(letter not in LETTER_PIECES for letter in side):
+            raise ValueError("Incorrect material")
+        pieces += [(color, kind) for kind in sorted((LETTER_PIECES[letter] for letter in side), key=PIECE_ORDER.index)]
+    if len(pieces) > MAX_PIECES:
+        raise ValueError("Incorrect material")
+    return pieces
+
+
+def canonical_material(pieces):
+    """
+    Returns (material, order, flip) of pieces given as (color, kind) list. Stronger side is always white, so order
+    tells which given piece is at which place of the material and flip tells colors have to be swapped
+    """
+    values = {color: sum(PIECE_VALUES[kind] for piece_color, kind in pieces if piece_color == color) for color in "wb"}
+    letters = {color: "".join(sorted((MATERIAL_LETTERS[kind] for piece_color, kind in pieces if piece_color == color),
+                                     key=lambda letter: PIECE_ORDER.index(LETTER_PIECES[letter]))) for color in "wb"}
+    flip = (values["b"], len(letters["b"]), letters["b"]) > (values["w"], len(letters["w"]), letters["w"])
+    first = "b" if flip else "w"
+    order = sorted(range(len(pieces)), key=lambda index: (pieces[index][0] != first, PIECE_ORDER.index(pieces[index][1])))
+    second = "w" if flip else "b"
+    return letters[first] + "v" + letters[second], order, flip
+
+
+def encode(side, squares):
+    """ Returns flat table index of positions given as side to move and square arrays """
+    index = np.asarray(side, np.int64)
+    for square in squares:
+        index = index * 64 + square
+    return index
+
+
+def decode(index, pieces_count):
+    """ Returns side to move and list of square arrays of flat table indexes """
+    squares = []
+    for _ in range(pieces_count):
+        index, square = np.divmod(index, 64)
+        squares.append(square)
+    return index, squares[::-1]
+
+
+def is_attacked(pieces, squares, target, by_color):
+    """ Returns array telling if target squares are attacked by pieces of given color """
+    occupied = np.zeros(len(target), np.uint64)
+    for square in squares:
+        occupied |= ONE << square.astype(np.uint64)
+    attacked = np.zeros(len(target), bool)
+    for (color, kind), square in zip(pieces, squares):
+        if color != by_color:
+            continue
+        if kind in "kh":
+            attacked |= LINES[kind][square, target]
+        else:
+            attacked |= LINES[kind][square, target] & ((BETWEEN_TABLE[square, target] & occupied) == 0)
+    return attacked
+
+
+def piece_moves(squares, index, kind):
+    """ Yields (positions, target squares, blocker) of moves of one piece, blocker is index of piece standing on target
+    or -1 for an empty one. Slider stops at the first blocker, so a move onto a piece can be a capture """
+    for direction in STEPS[kind]:
+        rows = np.arange(len(squares[index]))
+        source = squares[index]
+        for step in direction:
+            target = step[source]
+            keep = target >= 0
+            rows, source, target = rows[keep], source[keep], target[keep]
+            if not rows.size:
+                break
+            blocker = np.full(rows.size, -1, np.int8)
+            for other, other_squares in enumerate(squares):
+                if other != index:
+                    blocker[other_squares[rows] == target] = other
+            yield rows, target, blocker
+            empty = blocker < 0
+            rows, source = rows[empty], source[empty]
+
+
+class Tablebase():
+    """ This class holds wdl and dtm arrays of one material """
+
+    def __init__(self, material, wdl, dtm, seconds=0):
+        self.material = material
+        self.pieces = parse_material(material)
+        self.wdl = wdl
+        self.dtm = dtm
+        self.seconds = seconds
+
+    def size_bytes(self):
+        return self.wdl.nbytes + self.dtm.nbytes
+
+    def save(self, path):
+        np.savez_compressed(path, wdl=self.wdl, dtm=self.dtm)
+
+    @classmethod
+    def load(cls, material, path):
+        with np.load(path) as data:
+            return cls(material, data["wdl"], data["dtm"])
+
+
+class Tablebases():
+    """
+    This class generates, stores and probes tables of materials. Tables are kept in memory once loaded,
+    missing tables are generated only when generate is True, as a 4 piece table takes minutes
+    """
+
+    def __init__(self, directory=None, generate=False):
+        self.directory = directory
+        self.generate_missing = generate
+        # material -> Tablebase or None when it is not available
+        self.tables = {}
+        self.max_pieces = MAX_PIECES
+        self.hits = 0
+
+    def table_path(self, material):
+        return os.path.join(self.directory, material + ".npz")
+
+    def table(self, material):
+        """ Returns Tablebase of canonical material, loads or generates it when needed, None when not available """
+        if material in self.tables:
+            return self.tables[material]
+        table = None
+        if self.directory is not None and os.path.isfile(self.table_path(material)):
+            table = Tablebase.load(material, self.table_path(material))
+        elif self.generate_missing:
+            table = self.generate(material)
+            if self.directory is not None:
+                os.makedirs(self.directory, exist_ok=True)
+                table.save(self.table_path(material))
+        self.tables[material] = table
+        return table
+
+    def lookup(self, pieces, squares, side):
+        """ Returns wdl and dtm arrays of positions given as (color, kind) pieces, square arrays and side to move array,
+        positions of materials that are not available are returned as ILLEGAL """
+        material, order, flip = canonical_material(pieces)
+        table = self.table(material)
+        if table is None:
+            return np.full(len(side), ILLEGAL, np.int8), np.zeros(len(side), np.uint8)
+        if flip:
+            index = encode(1 - side, [squares[piece] ^ 56 for piece in order])
+        else:
+            index = encode(side, [squares[piece] for piece in order])
+        return table.wdl[index], table.dtm[index]
+
+    def probe(self, game_state):
+        """ Returns (wdl, dtm) of game state from current player point of view, None when it is not in tablebases """
+        position = game_state.position
+        if count_squares(position.occupied) > self.max_pieces or game_state.castling_rights:
+            return None
+        pieces = []
+        squares = []
+        for name, bitboard in position.pieces.items():
+            for square in iterate_squares(bitboard):
+                pieces.append((name[0], name[1]))
+                squares.append(square)
+        if any(kind == "p" for _, kind in pieces):
+            return None
+        material, order, flip = canonical_material(pieces)
+        table = self.table(material)
+        if table is None:
+            return None
+        side = game_state.current_player.color == ("w" if flip else "b")
+        index = int(side)
+        for piece in order:
+            index = index * 64 + (squares[piece] ^ 56 if flip else squares[piece])
+        wdl = int(table.wdl[index])
+        if wdl == ILLEGAL:
+            return None
+        self.hits += 1
+        return wdl, int(table.dtm[index])
+
+    def generate(self, material):
+        """ Builds table of material with retrograde analysis, tables of materials left after captures are built first """
+        start = time.perf_counter()
+        pieces = parse_material(material)
+        count = len(pieces)
+        size = 2 * 64 ** count
+        for captured in range(count):
+            if pieces[captured][1] != "k":
+                self.table(canonical_material(pieces[:captured] + pieces[captured + 1:])[0])
+
+        valid = np.zeros(size, bool)
+        for side, squares, index in self.iterate_chunks(count, 64 ** count):
+            distinct = np.ones(len(index), bool)
+            for first in range(count):
+                for second in range(first + 1, count):
+                    distinct &= squares[first] != squares[second]
+            mover, waiting = ("w", "b") if side == 0 else ("b", "w")
+            king = squares[pieces.index((waiting, "k"))]
+            valid[index] = distinct & ~is_attacked(pieces, squares, king, mover)
+
+        # moves not yet known to lose, best capture result and checkmates found by counting moves of every position
+        remaining = np.zeros(size, np.int8)
+        win_schedule = np.full(size, NOT_SCHEDULED, np.uint8)
+        loss_floor = np.zeros(size, np.uint8)
+        loss_schedule = np.full(size, NOT_SCHEDULED, np.uint8)
+        stalemate = np.zeros(size, bool)
+        for side, squares, index in self.iterate_chunks(count, 64 ** count, valid):
+            self.count_moves(pieces, side, squares, index, valid, remaining, win_schedule, loss_floor, loss_schedule, stalemate)
+
+        wdl = np.where(valid, DRAW, ILLEGAL).astype(np.int8)
+        dtm = np.zeros(size, np.uint8)
+        resolved = ~valid | stalemate
+        last_level = int(max(win_schedule[win_schedule < NOT_SCHEDULED].max(initial=0),
+                             loss_schedule[loss_schedule < NOT_SCHEDULED].max(initial=0)))
+        level = 0
+        while level <= last_level:
+            unresolved = ~resolved
+            new_wins = np.flatnonzero(unresolved & (win_schedule == level))
+            resolved[new_wins] = True
+            new_losses = np.flatnonzero(~resolved & (loss_schedule == level))
+            resolved[new_losses] = True
+            wdl[new_wins], dtm[new_wins] = WIN, level
+            wdl[new_losses], dtm[new_losses] = LOSS, level
+            # positions that can move into a lost one are won next ply
+            for predecessors in self.iterate_predecessors(pieces, new_losses, valid):
+                predecessors = predecessors[~resolved[predecessors]]
+                if predecessors.size:
+                    win_schedule[predecessors] = np.minimum(win_schedule[predecessors], level + 1)
+                    last_level = max(last_level, level + 1)
+            # positions whose every move reaches a won one are lost
+            for predecessors in self.iterate_predecessors(pieces, new_wins, valid):
+                predecessors, counts = np.unique(predecessors[~resolved[predecessors]], return_counts=True)
+                remaining[predecessors] -= counts.astype(np.int8)
+                lost = predecessors[remaining[predecessors] == 0]
+                if lost.size:
+                    loss_schedule[lost] = np.maximum(loss_floor[lost], level + 1)
+                    last_level = max(last_level, int(loss_schedule[lost].max()))
+            level += 1
+        return Tablebase(material, wdl, dtm, time.perf_counter() - start)
+
+    def iterate_chunks(self, count, per_side, mask=None):
+        """ Yields (side to move, square arrays, flat indexes) of table positions in chunks, only masked ones when mask is given """
+        for side in (0, 1):
+            for start in range(0, per_side, CHUNK_SIZE):
+                index = np.arange(side * per_side + start, side * per_side + min(start + CHUNK_SIZE, per_side), dtype=np.int64)
+                if mask is not None:
+                    index = index[mask[index]]
+                    if not index.size:
+                        continue
+                _, squares = decode(index, count)
+                yield side, squares, index
+
+    def count_moves(self, pieces, side, squares, index, valid, remaining, win_schedule, loss_floor, loss_schedule, stalemate):
+        """ Counts legal moves of positions, resolves captures with smaller tables and finds checkmates and stalemates """
+        mover = "w" if side == 0 else "b"
+        moves = np.zeros(len(index), np.int64)
+        unknown = np.zeros(len(index), np.int64)
+        win_level = np.full(len(index), NOT_SCHEDULED, np.int64)
+        floor = np.zeros(len(index), np.int64)
+        for moving, (color, kind) in enumerate(pieces):
+            if color != mover:
+                continue
+            for rows, target, blocker in piece_moves(squares, moving, kind):
+                quiet = blocker < 0
+                moved = [target[quiet] if piece == moving else piece_squares[rows[quiet]] for piece, piece_squares in enumerate(squares)]
+                legal = rows[quiet][valid[encode(np.full(quiet.sum(), 1 - side), moved)]]
+                moves += np.bincount(legal, minlength=len(index))
+                unknown += np.bincount(legal, minlength=len(index))
+                for captured, (captured_color, captured_kind) in enumerate(pieces):
+                    take = blocker == captured
+                    if captured_color == mover or captured_kind == "k" or not take.any():
+                        continue
+                    capture_rows = rows[take]
+                    left = [piece for piece in range(len(pieces)) if piece != captured]
+                    left_squares = [target[take] if piece == moving else squares[piece][capture_rows] for piece in left]
+                    sub_wdl, sub_dtm = self.lookup([pieces[piece] for piece in left], left_squares, np.full(capture_rows.size, 1 - side))
+                    sub_dtm = sub_dtm.astype(np.int64) + 1
+                    legal = sub_wdl != ILLEGAL
+                    moves += np.bincount(capture_rows[legal], minlength=len(index))
+                    # capture into a won position of opponent is a move already known to lose
+                    keep = legal & (sub_wdl != WIN)
+                    unknown += np.bincount(capture_rows[keep], minlength=len(index))
+                    lost = sub_wdl == LOSS
+                    np.minimum.at(win_level, capture_rows[lost], sub_dtm[lost])
+                    won = sub_wdl == WIN
+                    np.maximum.at(floor, capture_rows[won], sub_dtm[won])
+
+        remaining[index] = unknown
+        win_schedule[index] = np.minimum(win_level, NOT_SCHEDULED)
+        loss_floor[index] = floor
+        no_moves = moves == 0
+        king = squares[pieces.index((mover, "k"))]
+        in_check = is_attacked(pieces, squares, king, "b" if mover == "w" else "w")
+        loss_schedule[index[no_moves & in_check]] = 0
+        stalemate[index[no_moves & ~in_check]] = True
+        # every move captures into a position won by opponent
+        all_lose = ~no_moves & (unknown == 0)
+        loss_schedule[index[all_lose]] = floor[all_lose]
+
+    def iterate_predecessors(self, pieces, index, valid):
+        """ Yields flat indexes of positions that reach given ones with one move not capturing anything """
+        count = len(pieces)
+        for start in range(0, len(index), CHUNK_SIZE):
+            chunk = index[start:start + CHUNK_SIZE]
+            side, squares = decode(chunk, count)
+            for moved_side, mover in ((1, "w"), (0, "b")):
+                rows_of_side = np.flatnonzero(side == moved_side)
+                if not rows_of_side.size:
+                    continue
+                side_squares = [piece_squares[rows_of_side] for piece_squares in squares]
+                for moving, (color, kind) in enumerate(pieces):
+                    if color != mover:
+                        continue
+                    # moves of pieces without pawns can be played backwards the same way
+                    for rows, target, blocker in piece_moves(side_squares, moving, kind):
+                        empty = blocker < 0
+                        rows, target = rows[empty], target[empty]
+                        moved = [target if piece == moving else piece_squares[rows] for piece, piece_squares in enumerate(side_squares)]
+                        predecessors = encode(np.full(rows.size, 1 - moved_side), moved)
+                        yield predecessors[valid[predecessors]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and probe endgame tablebases")
+    parser.add_argument("materials", nargs="*", default=["KQvK", "KRvK"])
+    parser.add_argument("--directory", default="tablebases")
+    parser.add_argument("--probe", metavar="FEN")
+    args = parser.parse_args()
+
+    if args.probe:
+        result = Tablebases(args.directory).probe(GameState.from_fen(args.probe))
+        if result is None:
+            print("Position is not in tablebases")
+        else:
+            print({WIN: "Win", DRAW: "Draw", LOSS: "Loss"}[result[0]] + (f" in {result[1]} plies" if result[0] != DRAW else ""))
+        return
+    tablebases = Tablebases(args.directory, generate=True)
+    for material in args.materials:
+        material = canonical_material(parse_material(material))[0]
+        existing = set(tablebases.tables)
+        start = time.perf_counter()
+        tablebases.table(material)
+        for name in sorted(set(tablebases.tables) - existing, key=lambda name: len(name)):
+            table = tablebases.tables[name]
+            won = int((table.wdl == WIN).sum())
+            action = f"generated in {table.seconds:.2f}s" if table.seconds else "loaded"
+            print(f"{name:<8} {action}  size {table.size_bytes()} bytes  "
+                  f"file {os.path.getsize(tablebases.table_path(name))} bytes  won positions {won}  longest mate {int(table.dtm[table.wdl == WIN].max(initial=0))} plies")
+        print(f"{material} done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
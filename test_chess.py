@@ -1,11 +1,35 @@
 from gameManager import GameManager
 from piece import Piece
-from gameState import GameState
+from gameState import GameState, encode_move, WHITE_SHORT_CASTLE, WHITE_LONG_CASTLE, BLACK_SHORT_CASTLE, BLACK_LONG_CASTLE
 from player import Player
 from pytest import raises
 from movesTracker import MovesTracker
 from display import Display
+from spriteAtlas import SpriteAtlas
+from textCache import TextCache
+from frameScheduler import FrameScheduler
+from movePrecomputer import MovePrecomputer
+from lruCache import LRUCache
+from gameJournal import GameJournal, read_journal, recover_game
+from gameLoader import iter_games, iter_pgn_games, replay_game
+from gameArchive import ARCHIVE_MAGIC, convert_directory, iter_archive, iter_saved_games, replay_archived_game, write_game
+from gameDatabase import GameDatabase, build_database
+from mappedRecords import MappedRecords
+from openingBook import ENTRY, OpeningBook, build_book, decode_polyglot_move, encode_polyglot_move
+from polyglotKeys import polyglot_key
+from tablebase import Tablebases, canonical_material, WIN, DRAW, LOSS
+from bitboards import BitboardPosition, count_squares, iterate_squares, pos_to_square
+from attackTables import BETWEEN, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, TABLES_BUILD_TIME, bishop_attacks, rook_attacks
+from perft import POSITIONS, compare_with_baseline, divide, perft
+from engine import Engine, ParallelEngine, MATE_THRESHOLD
+from moveOrdering import MoveOrderer
+from selfPlay import RandomPlayer, play_game, run_self_play
+from transpositionTable import TranspositionTable, EXACT, LOWER_BOUND
 import pygame
+import struct
+
+# knights go out and back twice, start position is reached for the third time after the last move
+KNIGHT_SHUFFLE = [((7, 6), (5, 5)), ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6))] * 2
 
 # GameManager Tests
 
@@ -53,6 +77,107 @@ def test_GameManager_move_repetition():
     game.move_tracker.record_board(game.game_state)
     assert game.check_for_move_repetition() is True
 
+
+def test_GameManager_creates_engine_only_for_computer_player():
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    game = GameManager(screen, 900, ("white", "gray"), engine_workers=2)
+    assert game.engine is None
+    game.update([])
+    game.close()
+    game = GameManager(screen, 900, ("white", "gray"), engine_colors=("b",))
+    assert isinstance(game.engine, Engine)
+    game.close()
+
+
+def test_GameManager_engine_plays_its_color():
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    game = GameManager(screen, 900, ("white", "gray"), engine_colors=("w",), engine_time_ms=50)
+    game.update([])
+    assert game.game_state.current_player.color == "b"
+    assert len(game.move_tracker.move_record) == 1
+    assert game.last_search_result.depth >= 1
+    with raises(ValueError):
+        GameManager(screen, 900, ("white", "gray"), engine_colors=("g",))
+
+
+def test_GameManager_dirty_rendering_redraws_only_changes():
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    game = GameManager(screen, 900, ("white", "gray"), dirty_rendering=True)
+    game.update([])
+    assert len(game.display.dirty_rects) == 64 + 2
+    game.update([])
+    assert game.display.dirty_rects == []
+    game.play_move(game.game_state.pos_to_piece((6, 4)), (4, 4))
+    game.update([])
+    # pawn left one tile, appeared on another and move record changed
+    assert len(game.display.dirty_rects) == 3
+
+
+def test_GameManager_game_over_found_in_background():
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    game = GameManager(screen, 900, ("white", "gray"))
+    for start, target in [((6, 5), (5, 5)), ((1, 4), (3, 4)), ((6, 6), (4, 6)), ((0, 3), (4, 7))]:
+        game.play_move(game.game_state.pos_to_piece(start), target)
+    game.apply_precomputed_position(wait=True)
+    assert game.is_player_in_check == (True, [(7, 4)])
+    assert game.game_over_data == {"is_over": True, "winner": "Black won", "end_type": "Checkmate"}
+
+
+def test_GameManager_status_ready_requests_redraw():
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    game = GameManager(screen, 900, ("white", "gray"))
+    game.apply_precomputed_position(wait=True)
+    scheduler = FrameScheduler(event_driven=True)
+    scheduler.should_render([])
+    assert not game.is_status_pending() and not game.is_status_ready()
+    game.play_move(game.game_state.pos_to_piece((6, 4)), (4, 4))
+    assert game.is_status_pending()
+    game.move_precomputer.thread.join()
+    # status came without any input event, main loop asks for a frame showing it
+    assert game.is_status_ready()
+    assert scheduler.should_render([]) is False
+    scheduler.request_redraw()
+    assert scheduler.should_render([]) is True
+    game.update([])
+    assert not game.is_status_pending() and not game.is_status_ready()
+
+
+def test_GameManager_valid_tiles_served_from_precomputed_moves():
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    game = GameManager(screen, 900, ("white", "gray"))
+    game.apply_precomputed_position(wait=True)
+    knight = game.game_state.pos_to_piece((7, 6))
+    assert sorted(game.find_valid_tiles(knight)) == sorted(game.game_state.piece_valid_tiles(knight))
+    assert game.move_precomputer.fallbacks == 0
+    # result not ready yet, piece is computed on the spot
+    game.move_precomputer.result = None
+    assert sorted(game.find_valid_tiles(knight)) == [(5, 5), (5, 7)]
+    assert game.move_precomputer.fallbacks == 1
+
+
+def test_GameManager_journals_game(tmp_path):
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    game = GameManager(screen, 900, ("white", "gray"), journal_dir=str(tmp_path))
+    # restart before the first move leaves no journal behind
+    game.init_new_game()
+    assert list(tmp_path.iterdir()) == []
+    for start, tile in KNIGHT_SHUFFLE[:5]:
+        game.play_move(game.game_state.pos_to_piece(start), tile)
+    path = game.move_tracker.journal.path
+    game.close()
+    tracker = MovesTracker()
+    assert recover_game(path, tracker).to_fen() == game.game_state.to_fen()
+    # recovered game continues with the same repetition counts as the live one
+    assert tracker.position_counts == game.move_tracker.position_counts
+    assert len(list(tmp_path.iterdir())) == 1
+
 # Piece Tests
 
 
@@ -110,6 +235,13 @@ def test_Piece_str():
 # GameState Tests
 
 
+def board_with_pieces(pieces):
+    board = [[None for _ in range(8)] for _ in range(8)]
+    for name, pos in pieces:
+        board[pos[0]][pos[1]] = Piece(name, pos)
+    return board
+
+
 def test_GameState_initialization():
     game = GameState()
     assert game.board[0][0].name == "br"
@@ -203,6 +335,125 @@ def test_GameState_simulate_move_is_legal():
     assert game.simulate_move_is_legal(Player("w", []), game.pos_to_piece((7, 4)), (5, 4)) is True
 
 
+def test_GameState_make_unmake_move():
+    game = GameState()
+    before = game.board_to_str(game.board)
+    knight = game.pos_to_piece((7, 6))
+    game.make_move(knight, (5, 5))
+    game.make_move(game.pos_to_piece((1, 4)), (3, 4))
+    assert game.en_passant_square == (2, 4)
+    assert game.current_player.color == "w"
+    game.unmake_move()
+    game.unmake_move()
+    assert game.board_to_str(game.board) == before
+    assert knight.position == (7, 6) and knight.move_count == 0
+    assert game.lastly_moved_piece is None
+    assert game.en_passant_square is None
+    assert game.current_player.color == "w"
+    assert len(game.plr_black.pieces) == 16
+    assert len(game.undo_stack) == 0
+
+
+def test_GameState_make_unmake_castle_and_en_passant():
+    game = GameState()
+    for move in [((6, 4), (4, 4)), ((1, 0), (2, 0)), ((4, 4), (3, 4)), ((1, 3), (3, 3)),
+                 ((7, 6), (5, 5)), ((2, 0), (3, 0)), ((7, 5), (6, 4)), ((3, 0), (4, 0))]:
+        game.make_move(game.pos_to_piece(move[0]), move[1])
+    before = game.board_to_str(game.board)
+    assert (7, 6) in game.piece_valid_tiles(game.pos_to_piece((7, 4)))
+    game.make_move(game.pos_to_piece((7, 4)), (7, 6))
+    assert game.pos_to_piece((7, 5)).name == "wr"
+    assert game.castling_rights & (WHITE_SHORT_CASTLE | WHITE_LONG_CASTLE) == 0
+    game.unmake_move()
+    assert game.board_to_str(game.board) == before
+    assert game.pos_to_piece((7, 7)).move_count == 0
+    game.make_move(game.pos_to_piece((7, 4)), (7, 5))
+    game.make_move(game.pos_to_piece((1, 5)), (3, 5))
+    assert (2, 5) in game.piece_valid_tiles(game.pos_to_piece((3, 4)))
+    game.make_move(game.pos_to_piece((3, 4)), (2, 5))
+    assert game.pos_to_piece((3, 5)) is None
+    game.unmake_move()
+    assert game.pos_to_piece((3, 5)).name == "bp"
+    assert game.castling_rights == BLACK_SHORT_CASTLE | BLACK_LONG_CASTLE
+
+
+def test_GameState_checks_and_pins():
+    game = GameState(board_with_pieces([("wk", (7, 4)), ("wb", (6, 4)), ("wh", (7, 2)), ("br", (0, 4)), ("bb", (4, 0)), ("bk", (0, 0))]))
+    checkers, check_mask, pins = game.find_checks_and_pins()
+    assert checkers == 0
+    assert set(pins) == {pos_to_square((6, 4))}
+    assert game.piece_valid_tiles(game.pos_to_piece((6, 4))) == []
+    game.board[6][4] = None
+    checkers, check_mask, pins = game.find_checks_and_pins()
+    assert checkers == 1
+    assert game.piece_valid_tiles(game.pos_to_piece((7, 2))) == [(6, 4)]
+
+
+def test_GameState_double_check_allows_only_king_moves():
+    game = GameState(board_with_pieces([("wk", (7, 4)), ("wr", (7, 0)), ("br", (0, 4)), ("bh", (5, 3)), ("bk", (0, 0))]))
+    assert game.find_checks_and_pins()[0] == 2
+    assert game.piece_valid_tiles(game.pos_to_piece((7, 0))) == []
+    assert len(game.piece_valid_tiles(game.pos_to_piece((7, 4)))) > 0
+
+
+def test_GameState_is_square_attacked():
+    game = GameState()
+    assert game.is_square_attacked((5, 0), "w") is True
+    assert game.is_square_attacked((4, 0), "w") is False
+    assert game.is_square_attacked((2, 5), "b") is True
+    game = GameState(board_with_pieces([("wk", (7, 4)), ("wr", (7, 7)), ("bq", (2, 5)), ("bk", (0, 0))]))
+    assert game.is_square_attacked((7, 5), "b") is True
+    assert game.is_square_attacked((7, 3), "b") is False
+    game.board[5][5] = Piece("wp", (5, 5))
+    assert game.is_square_attacked((7, 5), "b") is False
+
+
+def test_GameState_no_castle_through_check():
+    game = GameState(board_with_pieces([("wk", (7, 4)), ("wr", (7, 7)), ("bq", (2, 5)), ("bk", (0, 0))]))
+    assert (7, 6) not in game.piece_valid_tiles(game.pos_to_piece((7, 4)))
+    game.board[2][5] = None
+    assert (7, 6) in game.piece_valid_tiles(game.pos_to_piece((7, 4)))
+
+
+def test_GameState_incremental_hash():
+    game = GameState()
+    start_hash = game.hash
+    game.make_move(game.pos_to_piece((6, 4)), (4, 4))
+    assert game.hash != start_hash
+    assert game.hash == game.calculate_hash()
+    game.make_move(game.pos_to_piece((1, 3)), (3, 3))
+    game.make_move(game.pos_to_piece((4, 4)), (3, 4))
+    game.make_move(game.pos_to_piece((1, 5)), (3, 5))
+    assert game.en_passant_hash != 0
+    assert game.hash == game.calculate_hash()
+    game.make_move(game.pos_to_piece((3, 4)), (2, 5))
+    assert game.hash == game.calculate_hash()
+    for _ in range(5):
+        game.unmake_move()
+    assert game.hash == start_hash
+
+
+def test_GameState_fen():
+    fen = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    game = GameState.from_fen(fen)
+    assert game.to_fen() == fen
+    assert game.hash == game.calculate_hash()
+    assert GameState().to_fen() == "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    game = GameState.from_fen("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 3")
+    assert (2, 3) in game.piece_valid_tiles(game.pos_to_piece((3, 4)))
+    with raises(ValueError):
+        GameState.from_fen("8/8/8 w - -")
+
+
+def test_GameState_from_fen_rejects_malformed_fields():
+    start = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"
+    for fen in [start + " w KQkq -", start + " w KQkq - 0", start + " w KQkq z9 0 1", start + " w KQkq e 0 1",
+                start + " w KQkq e3 0 1", start + " b KQkq e6 0 1", start + " w KQkq - x 1", start + " w KQkq - 0 1 extra"]:
+        with raises(ValueError):
+            GameState.from_fen(fen)
+    assert GameState.from_fen(start + " b KQkq e3 0 1").en_passant_square == (5, 4)
+
+
 def test_GameState_check_if_valid_position():
     game = GameState()
     assert game.check_if_valid_position((0, 0)) is True
@@ -228,6 +479,304 @@ def test_GameState_piece_valid_tiles():
     assert len(game.piece_valid_tiles(Piece("wk", (3, 3)))) == 8
     assert len(game.piece_valid_tiles(Piece("wp", (3, 3)))) == 1
 
+
+def test_GameState_bitboards_follow_board():
+    game = GameState()
+    assert count_squares(game.position.occupied) == 32
+    assert game.is_occupied((7, 4)) is True
+    game.board[4][4] = Piece("bq", (4, 4))
+    assert game.position.piece_at(pos_to_square((4, 4))) == "bq"
+    game.move_piece(game.pos_to_piece((6, 3)), (4, 4))
+    assert game.position.piece_at(pos_to_square((4, 4))) == "wp"
+    assert game.is_occupied((6, 3)) is False
+    assert count_squares(game.position.colors["b"]) == 16
+
+# BitboardPosition Tests
+
+
+def test_BitboardPosition_initialization():
+    position = BitboardPosition(GameState().initialize_board())
+    assert count_squares(position.occupied) == 32
+    assert position.piece_at(pos_to_square((0, 4))) == "bk"
+    assert position.piece_at(pos_to_square((4, 4))) is None
+    assert list(iterate_squares(position.pieces["wr"])) == [56, 63]
+
+
+def test_BitboardPosition_add_remove_piece():
+    position = BitboardPosition()
+    position.add_piece("wh", 10)
+    assert position.is_occupied(10) is True
+    assert position.is_color(10, "w") is True
+    assert position.is_color(10, "b") is False
+    position.move_piece("wh", 10, 20)
+    assert position.pieces["wh"] == 1 << 20
+    position.remove_piece("wh", 20)
+    assert position.occupied == 0
+
+# Attack Tables Tests
+
+
+def test_AttackTables_jump_attacks():
+    assert count_squares(KNIGHT_ATTACKS[pos_to_square((0, 0))]) == 2
+    assert count_squares(KNIGHT_ATTACKS[pos_to_square((3, 3))]) == 8
+    assert count_squares(KING_ATTACKS[pos_to_square((7, 7))]) == 3
+    assert PAWN_ATTACKS["w"][pos_to_square((6, 0))] == 1 << pos_to_square((5, 1))
+    assert PAWN_ATTACKS["b"][pos_to_square((1, 4))] == (1 << pos_to_square((2, 3))) | (1 << pos_to_square((2, 5)))
+
+
+def test_AttackTables_sliding_attacks():
+    assert count_squares(rook_attacks(pos_to_square((3, 3)), 0)) == 14
+    assert count_squares(bishop_attacks(pos_to_square((0, 0)), 0)) == 7
+    blocker = 1 << pos_to_square((3, 5))
+    assert rook_attacks(pos_to_square((3, 3)), blocker) & (1 << pos_to_square((3, 6))) == 0
+    assert rook_attacks(pos_to_square((3, 3)), blocker) & blocker == blocker
+    assert count_squares(BETWEEN[pos_to_square((0, 0))][pos_to_square((7, 7))]) == 6
+    assert BETWEEN[pos_to_square((0, 0))][pos_to_square((1, 2))] == 0
+    assert TABLES_BUILD_TIME < 1
+
+# Perft Tests
+
+
+def test_Perft_known_positions():
+    for name in POSITIONS:
+        fen, known_nodes = POSITIONS[name]
+        assert perft(GameState.from_fen(fen), 2) == known_nodes[1]
+
+
+def test_Perft_divide():
+    result = divide(GameState.from_fen(POSITIONS["kiwipete"][0]), 1)
+    assert len(result) == 48
+    assert result["E1->G1"] == 1
+    assert sum(divide(GameState(), 2).values()) == 400
+
+
+def test_Perft_compare_with_baseline():
+    results = {"start": {"depth": 2, "nodes": 400, "nodes_per_second": 100}}
+    assert compare_with_baseline(results, {"start": {"depth": 2, "nodes": 400, "nodes_per_second": 100}}) == []
+    assert len(compare_with_baseline(results, {"start": {"depth": 2, "nodes": 400, "nodes_per_second": 1000}})) == 1
+    results["start"]["nodes"] = 401
+    assert len(compare_with_baseline(results, {})) == 1
+
+# Engine Tests
+
+
+def test_Engine_finds_mate_in_one():
+    game = GameState.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    result = Engine(2000).search(game)
+    assert result.move[0].name == "wr" and result.move[1] == (0, 0)
+    assert result.score >= MATE_THRESHOLD
+
+
+def test_Engine_captures_hanging_queen():
+    game = GameState.from_fen("4k3/8/8/3q4/8/8/3R4/4K3 w - - 0 1")
+    before = game.to_fen()
+    result = Engine(2000, max_depth=2).search(game)
+    assert result.move[1] == (3, 3)
+    assert game.to_fen() == before
+    assert result.depth == 2
+
+
+def test_Engine_respects_time_budget():
+    game = GameState.from_fen(POSITIONS["kiwipete"][0])
+    before = game.to_fen()
+    budget_ms = 100
+    result = Engine().search(game, time_limit_ms=budget_ms)
+    assert result.seconds < 1.3 * budget_ms / 1000
+    assert result.move is not None
+    assert result.nodes > 0 and result.nodes_per_second > 0
+    assert game.to_fen() == before
+    assert len(game.undo_stack) == 0
+
+# TranspositionTable Tests
+
+
+def test_TranspositionTable_store_and_probe():
+    table = TranspositionTable(1)
+    assert table.probe(12345) is None
+    table.store(12345, 5, -250, LOWER_BOUND, 1234)
+    assert table.probe(12345) == (5, -250, LOWER_BOUND, 1234)
+    assert table.hits == 1 and table.misses == 1 and table.stores == 1
+
+
+def test_TranspositionTable_replacement_policy():
+    table = TranspositionTable(1)
+    bucket_step = table.bucket_mask + 1
+    table.store(1, 8, 10, EXACT, 0)
+    table.store(1 + bucket_step, 3, 20, EXACT, 0)
+    # shallower entry goes to always-replace slot, deep one stays
+    assert table.probe(1)[0] == 8
+    assert table.probe(1 + bucket_step)[0] == 3
+    table.store(1 + 2 * bucket_step, 2, 30, EXACT, 0)
+    assert table.probe(1) is not None
+    assert table.probe(1 + bucket_step) is None
+    assert table.overwrites == 1
+
+
+def test_TranspositionTable_memory_stays_flat():
+    table = TranspositionTable(1)
+    size = table.size_bytes()
+    assert size <= 1024 * 1024
+    for key in range(1, 100000, 7):
+        table.store(key * 0x9E3779B97F4A7C15 & ((1 << 64) - 1), 1, 0, EXACT, 0)
+    assert table.size_bytes() == size
+    with raises(ValueError):
+        TranspositionTable(0)
+
+
+def test_TranspositionTable_shared_between_processes():
+    table = TranspositionTable(1, shared=True)
+    attached = TranspositionTable(1, shared=True, name=table.name)
+    table.store(777, 4, 35, EXACT, 99)
+    assert attached.probe(777) == (4, 35, EXACT, 99)
+    attached.close()
+    table.close()
+
+
+def test_ParallelEngine_finds_mate_in_one():
+    game = GameState.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    engine = ParallelEngine(2, 2000)
+    try:
+        engine.warm_up()
+        # every worker already reported, second call does not wait
+        engine.warm_up()
+        assert engine.started == 2
+        result = engine.search(game)
+    finally:
+        engine.close()
+    assert result.move[0].name == "wr" and result.move[1] == (0, 0)
+    assert result.score >= MATE_THRESHOLD
+    assert len(game.undo_stack) == 0
+
+
+def test_GameState_encode_and_decode_move():
+    game = GameState.from_fen("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1")
+    pawn = game.pos_to_piece((1, 1))
+    piece, tile, promotion = game.decode_move(encode_move(pawn, (0, 1), "h"))
+    assert piece is pawn and tile == (0, 1) and promotion == "h"
+    assert game.decode_move(encode_move(pawn, (0, 1)))[2] is None
+
+
+def test_Engine_uses_transposition_table():
+    game = GameState.from_fen(POSITIONS["kiwipete"][0])
+    engine = Engine(2000, max_depth=3, hash_size_mb=1)
+    engine.search(game)
+    table = engine.transposition_table
+    assert table.stores > 0 and table.hits > 0
+    assert len(game.undo_stack) == 0
+
+
+# Self Play Tests
+
+
+def test_GameState_find_game_over_data():
+    assert GameState().find_game_over_data()["is_over"] is False
+    mate = GameState.from_fen("R5k1/5ppp/8/8/8/8/8/6K1 b - - 1 1")
+    assert mate.find_game_over_data() == {"is_over": True, "winner": "White won", "end_type": "Checkmate"}
+    stalemate = GameState.from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    assert stalemate.find_game_over_data()["end_type"] == "Stalemate"
+    bare_kings = GameState.from_fen("7k/8/6K1/8/8/8/8/8 w - - 0 1")
+    assert bare_kings.find_game_over_data()["end_type"] == "Not enough mate material"
+
+
+def test_GameState_position_status_in_one_pass():
+    game = GameState.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    status = game.find_position_status()
+    assert status.in_check is False and status.is_over is False
+    assert status.king_position == (7, 6)
+    assert ((7, 0), (0, 0), None) in status.legal_moves
+    # same position is answered from memo
+    assert game.find_position_status() is status
+    game.move_piece(game.pos_to_piece((7, 0)), (0, 0))
+    mate = game.find_position_status()
+    assert mate.in_check is True and mate.legal_moves == ()
+    assert mate.game_over_data() == {"is_over": True, "winner": "White won", "end_type": "Checkmate"}
+
+
+def test_GameState_position_status_depends_on_repetition():
+    tracker = MovesTracker()
+    game = GameState(move_tracker=tracker)
+    assert game.find_position_status().is_over is False
+    tracker.repetition_found = True
+    status = game.find_position_status()
+    assert status.end_type == "Move repetition" and len(status.legal_moves) == 20
+
+
+def test_play_game_stops_after_max_plies():
+    result = play_game(RandomPlayer(1), RandomPlayer(2), fen="6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", max_plies=1)
+    assert result["is_over"] is True
+    assert result["plies"] == 1
+    assert result["end_type"] in ["Checkmate", "Ply limit"]
+
+
+def test_play_game_counts_start_position_for_repetition():
+    class ScriptedPlayer():
+        def __init__(self, moves):
+            self.moves = iter(moves)
+
+        def choose_move(self, game_state):
+            start, tile = next(self.moves)
+            return game_state.pos_to_piece(start), tile, None
+
+    result = play_game(ScriptedPlayer(KNIGHT_SHUFFLE[0::2]), ScriptedPlayer(KNIGHT_SHUFFLE[1::2]))
+    # start position is reached for the third time after the second knight round trip
+    assert result["end_type"] == "Move repetition" and result["plies"] == 8
+
+
+def test_GameManager_counts_start_position_for_repetition():
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    game = GameManager(screen, 900, ("white", "gray"))
+    for start, tile in KNIGHT_SHUFFLE:
+        assert game.check_for_move_repetition() is False
+        game.play_move(game.game_state.pos_to_piece(start), tile)
+    assert game.check_for_move_repetition() is True
+    assert game.move_tracker.position_counts[GameState().hash] == 3
+    game.close()
+
+
+def test_run_self_play_reports_speed():
+    stats = run_self_play(3, RandomPlayer(1), RandomPlayer(2), max_plies=40)
+    assert stats["games"] == 3
+    assert sum(stats["results"].values()) == 3
+    assert 0 < stats["plies"] <= 120
+    assert stats["games_per_second"] > 0 and stats["plies_per_second"] > 0
+
+
+# MoveOrderer Tests
+
+
+def test_MoveOrderer_captures_by_mvv_lva():
+    game = GameState.from_fen("4k3/8/8/3q4/2P4r/8/3Q4/4K3 w - - 0 1")
+    moves = MoveOrderer().order(game, game.find_all_legal_moves())
+    # pawn takes queen before queen takes queen
+    assert moves[0][0].name == "wp" and moves[0][1] == (3, 3)
+    assert moves[1][0].name == "wq" and moves[1][1] == (3, 3)
+
+
+def test_MoveOrderer_hash_move_killers_and_history():
+    game = GameState()
+    orderer = MoveOrderer()
+    knight_move = (game.pos_to_piece((7, 6)), (5, 5), None)
+    pawn_move = (game.pos_to_piece((6, 3)), (4, 3), None)
+    orderer.record_cutoff(game, knight_move, 2, 3, 0)
+    orderer.record_cutoff(game, pawn_move, 3, 4, 5)
+    moves = game.find_all_legal_moves()
+    assert orderer.order(game, moves, ply=2)[0] == knight_move
+    # without killers of the ply, move with the highest history score goes first
+    assert orderer.order(game, moves, ply=5)[0] == pawn_move
+    assert orderer.order(game, moves, encode_move(*knight_move), ply=3)[0] == knight_move
+    assert orderer.cutoffs == 2 and orderer.first_move_cutoffs == 1
+    assert orderer.first_move_cutoff_rate() == 0.5
+
+
+def test_Engine_counts_first_move_cutoffs():
+    game = GameState.from_fen(POSITIONS["kiwipete"][0])
+    engine = Engine(5000, max_depth=3)
+    engine.search(game)
+    assert engine.move_orderer.cutoffs > 0
+    assert engine.move_orderer.first_move_cutoff_rate() > 0.5
+
+
 # Player Tests
 
 
@@ -249,6 +798,29 @@ def test_Player_get_score():
     plr = Player("w", game.find_all_pieces_of_color("w"))
     assert plr.get_score() == 39
 
+
+def test_Player_score_follows_moves():
+    game = GameState(board_with_pieces([("wk", (7, 4)), ("wp", (1, 0)), ("bk", (0, 4)), ("br", (0, 7)), ("bh", (1, 1))]))
+    assert game.plr_white.get_score() == 1
+    assert game.plr_black.get_score() == 8
+    game.make_move(game.pos_to_piece((1, 0)), (0, 0))
+    assert game.plr_white.get_score() == 9
+    game.make_move(game.pos_to_piece((0, 7)), (0, 0))
+    assert game.plr_white.get_score() == 0
+    assert len(game.plr_white.pieces) == 1
+    game.unmake_move()
+    game.unmake_move()
+    assert game.plr_white.get_score() == 1
+    assert game.pos_to_piece((1, 0)).name == "wp"
+    assert len(game.plr_white.pieces) == 2
+
+
+def test_Player_pieces_assignment_resets_score():
+    plr = Player("b", [Piece("bq", (0, 0))])
+    assert plr.get_score() == 9
+    plr.pieces = [Piece("br", (0, 0))]
+    assert plr.get_score() == 5
+
 # MoveTracker Tests
 
 
@@ -275,10 +847,24 @@ def test_MoveTracker_pos_to_string():
 def test_MoveTracker_boards_record():
     game = GameState()
     tracker = MovesTracker()
-    assert len(tracker.board_positions_recorded) == 0
+    assert len(tracker.position_counts) == 0
+    tracker.record_board(game)
+    assert len(tracker.position_counts) == 1
+    assert tracker.position_counts[game.hash] == 1
+
+
+def test_MoveTracker_repetition_scoped_to_irreversible_move():
+    game = GameState()
+    tracker = MovesTracker()
+    tracker.record_board(game)
+    for move in [((7, 6), (5, 5)), ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6))]:
+        game.move_piece(game.pos_to_piece(move[0]), move[1])
+        tracker.record_board(game)
+    assert tracker.position_counts[game.hash] == 2
+    game.move_piece(game.pos_to_piece((6, 4)), (4, 4))
     tracker.record_board(game)
-    assert len(tracker.board_positions_recorded) == 1
-    assert tracker.board_positions_recorded[0] == game.board_to_str(game.board)
+    assert len(tracker.position_counts) == 1
+    assert tracker.repetition_found is False
 
 # Display Tests
 
@@ -288,3 +874,480 @@ def test_Display_initialization():
     display = Display(screen, 900)
     assert display.window == screen
     assert display.board_size == 900
+
+
+def test_Display_scales_piece_images_once_per_size():
+    screen = pygame.display.set_mode((900, 900))
+    display = Display(screen, 900)
+    display.sprite_atlas = SpriteAtlas()
+    game = GameState()
+    display.load_pieces(game)
+    display.load_pieces(game)
+    assert display.sprite_atlas.builds == 1
+    assert display.sprite_atlas.pieces["wk"].get_size() == (112, 112)
+    display.board_size = 640
+    display.load_pieces(game)
+    assert display.sprite_atlas.builds == 2
+    assert display.sprite_atlas.pieces["wk"].get_size() == (80, 80)
+    # files are decoded only once no matter how many times images were scaled
+    assert len(display.sprite_atlas.decoded) == 12
+
+
+def test_TextCache_hits_and_evictions():
+    pygame.init()
+    cache = TextCache(max_size=2)
+    first = cache.render("arialblack", 20, "White: ", (255, 255, 255))
+    assert cache.render("arialblack", 20, "White: ", (255, 255, 255)) is first
+    cache.render("arialblack", 20, "Black: ", (255, 255, 255))
+    cache.render("arialblack", 20, "#", (255, 255, 255))
+    assert len(cache.surfaces) == 2 and cache.surfaces.evictions == 1
+    assert cache.surfaces.hits == 1 and cache.surfaces.misses == 3
+    assert cache.surfaces.hit_rate() == 0.25
+    assert len(cache.font_registry.fonts) == 1
+    with raises(ValueError):
+        TextCache(0)
+
+# MovePrecomputer Tests
+
+
+def test_MovePrecomputer_drops_result_of_old_position():
+    game = GameState()
+    precomputer = MovePrecomputer()
+    precomputer.start(game)
+    old_hash = game.hash
+    game.move_piece(game.pos_to_piece((6, 4)), (4, 4))
+    precomputer.start(game)
+    result = precomputer.get(game.hash, wait=True)
+    assert precomputer.get(old_hash) is None
+    assert len(result.legal_tiles()) == 10
+    assert len(result.legal_moves) == 20
+    assert result.is_over is False
+
+# LRUCache Tests
+
+
+def test_LRUCache_evicts_least_recently_used():
+    cache = LRUCache(capacity=2)
+    cache.put("a", (1,))
+    cache.put("b", (2,))
+    assert cache.get("a") == (1,)
+    cache.put("c", (3,))
+    assert cache.get("b") is None
+    assert cache.get("a") == (1,) and cache.get("c") == (3,)
+    assert cache.hits == 3 and cache.misses == 1 and cache.evictions == 1
+    assert cache.hit_rate() == 0.75
+    with raises(ValueError):
+        LRUCache(0)
+
+
+def test_GameState_valid_tiles_served_from_legal_move_cache():
+    game = GameState()
+    knight = game.pos_to_piece((7, 6))
+    assert sorted(game.piece_valid_tiles(knight)) == [(5, 5), (5, 7)]
+    assert len(game.find_all_player_moves()) == 20
+    assert game.legal_move_cache.misses == 1 and game.legal_move_cache.hits == 1
+    game.move_piece(knight, (5, 5))
+    # position after a move has a new key, so moves of black are generated
+    assert sorted(game.find_all_player_moves()) == sorted(GameState.from_fen(game.to_fen()).find_all_player_moves())
+    assert game.legal_move_cache.misses == 2
+    game.unmake_move()
+    assert sorted(game.piece_valid_tiles(knight)) == [(5, 5), (5, 7)]
+    assert game.legal_move_cache.hits == 2
+
+
+# GameJournal Tests
+
+
+def test_GameJournal_recovers_default_promotion(tmp_path):
+    path = str(tmp_path / "game.journal")
+    fen = "8/P6k/8/8/8/8/8/K7 w - - 0 1"
+    game = GameState.from_fen(fen, MovesTracker(GameJournal(path, fen)))
+    # GUI promotes without choosing a piece
+    game.move_piece(game.pos_to_piece((1, 0)), (0, 0))
+    game.move_piece(game.pos_to_piece((1, 7)), (2, 7))
+    game.move_tracker.journal.close()
+    assert recover_game(path).to_fen() == game.to_fen() == "Q7/8/7k/8/8/8/8/K7 w - - 2 2"
+
+
+def test_GameJournal_records_and_recovers_game(tmp_path):
+    path = str(tmp_path / "game.journal")
+    game = GameState.from_fen("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1", MovesTracker(GameJournal(path, "4k3/1P6/8/8/8/8/8/4K3 w - - 0 1")))
+    game.move_piece(game.pos_to_piece((1, 1)), (0, 1), "h")
+    game.move_piece(game.pos_to_piece((0, 4)), (1, 4))
+    game.move_tracker.journal.close()
+    fen, codes = read_journal(path)
+    assert fen == "4k3/1P6/8/8/8/8/8/4K3 w - - 0 1" and len(codes) == 2
+    tracker = MovesTracker()
+    recovered = recover_game(path, tracker)
+    assert recovered.to_fen() == game.to_fen()
+    assert tracker.move_record == game.move_tracker.move_record
+
+
+def test_GameJournal_writes_plies_in_batches(tmp_path):
+    path = tmp_path / "game.journal"
+    journal = GameJournal(str(path), GameState().to_fen(), fsync_every=2, fsync_interval=60)
+    header_size = path.stat().st_size
+    game = GameState(move_tracker=MovesTracker(journal))
+    game.move_piece(game.pos_to_piece((6, 4)), (4, 4))
+    assert path.stat().st_size == header_size and journal.pending == 1
+    game.move_piece(game.pos_to_piece((1, 4)), (3, 4))
+    assert path.stat().st_size == header_size + 4 and journal.pending == 0
+    journal.close()
+
+
+def test_recover_game_from_cut_journal(tmp_path):
+    path = str(tmp_path / "game.journal")
+    journal = GameJournal(path, GameState().to_fen(), fsync_every=2)
+    game = GameState(move_tracker=MovesTracker(journal))
+    for start, target in [((6, 4), (4, 4)), ((1, 4), (3, 4)), ((7, 6), (5, 5))]:
+        game.move_piece(game.pos_to_piece(start), target)
+    assert journal.syncs == 2
+    journal.close()
+    with open(path, "rb") as file:
+        data = file.read()
+    # crash in the middle of writing last ply
+    with open(path, "wb") as file:
+        file.write(data[:-1])
+    recovered = recover_game(path)
+    assert recovered.pos_to_piece((3, 4)).name == "bp" and recovered.pos_to_piece((7, 6)).name == "wh"
+    # garbage ply stops replay
+    with open(path, "wb") as file:
+        file.write(data[:-2] + bytes([0xFF, 0x0F]))
+    assert recover_game(path).current_player.color == "w"
+    with open(path, "wb") as file:
+        file.write(b"nonsense")
+    with raises(ValueError):
+        read_journal(path)
+
+
+# GameLoader Tests
+
+
+PGN_GAMES = """[Event "Test"]
+[White "A"]
+
+1. e4 e5 2. Nf3 {main line} Nc6 (2... d6 3. d4) 3. Bb5 a6 4. Ba4 Nf6 5. O-O $1 Be7 1/2-1/2
+
+[Event "Promotion"]
+[FEN "8/P6k/8/8/8/8/8/K7 w - - 0 1"]
+
+1. a8=N Kg6 *
+"""
+
+
+def test_GameLoader_reads_pgn_games_one_by_one(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text(PGN_GAMES)
+    games = iter_pgn_games(str(path))
+    first = next(games)
+    assert first.tags["White"] == "A"
+    assert first.moves == ["e4", "e5", "Nf3", "Nc6", "Bb5", "a6", "Ba4", "Nf6", "O-O", "Be7"]
+    *_, (final, piece, _, _) = replay_game(first)
+    assert piece is None and final.pos_to_piece((7, 6)).name == "wk" and final.pos_to_piece((7, 5)).name == "wr"
+    second = next(games)
+    assert second.fen == "8/P6k/8/8/8/8/8/K7 w - - 0 1"
+    *_, (final, _, _, _) = replay_game(second)
+    assert final.pos_to_piece((0, 0)).name == "wh"
+    assert next(games, None) is None
+
+
+def test_GameLoader_replays_text_save_and_rejects_illegal_move(tmp_path):
+    path = tmp_path / "save.txt"
+    path.write_text("Num\t | White \t | Black\n1.\t | E2->E4 \t | E7->E5\n2.\t | F1->C4 \t | \n")
+    (game,) = iter_games(str(path))
+    assert game.moves == ["E2->E4", "E7->E5", "F1->C4"]
+    *_, (final, _, _, _) = replay_game(game)
+    assert final.pos_to_piece((4, 2)).name == "wb" and final.current_player.color == "b"
+    path.write_text("Num\t | White \t | Black\n1.\t | E2->E5 \t | \n")
+    with raises(ValueError):
+        list(replay_game(next(iter_games(str(path)))))
+
+
+def test_GameArchive_converts_directory_and_streams_games(tmp_path):
+    saves = tmp_path / "saves"
+    saves.mkdir()
+    (saves / "games.pgn").write_text(PGN_GAMES + "\n1. e4 e5 2. Ke3 1-0\n")
+    (saves / "save.txt").write_text("Num\t | White \t | Black\n1.\t | D2->D4 \t | \n")
+    archive = str(tmp_path / "games.archive")
+    stats = convert_directory(str(saves), archive)
+    assert stats["games"] == 3 and stats["skipped"] == 1 and stats["plies"] == 13
+    games = list(iter_archive(archive))
+    assert [fen for fen, _ in games] == [None, "8/P6k/8/8/8/8/8/K7 w - - 0 1", None]
+    *_, final = replay_archived_game(*games[1])
+    assert final.pos_to_piece((0, 0)).name == "wh"
+    with open(archive, "ab") as file:
+        file.write(b"\x01")
+    with raises(ValueError):
+        list(iter_archive(archive))
+
+
+def test_GameArchive_skips_illegal_archived_and_journal_moves(tmp_path):
+    saves = tmp_path / "saves"
+    saves.mkdir()
+    game = GameState()
+    e4 = encode_move(game.pos_to_piece((6, 4)), (4, 4))
+    e5 = encode_move(game.pos_to_piece((1, 4)), (3, 4))
+    # e2e4 again, no piece stands on e2 after the first move
+    journal = GameJournal(str(saves / "cut.journal"), game.to_fen())
+    journal.file.write(b"".join(code.to_bytes(2, "little") for code in [e4, e5, e4]))
+    journal.close()
+    assert list(iter_saved_games(str(saves))) == [(str(saves / "cut.journal"), game.to_fen(), [e4, e5])]
+    archive = str(tmp_path / "games.archive")
+    with open(archive, "wb") as file:
+        file.write(ARCHIVE_MAGIC)
+        write_game(file, None, [e4, e5])
+        # e1e2 is blocked by own pawn
+        write_game(file, None, [e4, encode_move(game.pos_to_piece((7, 4)), (6, 4))])
+    with raises(ValueError):
+        list(replay_archived_game(*list(iter_archive(archive))[1]))
+    stats = build_database(archive, str(tmp_path / "games.database"), run_size=25)
+    assert stats["games"] == 2 and stats["skipped"] == 1 and stats["records"] == 3
+    stats = build_book(archive, str(tmp_path / "games.book"))
+    assert stats["games"] == 1 and stats["entries"] == 2
+
+
+def test_GameArchive_skips_empty_journals_and_repeated_games(tmp_path):
+    saves = tmp_path / "saves"
+    saves.mkdir()
+    GameJournal(str(saves / "empty.journal"), GameState().to_fen()).close()
+    journal = GameJournal(str(saves / "game.journal"), GameState().to_fen())
+    game = GameState(move_tracker=MovesTracker(journal))
+    game.move_piece(game.pos_to_piece((6, 4)), (4, 4))
+    game.move_piece(game.pos_to_piece((1, 4)), (3, 4))
+    journal.close()
+    # the same game saved with Save button
+    (saves / "save.txt").write_text("Num\t | White \t | Black\n1.\t | E2->E4 \t | E7->E5\n")
+    games = list(iter_saved_games(str(saves)))
+    assert [isinstance(codes, ValueError) for _, _, codes in games] == [True, False, True]
+    stats = convert_directory(str(saves), str(tmp_path / "games.archive"))
+    assert stats["games"] == 1 and stats["skipped"] == 2 and stats["plies"] == 2
+    book_path = str(tmp_path / "games.book")
+    build_book(str(saves), book_path)
+    book = OpeningBook(book_path)
+    assert [weight for _, weight in book.find_moves(GameState())] == [1]
+    book.close()
+
+
+# MappedRecords Tests
+
+
+def test_MappedRecords_finds_records_by_first_field():
+    record = struct.Struct(">QH")
+    data = b"head" + b"".join(record.pack(key, value) for key, value in [(1, 0), (3, 1), (3, 2), (7, 3)])
+    records = MappedRecords(data, record, 4, 4)
+    assert len(records) == 4 and records[3] == (7, 3)
+    assert records.lower_bound(3) == 1 and records.lower_bound(4) == 3 and records.lower_bound(8) == 4
+    assert records.find(3) == [(3, 1), (3, 2)] and records.find(5) == []
+    assert MappedRecords(None, record, 0, 0).find(3) == []
+
+
+# GameDatabase Tests
+
+
+def test_GameDatabase_finds_every_game_reaching_position(tmp_path):
+    archive = str(tmp_path / "games.archive")
+    player = RandomPlayer(5)
+    games = []
+    with open(archive, "wb") as file:
+        file.write(ARCHIVE_MAGIC)
+        for _ in range(12):
+            game_state = GameState()
+            codes = []
+            for _ in range(10):
+                piece, tile, promotion = player.choose_move(game_state)
+                codes.append(encode_move(piece, tile, promotion))
+                game_state.move_piece(piece, tile, promotion)
+            write_game(file, None, codes)
+            games.append(codes)
+    path = str(tmp_path / "games.database")
+    # small runs force external merge of several sorted files
+    stats = build_database(archive, path, run_size=25)
+    assert stats["games"] == 12 and stats["records"] == 12 * 11 and stats["runs"] > 1
+    expected = {}
+    for game_id, codes in enumerate(games):
+        for ply, game_state in enumerate(replay_archived_game(None, codes)):
+            expected.setdefault(game_state.hash, []).append((game_id, ply))
+    database = GameDatabase(path)
+    assert database.find_position(GameState()) == [(game_id, 0) for game_id in range(12)]
+    for position_hash, found in expected.items():
+        assert database.find(position_hash) == found
+    assert database.find(12345) == []
+    assert database.load_game(archive, 7) == (None, games[7])
+    database.close()
+    with open(path, "ab") as file:
+        file.write(b"x")
+    with raises(ValueError):
+        GameDatabase(path)
+
+
+# OpeningBook Tests
+
+
+def test_OpeningBook_encodes_polyglot_moves():
+    game = GameState.from_fen("r3k3/1P6/8/8/8/8/8/R3K2R w KQq - 0 1")
+    # e1g1 castling is stored as king taking h1 rook, e1 = square 4 and h1 = square 7 in Polyglot numbering
+    move = encode_polyglot_move(game.pos_to_piece((7, 4)), (7, 6))
+    assert move == 4 << 6 | 7
+    assert decode_polyglot_move(game, move) == (game.pos_to_piece((7, 4)), (7, 6), None)
+    move = encode_polyglot_move(game.pos_to_piece((1, 1)), (0, 0), "h")
+    assert move >> 12 == 1
+    assert decode_polyglot_move(game, move) == (game.pos_to_piece((1, 1)), (0, 0), "h")
+    # black piece can not be moved by white
+    assert decode_polyglot_move(game, encode_polyglot_move(game.pos_to_piece((0, 4)), (0, 3))) is None
+
+
+def test_OpeningBook_builds_from_saves_and_is_used_by_engine(tmp_path):
+    saves = tmp_path / "saves"
+    saves.mkdir()
+    (saves / "games.pgn").write_text("1. e4 e5 2. Nf3 Nc6 *\n\n1. e4 c5 *\n\n1. d4 d5 *\n\n1. e4 e5 2. Bc4 *\n")
+    path = str(tmp_path / "games.book")
+    stats = build_book(str(saves), path, max_ply=3)
+    # start, after e4, after d4, after e4 e5
+    assert stats["games"] == 4 and stats["positions"] == 4 and stats["entries"] == 7
+    book = OpeningBook(path, seed=3)
+    moves = {(piece.position, tile): weight for (piece, tile, _), weight in book.find_moves(GameState())}
+    assert moves == {((6, 4), (4, 4)): 3, ((6, 3), (4, 3)): 1}
+    game = GameState.from_fen("rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2")
+    result = Engine(opening_book=book).search(game)
+    assert result.nodes == 0 and result.move[1] in [(5, 5), (4, 2)]
+    game = GameState.from_fen("rnbqkbnr/pppppppp/8/8/8/7P/PPPPPPP1/RNBQKBNR b KQkq - 0 1")
+    assert book.choose_move(game) is None
+    assert book.hits == 1 and book.misses == 1
+    book.close()
+    with open(path, "ab") as file:
+        file.write(b"x")
+    with raises(ValueError):
+        OpeningBook(path)
+
+
+def test_polyglot_key_matches_polyglot_reference_keys():
+    game = GameState()
+    assert polyglot_key(game) == 0x463B96181691FC9C
+    keys = [0x823C9B50FD114196, 0x0756B94461C50FB0, 0x662FAFB965DB29D4, 0x22A48B5A8E47FF78, 0x652A607CA3F242C1,
+            0x00FDD303C946BDD9]
+    for (start, tile), key in zip([((6, 4), (4, 4)), ((1, 3), (3, 3)), ((4, 4), (3, 4)), ((1, 5), (3, 5)),
+                                   ((7, 4), (6, 4)), ((0, 4), (1, 5))], keys):
+        game.move_piece(game.pos_to_piece(start), tile)
+        assert polyglot_key(game) == key
+    # en passant file is hashed only when it can be captured
+    game = GameState()
+    for start, tile in [((6, 0), (4, 0)), ((1, 1), (3, 1)), ((6, 7), (4, 7)), ((3, 1), (4, 1)), ((6, 2), (4, 2)),
+                        ((4, 1), (5, 2)), ((7, 0), (5, 0))]:
+        game.move_piece(game.pos_to_piece(start), tile)
+        if tile == (4, 2):
+            assert polyglot_key(game) == 0x3C8123EA7B067637
+    assert polyglot_key(game) == 0x5C3F9B829B279560
+
+
+def test_OpeningBook_skips_illegal_book_moves(tmp_path):
+    path = tmp_path / "broken.book"
+    game = GameState()
+    # e2e5 and e1e2 have pieces of current player but are not legal
+    moves = sorted([encode_polyglot_move(game.pos_to_piece((6, 4)), (3, 4)), encode_polyglot_move(game.pos_to_piece((7, 4)), (6, 4))])
+    path.write_bytes(b"".join(ENTRY.pack(polyglot_key(game), move, 1, 0) for move in moves))
+    book = OpeningBook(str(path))
+    assert len(book.find(polyglot_key(game))) == 2
+    assert book.find_moves(game) == []
+    assert book.choose_move(game) is None
+    assert Engine(max_depth=1, opening_book=book).search(game).nodes > 0
+    book.close()
+
+
+# Tablebase Tests
+
+
+def test_Tablebases_generate_and_probe_rook_ending(tmp_path):
+    tablebases = Tablebases(str(tmp_path), generate=True)
+    table = tablebases.table("KRvK")
+    assert (tmp_path / "KRvK.npz").exists() and (tmp_path / "KvK.npz").exists()
+    # longest rook mate takes 16 moves
+    assert table.dtm[table.wdl == WIN].max() == 31
+    assert table.size_bytes() == 2 * 2 * 64 ** 3
+    assert tablebases.probe(GameState.from_fen("k7/8/1K6/8/8/8/8/7R w - - 0 1")) == (WIN, 1)
+    assert tablebases.probe(GameState.from_fen("k6R/8/1K6/8/8/8/8/8 b - - 0 1")) == (LOSS, 0)
+    # same position with colors swapped is probed from the same table
+    assert tablebases.probe(GameState.from_fen("7r/8/8/8/8/1k6/8/K7 b - - 0 1")) == (WIN, 1)
+    assert canonical_material([("w", "k"), ("b", "k"), ("b", "r")]) == ("KRvK", [1, 2, 0], True)
+    # side not to move in check and positions with more pieces are not in tablebases
+    assert tablebases.probe(GameState.from_fen("k7/8/1K6/8/8/8/8/R7 w - - 0 1")) is None
+    assert tablebases.probe(GameState()) is None
+    loaded = Tablebases(str(tmp_path))
+    drawn = GameState.from_fen("8/8/8/8/8/1k6/R7/7K b - - 0 1")
+    assert loaded.probe(drawn) == (DRAW, 0)
+    drawn.tablebases = loaded
+    # drawn position is played on unless adjudication is turned on
+    assert not drawn.find_game_over_data()["is_over"]
+    assert drawn.find_position_status().tablebase_result == (DRAW, 0)
+    drawn = GameState.from_fen("8/8/8/8/8/1k6/R7/7K b - - 0 1")
+    drawn.tablebases = loaded
+    drawn.adjudicate_tablebase_draws = True
+    assert drawn.find_game_over_data() == {"is_over": True, "winner": "Draw", "end_type": "Tablebase draw"}
+    won = GameState.from_fen("k7/8/1K6/8/8/8/8/7R w - - 0 1")
+    won.tablebases = loaded
+    assert not won.find_game_over_data()["is_over"]
+    assert won.find_position_status().tablebase_result == (WIN, 1)
+
+
+def test_Engine_plays_tablebase_mate(tmp_path):
+    tablebases = Tablebases(str(tmp_path), generate=True)
+    game = GameState.from_fen("8/8/8/3k4/8/8/7Q/4K3 w - - 0 1")
+    wdl, dtm = tablebases.probe(game)
+    assert wdl == WIN
+    engine = Engine(2000, tablebases=tablebases)
+    result = engine.search(game)
+    assert result.score == MATE_THRESHOLD + 1000 - dtm and result.depth == 1
+    game.make_move(*result.move)
+    assert tablebases.probe(game) == (LOSS, dtm - 1)
+
+
+def test_ParallelEngine_and_GameManager_use_tablebases(tmp_path):
+    game = GameState.from_fen("8/8/8/3k4/8/8/7Q/4K3 w - - 0 1")
+    _, dtm = Tablebases(str(tmp_path), generate=True).probe(game)
+    engine = ParallelEngine(2, 2000, tablebase_dir=str(tmp_path))
+    try:
+        result = engine.search(game)
+    finally:
+        engine.close()
+    # exact mate distance comes from workers probing tablebases
+    assert result.score == MATE_THRESHOLD + 1000 - dtm
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 900))
+    manager = GameManager(screen, 900, ("white", "gray"), tablebase_dir=str(tmp_path))
+    assert manager.game_state.tablebases is manager.tablebases
+    # tablebases belong to the game manager, other games do not see them
+    assert GameState().tablebases is None
+    # adjudication is never used between two people
+    assert not manager.game_state.adjudicate_tablebase_draws
+    manager.close()
+    manager = GameManager(screen, 900, ("white", "gray"), engine_colors=("b",), tablebase_dir=str(tmp_path), tablebase_adjudication=True)
+    assert manager.game_state.adjudicate_tablebase_draws
+    assert manager.engine.tablebases is manager.tablebases
+    manager.close()
+
+
+# FrameScheduler Tests
+
+
+def test_FrameScheduler_skips_idle_frames():
+    pygame.init()
+    pygame.display.set_mode((900, 900))
+    scheduler = FrameScheduler(event_driven=True, idle_timeout_ms=10)
+    pygame.event.clear()
+    assert scheduler.should_render([]) is True
+    events = scheduler.wait_for_events()
+    assert events == []
+    assert scheduler.should_render(events) is False
+    pygame.event.post(pygame.event.Event(pygame.USEREVENT))
+    events = scheduler.wait_for_events()
+    assert [event.type for event in events] == [pygame.USEREVENT]
+    assert scheduler.should_render(events) is True
+    assert scheduler.is_active()
+    assert scheduler.should_render([], busy=True) is True
+    assert scheduler.frames_rendered == 3 and scheduler.frames_skipped == 1
+
+
+def test_FrameScheduler_renders_every_frame_when_not_event_driven():
+    pygame.init()
+    scheduler = FrameScheduler(event_driven=False)
+    assert all(scheduler.should_render([]) for _ in range(5))
+    assert scheduler.frames_skipped == 0
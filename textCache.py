@@ -0,0 +1,35 @@
+import pygame
+from lruCache import LRUCache
+
+
+class FontRegistry():
+    """ This class looks up every system font once and hands out the same font object afterwards """
+
+    def __init__(self):
+        # (font name, size) -> pygame font
+        self.fonts = {}
+
+    def get(self, name, size):
+        """ Returns system font of given name and size """
+        key = (name, size)
+        if key not in self.fonts:
+            self.fonts[key] = pygame.font.SysFont(name, size)
+        return self.fonts[key]
+
+
+class TextCache():
+    """ This class keeps a bounded number of rendered text surfaces, least recently used ones are dropped first """
+
+    def __init__(self, max_size=256):
+        self.font_registry = FontRegistry()
+        # (font name, size, text, color) -> rendered surface
+        self.surfaces = LRUCache(max_size)
+
+    def render(self, font_name, size, text, color):
+        """ Returns text rendered with antialiasing, renders it only when it is not cached """
+        key = (font_name, size, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font_registry.get(font_name, size).render(text, True, color)
+            self.surfaces.put(key, surface)
+        return surface
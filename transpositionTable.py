@@ -0,0 +1,127 @@
+"""
+This file contains fixed-size transposition table storing search results by position hash
+"""
+
+from array import array
+from multiprocessing.shared_memory import SharedMemory
+
+# bound types
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# every entry takes two 64-bit words: position key and packed data
+ENTRY_SIZE = 16
+# bucket holds depth-preferred slot and always-replace slot
+BUCKET_SIZE = 2
+SCORE_OFFSET = 1 << 31
+
+
+def pack_entry(depth, score, bound, move):
+    """ Packs entry into one 64-bit word: move 16 bits, depth 8 bits, bound 2 bits, score 32 bits """
+    return move | depth << 16 | bound << 24 | (score + SCORE_OFFSET) << 32
+
+
+def unpack_entry(data):
+    """ Returns (depth, score, bound, move) packed into one 64-bit word """
+    return (data >> 16) & 0xFF, (data >> 32) - SCORE_OFFSET, (data >> 24) & 0x3, data & 0xFFFF
+
+
+class TranspositionTable():
+    """
+    This class keeps search results in a fixed-size array, so memory stays flat no matter how long search runs.
+    Shared table lives in shared memory block, other processes attach to it by name
+    """
+
+    def __init__(self, size_mb=16, shared=False, name=None):
+        if size_mb <= 0:
+            raise ValueError("Transposition table size has to be positive")
+        bucket_count = 1
+        while bucket_count * 2 * BUCKET_SIZE * ENTRY_SIZE <= size_mb * 1024 * 1024:
+            bucket_count *= 2
+        self.size_mb = size_mb
+        self.bucket_mask = bucket_count - 1
+        size = bucket_count * BUCKET_SIZE * ENTRY_SIZE
+        self.shared_memory = None
+        self.is_owner = False
+        # words are laid out as [key ^ data, data, key ^ data, data] for every bucket,
+        # so entry torn by two processes writing at once never matches its key
+        if shared:
+            self.is_owner = name is None
+            self.shared_memory = SharedMemory(name=name, create=self.is_owner, size=size if self.is_owner else 0)
+            if self.is_owner:
+                self.shared_memory.buf[:size] = bytes(size)
+            self.buffer = self.shared_memory.buf[:size]
+            self.words = self.buffer.cast("Q")
+        else:
+            self.words = array("Q", bytes(size))
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    @property
+    def name(self):
+        """ Name of shared memory block or None for table private to this process """
+        return self.shared_memory.name if self.shared_memory else None
+
+    def size_bytes(self):
+        """ Returns memory taken by table entries """
+        return len(self.words) * self.words.itemsize
+
+    def probe(self, key):
+        """ Returns (depth, score, bound, move) stored for position hash or None """
+        words = self.words
+        index = (key & self.bucket_mask) * 4
+        data = words[index + 1]
+        if data and words[index] ^ data == key:
+            self.hits += 1
+            return unpack_entry(data)
+        data = words[index + 3]
+        if data and words[index + 2] ^ data == key:
+            self.hits += 1
+            return unpack_entry(data)
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """ Saves entry into depth-preferred slot when it is at least as deep, otherwise into always-replace slot """
+        words = self.words
+        index = (key & self.bucket_mask) * 4
+        stored = words[index + 1]
+        if not stored or words[index] ^ stored == key or depth >= (stored >> 16) & 0xFF:
+            slot = index
+        else:
+            slot = index + 2
+        stored = words[slot + 1]
+        if stored and words[slot] ^ stored != key:
+            self.overwrites += 1
+        data = pack_entry(min(depth, 0xFF), score, bound, move)
+        words[slot] = key ^ data
+        words[slot + 1] = data
+        self.stores += 1
+
+    def clear(self):
+        """ Removes every entry and resets counters """
+        size = self.size_bytes()
+        if self.shared_memory:
+            self.shared_memory.buf[:size] = bytes(size)
+        else:
+            self.words = array("Q", bytes(size))
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    def close(self):
+        """ Detaches from shared memory block, process which created it also frees it """
+        if self.shared_memory is None:
+            return
+        self.words.release()
+        self.buffer.release()
+        self.shared_memory.close()
+        if self.is_owner:
+            self.shared_memory.unlink()
+        self.shared_memory = None
+
+    def hit_rate(self):
+        """ Returns part of probes that found an entry """
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0
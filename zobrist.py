@@ -0,0 +1,30 @@
+"""
+This file contains Zobrist keys used to hash positions. Keys come from a fixed seed so hashes stay the same between runs
+"""
+
+import random
+
+_generator = random.Random(0x5A0B1257)
+
+
+def _random_key():
+    return _generator.getrandbits(64)
+
+
+PIECE_KEYS = {name: tuple(_random_key() for _ in range(64))
+              for name in ("wp", "wh", "wb", "wr", "wq", "wk", "bp", "bh", "bb", "br", "bq", "bk")}
+BLACK_TO_MOVE_KEY = _random_key()
+_CASTLING_RIGHT_KEYS = tuple(_random_key() for _ in range(4))
+EN_PASSANT_KEYS = tuple(_random_key() for _ in range(8))
+
+
+def _castling_key(rights):
+    key = 0
+    for bit in range(4):
+        if rights >> bit & 1:
+            key ^= _CASTLING_RIGHT_KEYS[bit]
+    return key
+
+
+# key of every combination of the four castling rights bits
+CASTLING_KEYS = tuple(_castling_key(rights) for rights in range(16))